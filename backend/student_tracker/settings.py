@@ -38,12 +38,14 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "drf_yasg",
     "tracker",
 ]
 
 MIDDLEWARE = [
+    "tracker.metrics.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -52,6 +54,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "tracker.profiling.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "student_tracker.urls"
@@ -73,7 +76,9 @@ CORS_ALLOW_HEADERS = [
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
+    "x-profile",
 ]
+CORS_EXPOSE_HEADERS = ["x-profile-id"]
 
 TEMPLATES = [
     {
@@ -129,10 +134,95 @@ AUTH_PASSWORD_VALIDATORS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'tracker.auth.authenticate.CustomSessionAuthentication',
+        # Stateless bearer tokens; drop the session class above to stop
+        # LoginView from writing to django_session altogether.
+        'tracker.auth.token.SignedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'tracker.auth.permission.CustomIsAuthenticated',
-    ]
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'tracker.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+}
+
+# Per-process cache of authenticated users, see tracker/auth/cache.py
+AUTH_USER_CACHE = {
+    'MAX_SIZE': 1024,
+    'TTL': 300,
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+    },
+}
+
+# Cached reference-data lists, see tracker/response_cache.py. Point ALIAS at a
+# shared cache (e.g. Redis) when running more than one worker process.
+RESPONSE_CACHE = {
+    'ALIAS': 'responses',
+    'TIMEOUT': 60 * 5,
+}
+
+# In-memory allergy cohorts, see tracker/cohorts.py. Worker processes stay in
+# step through a version sequence in the database.
+COHORT_INDEX = {
+    'BACKGROUND_REBUILD': True,
+    # Seconds between reads of the shared version, and between full rebuilds.
+    'VERSION_TTL': 1,
+    'REBUILD_INTERVAL': 30,
+    # Replayable changes kept in CohortChange; a process further behind rebuilds.
+    'KEEP_CHANGES': 10000,
+}
+
+# Thread pool for password checks in LoginView, see tracker/auth/hashing.py.
+# None means min(4, CPU count).
+PASSWORD_HASHING = {
+    'MAX_WORKERS': None,
+}
+
+# Request metrics, see tracker/metrics.py. /metrics answers INTERNAL_IPS and
+# requests carrying "Authorization: Bearer <TOKEN>".
+INTERNAL_IPS = ['127.0.0.1']
+METRICS = {
+    'SERVER_TIMING': True,
+    'TOKEN': os.getenv('METRICS_TOKEN'),
+}
+
+# Admin request profiling, see tracker/profiling.py. Reports are kept in
+# CACHE_ALIAS for TIMEOUT seconds; use a shared cache with several workers.
+PROFILING = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 60 * 60,
+    'TOP_FUNCTIONS': 40,
+}
+
+# Server-sent events, see tracker/events.py. InProcessBroker only reaches the
+# streams of its own process; with more than one app node, point BROKER at a
+# class with the same publish/subscribe interface backed by a shared broker.
+EVENTS = {
+    # tracker.events.PostgresBroker when streams and writes run in different
+    # processes, e.g. the WSGI API plus the ASGI events service.
+    'BROKER': os.getenv('EVENTS_BROKER', 'tracker.events.InProcessBroker'),
+    'BROKER_OPTIONS': {'queue_size': 256},
+    'KEEPALIVE': 15,
+    # Seconds between re-checks of a stream's user, token and classes.
+    'REFRESH': 15,
+}
+
+# LMS reference tables used by tracker/growth.py
+GROWTH_REFERENCE_DIR = BASE_DIR / 'tracker' / 'growth_reference'
+
+# Signed bearer tokens, see tracker/auth/token.py. Point REVOCATION_CACHE at a
+# shared cache (e.g. Redis) when running more than one app node.
+TOKEN_AUTH = {
+    'MAX_AGE': 60 * 120,
+    'REVOCATION_CACHE': 'default',
 }
 
 CORS_ALLOWED_ORIGINS = [
@@ -3,6 +3,7 @@ from django.urls import path, include
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 import rest_framework
+from tracker.metrics import metrics_view
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -19,5 +20,6 @@ urlpatterns = [
     path("swagger/", schema_view.with_ui("swagger", cache_timeout=0), name="schema-swagger-ui"),
     path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
     path('api/', include('tracker.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
@@ -0,0 +1,48 @@
+"""
+Async counterpart of DRF's ``APIView``.
+
+DRF only dispatches synchronously, so under the ASGI application every
+request to an ``APIView`` holds a thread for its whole lifetime. Views built
+on ``AsyncAPIView`` are dispatched on the event loop: coroutine handlers are
+awaited, reading through Django's async ORM, while handlers left synchronous
+(the write paths, with their ``transaction.atomic`` blocks) run in a thread
+as before. Authentication and permission checks are synchronous DRF code and
+run in a thread too.
+
+Under WSGI the same views still work; Django runs them in a per-request
+event loop.
+"""
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    # Handlers may be a mix of coroutines and plain methods, which Django's
+    # own check refuses.
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
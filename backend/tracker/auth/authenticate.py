@@ -1,6 +1,7 @@
 from rest_framework.authentication import BaseAuthentication
 from django.contrib.sessions.models import Session
 from ..models import User
+from .cache import user_cache
 from django.utils.timezone import now
 
 class CustomSessionAuthentication(BaseAuthentication):
@@ -9,10 +10,15 @@ class CustomSessionAuthentication(BaseAuthentication):
         if not user_id:
             return None
 
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            return None
+        user = user_cache.get(user_id)
+        if user is None:
+            generation = user_cache.generation
+            try:
+                user = User.objects.get(id=user_id)
+            except User.DoesNotExist:
+                return None
+
+            user.is_authenticated = True
+            user_cache.set(user, generation)
 
-        user.is_authenticated = True
         return (user, None)
@@ -0,0 +1,27 @@
+"""
+Password checks off the event loop.
+
+PBKDF2 is deliberately slow (tens of milliseconds per check) and would stall
+every other request on the loop. Checks run in a small dedicated pool
+instead: hashlib releases the GIL while hashing, so they proceed in parallel,
+and a burst of logins queues for the pool rather than taking every thread
+the rest of the API needs.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+
+
+def _max_workers():
+    return getattr(settings, 'PASSWORD_HASHING', {}).get('MAX_WORKERS') or min(4, os.cpu_count() or 1)
+
+
+_executor = ThreadPoolExecutor(max_workers=_max_workers(), thread_name_prefix='password-hashing')
+
+
+async def acheck_password(password, encoded):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, check_password, password, encoded)
@@ -0,0 +1,95 @@
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings
+
+from ..models import User
+
+TOKEN_SALT = 'tracker.auth.token'
+
+
+def _config(key, default):
+    return getattr(settings, 'TOKEN_AUTH', {}).get(key, default)
+
+
+def token_max_age():
+    return _config('MAX_AGE', 60 * 120)
+
+
+def _revocations():
+    return caches[_config('REVOCATION_CACHE', 'default')]
+
+
+def issue_token(user):
+    """
+    Sign a compact, expiring token carrying everything a request needs to know
+    about the user, so authenticating it never touches the database.
+
+    Tokens are signed with SECRET_KEY; rotating the key while listing the old
+    one in SECRET_KEY_FALLBACKS keeps outstanding tokens valid until they expire.
+    """
+    payload = {
+        'uid': user.id,
+        'role': user.role,
+        'email': user.email,
+        'name': user.name,
+        'jti': uuid.uuid4().hex,
+    }
+    return signing.dumps(payload, salt=TOKEN_SALT, compress=True)
+
+
+def read_token(token):
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=token_max_age())
+    except signing.SignatureExpired:
+        raise AuthenticationFailed("Token has expired.")
+    except signing.BadSignature:
+        raise AuthenticationFailed("Invalid token.")
+
+    if is_revoked(payload['jti']):
+        raise AuthenticationFailed("Token has been revoked.")
+    return payload
+
+
+def revoke_token(payload):
+    # Only the token id is stored, and only for as long as the token could
+    # still be accepted, so the revocation list stays small.
+    _revocations().set(f"token-revoked:{payload['jti']}", True, timeout=token_max_age())
+
+
+def is_revoked(jti):
+    return _revocations().get(f"token-revoked:{jti}", False)
+
+
+def token_auth_enabled():
+    return any(issubclass(cls, SignedTokenAuthentication) for cls in api_settings.DEFAULT_AUTHENTICATION_CLASSES)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Stateless alternative to CustomSessionAuthentication.
+
+    Reads ``Authorization: Bearer <token>`` and rebuilds the user from the
+    signed payload. Requests without a bearer token fall through to the next
+    authentication class.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed("Invalid token header.")
+
+        payload = read_token(auth[1].decode())
+        user = User(id=payload['uid'], role=payload['role'], email=payload['email'], name=payload['name'])
+        user.is_authenticated = True
+        return (user, payload)
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,13 @@
+"""
+Benchmark suite for the tracker API.
+
+``dataset`` fills the database with a synthetic school at realistic scale
+(``manage.py generate_benchmark_data``) and ``runner`` drives every read
+endpoint of ``tracker.urls`` as an admin, a teacher and a parent from that
+dataset, recording latency percentiles, queries per request and peak memory
+(``manage.py run_benchmarks``). Results are written as JSON with a stable
+layout, so runs from two commits can be diffed or compared with
+``run_benchmarks --compare``.
+
+Run it against a scratch database: the generator writes several million rows.
+"""
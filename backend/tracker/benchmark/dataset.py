@@ -0,0 +1,269 @@
+"""
+Synthetic school data at realistic scale.
+
+Students come in families sharing a parent email (so parents see one to
+three children), are spread over classes that each have a couple of
+teachers, and carry a history of health measurements taken every six months,
+test results, the occasional medical condition and, for some, allergies that
+stay on every health row. Everything is drawn from a seeded RNG, so the same
+arguments always produce the same dataset.
+
+Rows are written with ``bulk_create``, bypassing signals, so the change feed
+starts empty; ``latest_health`` is rebuilt and the in-process caches are
+invalidated once the data is in. Synthetic users and students use the
+``bench.example`` email domain, which is how ``clear`` finds them again.
+"""
+import io
+import math
+import random
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..auth.cache import user_cache
+from ..cohorts import cohort_index
+from ..models import Allergy, ChangeLog, ClassGroup, HealthData, MedicalHistory, Student, TestResults, Tests, User, parse_result
+from ..response_cache import response_cache
+
+DOMAIN = 'bench.example'
+CLASS_PREFIX = 'Bench '
+PASSWORD = 'benchmark'
+ADMIN_EMAIL = f'admin@{DOMAIN}'
+
+FIRST_NAMES = [
+    "Ava", "Liam", "Olivia", "Noah", "Emma", "Mason", "Sophia", "Lucas", "Isabella", "Ethan",
+    "Mia", "Benjamin", "Charlotte", "James", "Amelia", "Elijah", "Harper", "Alexander", "Abigail", "Daniel",
+    "Aarav", "Diya", "Arjun", "Ananya", "Kabir", "Saanvi", "Vihaan", "Ishaan", "Meera", "Rohan",
+    "Fatima", "Omar", "Layla", "Yusuf", "Zara", "Hana", "Kenji", "Yuki", "Mateo", "Lucia",
+]
+LAST_NAMES = [
+    "Patel", "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez",
+    "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson",
+    "Sharma", "Iyer", "Nair", "Reddy", "Khan", "Ali", "Chen", "Wang", "Kim", "Nguyen",
+    "Okafor", "Mensah", "Silva", "Costa", "Rossi", "Müller", "Novak", "Kowalski", "Haddad", "Tanaka",
+]
+STREETS = [
+    "Oak Street", "Maple Avenue", "Pine Lane", "Cedar Road", "Birch Blvd", "Spruce Drive", "Willow Way",
+    "Aspen Court", "Elm Circle", "Poplar Place", "Chestnut St", "Walnut Ave", "Hickory Ln", "Sycamore Rd",
+]
+CONDITIONS = [
+    "Asthma", "Eczema", "Type 1 diabetes", "Epilepsy", "ADHD", "Migraine", "Myopia", "Hay fever",
+    "Iron deficiency anaemia", "Scoliosis", "Coeliac disease", "Mild hearing loss", "Recurrent tonsillitis",
+]
+ALLERGIES = {
+    'food': ["Peanut", "Tree nut", "Milk", "Egg", "Wheat", "Soy", "Fish", "Shellfish", "Sesame"],
+    'environment': ["Pollen", "Dust mite", "Mould", "Cat dander", "Dog dander", "Bee sting"],
+    'medication': ["Penicillin", "Aspirin", "Ibuprofen", "Sulfa drugs"],
+    'other': ["Latex", "Nickel"],
+}
+BLOOD_TYPES = ["O+", "A+", "B+", "AB+", "O-", "A-", "B-", "AB-"]
+BLOOD_TYPE_WEIGHTS = [38, 34, 9, 3, 7, 6, 2, 1]
+TESTS = {
+    "Vision": lambda rng: rng.choice(["6/6", "6/6", "6/9", "6/12", "6/18"]),
+    "Hearing": lambda rng: rng.choice(["normal"] * 9 + ["refer"]),
+    "Dental": lambda rng: rng.choice(["healthy", "healthy", "caries", "needs cleaning"]),
+    "Hemoglobin": lambda rng: f"{rng.gauss(12.8, 1.1):.1f}",
+    "Blood pressure": lambda rng: str(round(rng.gauss(105, 10))),
+    "Fitness score": lambda rng: f"{rng.randint(35, 100)}%",
+    "Scoliosis screening": lambda rng: rng.choice(["normal"] * 19 + ["refer"]),
+    "Lead level": lambda rng: rng.choice(["pending", f"{abs(rng.gauss(1.5, 0.8)):.1f}"]),
+}
+FAMILY_SIZES = [1, 2, 3]
+FAMILY_SIZE_WEIGHTS = [60, 30, 10]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let ``bulk_create`` keep the ``created_at``/``updated_at`` values it is given."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _delete(queryset):
+    # A plain DELETE: going through the ORM would load every row to send
+    # delete signals.
+    sql, params = queryset.values('pk').query.sql_with_params()
+    meta = queryset.model._meta
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {meta.db_table} WHERE {meta.pk.column} IN ({sql})', params)
+        return cursor.rowcount
+
+
+def clear():
+    """Remove a previously generated dataset; returns the number of students removed."""
+    students = Student.objects.filter(parent_email__endswith=f'@{DOMAIN}')
+    classes = ClassGroup.objects.filter(name__startswith=CLASS_PREFIX)
+    with transaction.atomic():
+        _delete(HealthData.allergies.through.objects.filter(healthdata__student__in=students))
+        for model in (HealthData, TestResults, MedicalHistory):
+            _delete(model.objects.filter(student__in=students))
+        removed = _delete(students)
+        _delete(ChangeLog.objects.filter(parent_email__endswith=f'@{DOMAIN}'))
+        _delete(ClassGroup.teachers.through.objects.filter(classgroup__in=classes))
+        _delete(classes)
+        _delete(User.objects.filter(email__endswith=f'@{DOMAIN}'))
+    _invalidate()
+    return removed
+
+
+def _invalidate():
+    # The raw SQL writes above send no signals, so drop everything derived
+    # from the tables: cached users and responses, and every process's cohort index.
+    user_cache.clear()
+    response_cache.clear()
+    cohort_index.invalidate()
+
+
+def exists():
+    return User.objects.filter(email=ADMIN_EMAIL).exists()
+
+
+def _catalogue(model, field, names, extra=None):
+    """``{name: id}`` for ``names``, creating the missing rows with ``extra[name]`` as fields."""
+    extra = extra or {}
+    existing = dict(model.objects.filter(**{f'{field}__in': names}).values_list(field, 'id'))
+    missing = [model(**{field: name}, **extra.get(name, {})) for name in names if name not in existing]
+    for row in model.objects.bulk_create(missing):
+        existing[getattr(row, field)] = row.id
+    return existing
+
+
+def generate(students=100_000, class_size=28, teachers_per_class=2, health_rows=10, test_results=10,
+             conditions_per_student=0.6, allergic_share=0.25, seed=0, batch_size=5000, log=None):
+    """
+    Write the dataset and return the number of rows created per model.
+    ``log`` is called with a progress message after every batch.
+    """
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    today = date.today()
+    now = timezone.now()
+    password = make_password(PASSWORD)
+    counts = dict.fromkeys(['users', 'classes', 'students', 'healthdata', 'allergy_links', 'testresults', 'medicalhistory'], 0)
+
+    allergy_types = {name: kind for kind, names in ALLERGIES.items() for name in names}
+    allergies = list(_catalogue(
+        Allergy, 'allergy', list(allergy_types), {name: {'type': kind} for name, kind in allergy_types.items()}
+    ).values())
+    tests = _catalogue(Tests, 'test_name', list(TESTS))
+
+    with transaction.atomic():
+        User.objects.create(name="Benchmark Admin", email=ADMIN_EMAIL, password=password, role='admin')
+        class_count = max(1, math.ceil(students / class_size))
+        teacher_count = max(teachers_per_class, class_count)
+        teachers = User.objects.bulk_create(
+            User(name=f"Teacher {n}", email=f'teacher{n}@{DOMAIN}', password=password, role='teacher')
+            for n in range(teacher_count)
+        )
+        classes = ClassGroup.objects.bulk_create(
+            ClassGroup(name=f"{CLASS_PREFIX}Grade {1 + n % 12}-{n // 12 + 1}") for n in range(class_count)
+        )
+        # Class n is taught by teachers n .. n + teachers_per_class - 1, so
+        # every teacher has that many classes.
+        through = ClassGroup.teachers.through
+        through.objects.bulk_create(
+            through(classgroup_id=group.id, user_id=teachers[(n + k) % teacher_count].id)
+            for n, group in enumerate(classes) for k in range(teachers_per_class)
+        )
+    counts['users'] += 1 + teacher_count
+    counts['classes'] = class_count
+    class_ids = [group.id for group in classes]
+
+    family = 0
+    while counts['students'] < students:
+        batch = []
+        parents = []
+        while len(batch) < batch_size and counts['students'] + len(batch) < students:
+            family += 1
+            email = f'parent{family}@{DOMAIN}'
+            surname = rng.choice(LAST_NAMES)
+            address = f"{rng.randint(1, 999)} {rng.choice(STREETS)}"
+            contact = f"{rng.randint(6, 9)}{rng.randint(0, 10**9 - 1):09d}"
+            parents.append(User(name=f"{rng.choice(FIRST_NAMES)} {surname}", email=email, password=password, role='parent'))
+            size = rng.choices(FAMILY_SIZES, FAMILY_SIZE_WEIGHTS)[0]
+            for _ in range(min(size, students - counts['students'] - len(batch))):
+                batch.append(Student(
+                    name=f"{rng.choice(FIRST_NAMES)} {surname}",
+                    date_of_birth=today - timedelta(days=rng.randint(5 * 365, 17 * 365)),
+                    gender=rng.choice(['male', 'female']),
+                    address=address,
+                    parent_email=email,
+                    contact=contact,
+                    class_group_id=rng.choice(class_ids),
+                ))
+
+        with transaction.atomic(), explicit_timestamps(HealthData, TestResults, MedicalHistory):
+            User.objects.bulk_create(parents)
+            created = Student.objects.bulk_create(batch)
+            health, links, results, history = _records(
+                rng, created, now, allergies, tests, health_rows, test_results, conditions_per_student, allergic_share
+            )
+            health = HealthData.objects.bulk_create(health)
+            link = HealthData.allergies.through
+            link.objects.bulk_create(
+                link(healthdata_id=health[index].id, allergy_id=allergy) for index, allergy in links
+            )
+            TestResults.objects.bulk_create(results)
+            MedicalHistory.objects.bulk_create(history)
+
+        counts['users'] += len(parents)
+        counts['students'] += len(created)
+        counts['healthdata'] += len(health)
+        counts['allergy_links'] += len(links)
+        counts['testresults'] += len(results)
+        counts['medicalhistory'] += len(history)
+        log(f"{counts['students']}/{students} students")
+
+    call_command('rebuild_health_snapshots', stdout=io.StringIO())
+    _invalidate()
+    with connection.cursor() as cursor:
+        # Fresh statistics, so the planner sees the data at its real size.
+        cursor.execute('ANALYZE')
+    return counts
+
+
+def _records(rng, students, now, allergies, tests, health_rows, test_results, conditions_per_student, allergic_share):
+    health, links, results, history = [], [], [], []
+    test_names = list(tests)
+    for student in students:
+        allergic = rng.random() < allergic_share
+        own_allergies = rng.sample(allergies, rng.choice([1, 1, 2, 3])) if allergic else []
+        for k in range(health_rows):
+            taken = now - timedelta(days=182 * (health_rows - 1 - k) + rng.randint(0, 30))
+            age = max(3.0, (taken.date() - student.date_of_birth).days / 365.25)
+            height = max(85.0, rng.gauss(80 + 6 * age, 6))
+            bmi = max(12.0, rng.gauss(15 + 0.35 * (age - 5), 2.2))
+            health.append(HealthData(
+                student=student, height=round(height, 1), weight=round(bmi * (height / 100) ** 2, 1),
+                blood_type=rng.choices(BLOOD_TYPES, BLOOD_TYPE_WEIGHTS)[0], created_at=taken, updated_at=taken,
+            ))
+            links.extend((len(health) - 1, allergy) for allergy in own_allergies)
+        for _ in range(test_results):
+            name = rng.choice(test_names)
+            result = TESTS[name](rng)
+            value, category = parse_result(result)
+            taken = now - timedelta(days=rng.randint(0, 182 * health_rows))
+            results.append(TestResults(
+                student=student, test_id=tests[name], result=result, result_value=value,
+                result_category=category, created_at=taken, updated_at=taken,
+            ))
+        # Up to three conditions, averaging conditions_per_student.
+        conditions = sum(rng.random() < conditions_per_student / 3 for _ in range(3))
+        for condition in rng.sample(CONDITIONS, conditions):
+            noted = now - timedelta(days=rng.randint(0, 3650))
+            history.append(MedicalHistory(student=student, medical_condition=condition, created_at=noted, updated_at=noted))
+    return health, links, results, history
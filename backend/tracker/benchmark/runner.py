@@ -0,0 +1,282 @@
+"""
+Drive the API endpoints in-process, per role, and collect timings.
+
+Requests go through Django's full handler stack (middleware, authentication,
+async views) via the test client, so no HTTP server or network noise is
+involved and queries can be counted exactly. Each endpoint is requested a
+few times to warm caches, then ``iterations`` times for the latency
+percentiles, and once more under tracemalloc for the peak memory it
+allocates. Endpoints that write or never finish (logins and token
+rotation, bulk import, the event stream) are listed as skipped.
+"""
+import logging
+import platform
+import resource
+import subprocess
+import time
+import tracemalloc
+from statistics import quantiles
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from .. import urls as tracker_urls
+from ..models import Allergy, ClassGroup, HealthData, MedicalHistory, Student, TestResults, Tests, User
+from . import dataset
+
+ROLES = ('admin', 'teacher', 'parent')
+NOT_ADMIN = ('teacher', 'parent')
+STAFF = ('admin', 'teacher')
+SKIPPED = {
+    'login': "writes a session per request",
+    'token-refresh': "rotates the token it is called with",
+    'token-revoke': "revokes the token it is called with",
+    'testresults-bulk-create': "writes",
+    'event-stream': "streams until the client disconnects",
+    'profile-report': "only answers for a profiled request",
+}
+
+
+class Sample:
+    """Placeholder for the id of a row the benchmarked user can see."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f'<{self.name}>'
+
+
+# (URL name, URL kwargs, query parameters, roles)
+ENDPOINTS = [
+    ('student-list-create', {}, {'page_size': 50}, ROLES),
+    ('student-list-create', {}, {}, NOT_ADMIN),
+    ('student-detail', {'pk': Sample('student')}, {}, ROLES),
+    ('student-growth', {'pk': Sample('student')}, {}, ROLES),
+    ('growth-list', {}, {'class_group': Sample('class_group')}, ROLES),
+    ('search', {}, {'q': 'pat'}, ROLES),
+    ('search', {}, {'q': 'asthma'}, ROLES),
+    ('change-feed', {}, {}, ROLES),
+    ('class-list-create', {}, {}, STAFF),
+    ('class-detail', {'pk': Sample('class_group')}, {}, STAFF),
+    ('class-summary', {'pk': Sample('class_group')}, {}, STAFF),
+    ('user-list-create', {}, {'page_size': 50}, ROLES),
+    ('user-detail', {'pk': Sample('user')}, {}, ROLES),
+    ('auth-cache-stats', {}, {}, ('admin',)),
+    ('allergy-cohort', {}, {'type': 'food'}, ROLES),
+    ('allergy-list-create', {}, {}, ROLES),
+    ('allergy-detail', {'pk': Sample('allergy')}, {}, ROLES),
+    ('healthdata-list-create', {}, {'student': Sample('student')}, ROLES),
+    ('healthdata-list-create', {}, {'page_size': 50}, ROLES),
+    ('healthdata-detail', {'pk': Sample('healthdata')}, {}, ROLES),
+    ('medicalhistory-list-create', {}, {'student': Sample('student')}, ROLES),
+    ('medicalhistory-list-create', {}, {'page_size': 50}, ROLES),
+    ('medicalhistory-detail', {'pk': Sample('medicalhistory')}, {}, ROLES),
+    ('tests-list-create', {}, {}, ROLES),
+    ('tests-detail', {'pk': Sample('test')}, {}, ROLES),
+    ('testresults-list-create', {}, {'student': Sample('student')}, ROLES),
+    ('testresults-list-create', {}, {'page_size': 50}, ROLES),
+    ('testresults-list-create', {}, {}, ('parent',)),
+    ('testresults-detail', {'pk': Sample('testresult')}, {}, ROLES),
+]
+
+
+def default_users():
+    """The synthetic admin, and the first synthetic teacher and parent."""
+    users = {'admin': User.objects.filter(email=dataset.ADMIN_EMAIL).first()}
+    for role in NOT_ADMIN:
+        users[role] = User.objects.filter(role=role, email__endswith=f'@{dataset.DOMAIN}').order_by('id').first()
+    missing = [role for role, user in users.items() if user is None]
+    if missing:
+        raise LookupError(f"No benchmark user for: {', '.join(missing)}. Run generate_benchmark_data first.")
+    return users
+
+
+def samples(user):
+    """Ids of synthetic rows ``user`` can see, to fill in ``Sample`` placeholders."""
+    def first(queryset):
+        return queryset.order_by('id').values_list('id', flat=True).first()
+
+    synthetic = {'student__parent_email__endswith': f'@{dataset.DOMAIN}'}
+    student = (
+        Student.objects.visible_to(user).filter(parent_email__endswith=f'@{dataset.DOMAIN}')
+        .order_by('id').values('id', 'class_group_id').first() or {}
+    )
+    student_id = student.get('id')
+    return {
+        'student': student_id,
+        'class_group': student.get('class_group_id'),
+        'user': user.id,
+        'allergy': first(Allergy.objects.all()),
+        'test': first(Tests.objects.all()),
+        'healthdata': first(HealthData.objects.visible_to(user).filter(student=student_id)),
+        'medicalhistory': first(MedicalHistory.objects.visible_to(user).filter(**synthetic)),
+        'testresult': first(TestResults.objects.visible_to(user).filter(student=student_id)),
+    }
+
+
+def _fill(values, sample):
+    filled = {}
+    for key, value in values.items():
+        if isinstance(value, Sample):
+            value = sample.get(value.name)
+            if value is None:
+                return None
+        filled[key] = value
+    return filled
+
+
+def label(name, params):
+    query = '&'.join(f'{key}={"<" + value.name + ">" if isinstance(value, Sample) else value}' for key, value in params.items())
+    return f'GET {name}' + (f'?{query}' if query else '')
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def client_for(user, host):
+    client = Client(HTTP_HOST=host, raise_request_exception=False)
+    session = client.session
+    session['user_id'] = user.id
+    session.save()
+    return client
+
+
+def measure(client, path, params, iterations, warmup):
+    """Latency percentiles, queries, response size and peak memory; needs two iterations or more."""
+    for _ in range(warmup):
+        client.get(path, params)
+
+    timings = []
+    queries = []
+    status = None
+    for _ in range(iterations):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            response = client.get(path, params)
+            timings.append(time.perf_counter() - started)
+        queries.append(counter.count)
+        status = response.status_code
+        size = len(response.content) if not response.streaming else None
+
+    tracemalloc.start()
+    try:
+        client.get(path, params)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    cuts = quantiles(timings, n=100)
+    return {
+        'status': status,
+        'p50_ms': round(cuts[49] * 1000, 2),
+        'p95_ms': round(cuts[94] * 1000, 2),
+        'p99_ms': round(cuts[98] * 1000, 2),
+        'max_ms': round(timings[-1] * 1000, 2),
+        'queries': max(queries),
+        'response_bytes': size,
+        'peak_kib': round(peak / 1024),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _run(users, roles, only, iterations, warmup, host, log):
+    results = []
+    routed = {pattern.name for pattern in tracker_urls.urlpatterns}
+    for role in roles:
+        user = users[role]
+        client = client_for(user, host)
+        sample = samples(user)
+        for name, kwargs, params, endpoint_roles in ENDPOINTS:
+            if role not in endpoint_roles or (only and not any(part in name for part in only)):
+                continue
+            entry = {'role': role, 'endpoint': label(name, params)}
+            if name not in routed:
+                results.append({**entry, 'skipped': "not routed"})
+                continue
+            filled_kwargs, filled_params = _fill(kwargs, sample), _fill(params, sample)
+            if filled_kwargs is None or filled_params is None:
+                results.append({**entry, 'skipped': "no visible rows"})
+                continue
+            path = reverse(name, kwargs=filled_kwargs)
+            entry.update(measure(client, path, filled_params, iterations, warmup))
+            results.append(entry)
+            log(f"{role:8} {entry['endpoint']:60} p50 {entry['p50_ms']:8.2f} ms  p95 {entry['p95_ms']:8.2f} ms  "
+                f"{entry['queries']:3} queries  {entry['peak_kib']:7} KiB  [{entry['status']}]")
+    return results
+
+
+def run(users=None, roles=ROLES, only=None, iterations=30, warmup=3, host='localhost', log=None):
+    """
+    Benchmark every endpoint for each role and return the report as a dict.
+    ``only`` limits the run to URL names containing any of the given strings.
+    """
+    log = log or (lambda message: None)
+    users = users or default_users()
+    # Error responses are recorded in the report; logging each one is noise.
+    request_logger = logging.getLogger('django.request')
+    level = request_logger.level
+    request_logger.setLevel(logging.CRITICAL)
+    try:
+        results = _run(users, roles, only, iterations, warmup, host, log)
+    finally:
+        request_logger.setLevel(level)
+
+    names = {pattern.name for pattern in tracker_urls.urlpatterns}
+    covered = {name for name, _, _, _ in ENDPOINTS}
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'iterations': iterations,
+            'warmup': warmup,
+            'dataset': {
+                'students': Student.objects.count(),
+                'classes': ClassGroup.objects.count(),
+                'healthdata': HealthData.objects.count(),
+                'testresults': TestResults.objects.count(),
+                'medicalhistory': MedicalHistory.objects.count(),
+                'users': User.objects.count(),
+            },
+        },
+        'results': results,
+        'skipped': {name: SKIPPED.get(name, "not covered") for name in sorted(names - covered)},
+        # Kilobytes on Linux, bytes on macOS.
+        'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def compare(baseline, current, threshold=0.2):
+    """
+    Rows of ``current`` that got slower than ``baseline`` by more than
+    ``threshold`` at p95, or that run more queries, as ``(key, before, after)``.
+    """
+    before = {(row['role'], row['endpoint']): row for row in baseline['results'] if 'p95_ms' in row}
+    regressions = []
+    for row in current['results']:
+        old = before.get((row['role'], row['endpoint']))
+        if old is None or 'p95_ms' not in row:
+            continue
+        if row['queries'] > old['queries'] or row['p95_ms'] > old['p95_ms'] * (1 + threshold):
+            regressions.append(((row['role'], row['endpoint']), old, row))
+    return regressions
@@ -0,0 +1,165 @@
+"""
+Change feed over students and their records (``/api/changes/?since=``).
+
+Every write to the models in ``FEED_MODELS`` appends a ``ChangeLog`` row:
+signals cover ``save()``/``delete()`` (the detail views' deletes included, as
+tombstones), and the bulk write paths call ``log_bulk``.
+
+The cursor is ``<txid>-<id>``. Log ids are handed out at insert time, so a
+transaction can commit rows with a lower id after a reader has moved past it;
+ordering by the writing transaction's id instead and only serving rows older
+than the oldest transaction still in flight (the snapshot's xmin) means no
+row can ever appear behind a cursor that was already handed out.
+"""
+from django.db import models
+from django.db.models import Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import ChangeLog, HealthData, MedicalHistory, Student, TestResults
+from .serializers import HealthDataSerializer, MedicalHistorySerializer, StudentSerializer, TestResultsSerializer
+
+FEED_MODELS = {
+    'student': (Student, StudentSerializer, {'expand': []}),
+    'healthdata': (HealthData, HealthDataSerializer, {}),
+    'medicalhistory': (MedicalHistory, MedicalHistorySerializer, {}),
+    'testresults': (TestResults, TestResultsSerializer, {}),
+}
+MAX_LIMIT = 1000
+
+
+class SnapshotXmin(models.Func):
+    template = 'pg_snapshot_xmin(pg_current_snapshot())::text::bigint'
+    output_field = models.BigIntegerField()
+
+
+class OwnTransactionId(models.Func):
+    # NULL unless this transaction has written anything.
+    template = 'pg_current_xact_id_if_assigned()::text::bigint'
+    output_field = models.BigIntegerField()
+
+
+def log_change(instance, action):
+    label = instance._meta.model_name
+    if isinstance(instance, Student):
+        ChangeLog.objects.create(
+            model=label, object_id=instance.pk, action=action,
+            class_group_id=instance.class_group_id, parent_email=instance.parent_email,
+        )
+        return
+    # Snapshot the student's scoping columns in the same INSERT.
+    student = Student.objects.filter(pk=instance.student_id)
+    ChangeLog.objects.create(
+        model=label, object_id=instance.pk, action=action,
+        class_group_id=Subquery(student.values('class_group_id')[:1]),
+        parent_email=Coalesce(Subquery(student.values('parent_email')[:1]), Value('')),
+    )
+
+
+def student_scopes(students):
+    """``{student id: (class_group_id, parent_email)}`` for a Student queryset."""
+    return {
+        pk: (class_group, email)
+        for pk, class_group, email in students.values_list('pk', 'class_group_id', 'parent_email')
+    }
+
+
+def log_bulk(model, student_ids, action, scopes=None):
+    """
+    Log ``action`` for rows written without signals, e.g. by ``bulk_create``.
+    ``student_ids`` maps each row's id to its student's id (to itself for
+    students); pass ``scopes`` from ``student_scopes`` if already at hand.
+    """
+    if scopes is None:
+        scopes = student_scopes(Student.objects.filter(pk__in=set(student_ids.values())))
+    label = model._meta.model_name
+    rows = []
+    for object_id, student_id in student_ids.items():
+        class_group, email = scopes.get(student_id, (None, ''))
+        rows.append(ChangeLog(model=label, object_id=object_id, action=action, class_group_id=class_group, parent_email=email))
+    ChangeLog.objects.bulk_create(rows, batch_size=1000)
+
+
+def log_scope_change(student, previous):
+    """
+    Log a student's move to another class or parent email. ``previous`` is
+    the ``(class_group_id, parent_email)`` they had before: the student and
+    their records are logged as deleted under it, for the teacher or parent
+    who can no longer see them, and the records as updated under the new
+    one, for whoever now can. The student's own update is logged as usual.
+    """
+    records = {
+        model: {pk: student.pk for pk in model.objects.filter(student=student.pk).values_list('pk', flat=True)}
+        for model, _, _ in FEED_MODELS.values() if model is not Student
+    }
+    log_bulk(Student, {student.pk: student.pk}, 'deleted', scopes={student.pk: previous})
+    for model, student_ids in records.items():
+        log_bulk(model, student_ids, 'deleted', scopes={student.pk: previous})
+    current = {student.pk: (student.class_group_id, student.parent_email)}
+    for model, student_ids in records.items():
+        log_bulk(model, student_ids, 'updated', scopes=current)
+
+
+def parse_cursor(value):
+    """``'<txid>-<id>'`` to a tuple; raises ValueError for anything else."""
+    txid, _, log_id = value.partition('-')
+    return int(txid), int(log_id)
+
+
+def format_cursor(txid, log_id):
+    return f"{txid}-{log_id}"
+
+
+def committed_log(user):
+    return ChangeLog.objects.visible_to(user).filter(Q(txid__lt=SnapshotXmin()) | Q(txid=OwnTransactionId()))
+
+
+def head_cursor(user):
+    """Cursor of the newest change ``user`` can see, for clients starting to sync."""
+    latest = committed_log(user).order_by('-txid', '-id').values_list('txid', 'id').first()
+    return format_cursor(*(latest or (0, 0)))
+
+
+def read_changes(user, since, limit=500):
+    """
+    Changes after ``since`` as ``(changes, cursor, has_more)``.
+
+    Several changes to the same row within a page collapse into one entry
+    carrying the row's current data; rows that are gone, or no longer visible
+    to ``user``, come back as ``deleted`` with no data.
+    """
+    txid, log_id = since
+    entries = list(
+        committed_log(user).filter(txid__gte=txid).exclude(txid=txid, id__lte=log_id)
+        .order_by('txid', 'id').values_list('txid', 'id', 'model', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if not entries:
+        return [], format_cursor(txid, log_id), False
+
+    latest = {}
+    for _, _, label, object_id, action in entries:
+        latest.pop((label, object_id), None)
+        latest[(label, object_id)] = action
+
+    current = {}
+    for label, (model, serializer_class, shape) in FEED_MODELS.items():
+        ids = [object_id for (name, object_id), action in latest.items() if name == label and action != 'deleted']
+        if not ids:
+            continue
+        queryset = model.objects.visible_to(user).filter(pk__in=ids)
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset, **shape)
+        for row in serializer_class(queryset, many=True, **shape).data:
+            current[(label, row['id'])] = row
+
+    changes = []
+    for key, action in latest.items():
+        data = current.get(key)
+        changes.append({
+            'model': key[0],
+            'id': key[1],
+            'action': 'deleted' if data is None else action,
+            'data': data,
+        })
+    return changes, format_cursor(*entries[-1][:2]), has_more
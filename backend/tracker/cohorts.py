@@ -0,0 +1,335 @@
+"""
+In-memory allergy cohort index.
+
+Answers "which students in these classes are allergic to X" from per-process
+bitmaps instead of walking HealthData -> allergies for every student. Each
+allergy and each class owns a packed bitmap of student ids (bit ``n`` set for
+student ``n``), so a query is a handful of vectorised AND/OR operations.
+
+A student's allergies are the ones on their latest health row, as in
+tracker.summaries. Signals refresh the affected students once their
+transaction commits, and bump a version counter every process can see: a
+PostgreSQL sequence, which also carries bumps from management commands and
+other processes without any shared cache. Each bump records the students,
+allergies and classes it touched in ``CohortChange``, so a process that is
+behind re-reads just those rows. Only when that is impossible (a bulk write
+that called ``invalidate``, changes pruned or not yet committed) does
+``lookup`` return None, callers fall back to SQL and the index is rebuilt,
+at most once per ``REBUILD_INTERVAL`` seconds.
+
+The shared version is read at most once per ``VERSION_TTL`` seconds, so a
+write made by another process can take that long to show up here.
+"""
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+
+from .models import Allergy, ClassGroup, CohortChange, Student
+
+VERSION_SEQUENCE = 'tracker_cohort_version'
+
+
+def _bitmap(ids, size):
+    bits = np.zeros(size, dtype=bool)
+    bits[np.asarray(ids, dtype=np.int64)] = True
+    return np.packbits(bits)
+
+
+def _ids(bitmap):
+    return np.flatnonzero(np.unpackbits(bitmap)).tolist()
+
+
+class CohortIndex:
+
+    def __init__(self, background=True, version_ttl=1, rebuild_interval=30, keep_changes=10000):
+        self.background = background
+        self.version_ttl = version_ttl
+        self.rebuild_interval = rebuild_interval
+        self.keep_changes = keep_changes
+        self._lock = threading.RLock()
+        self._building = threading.Lock()
+        self._checked = (None, 0)
+        self._built_at = None
+        self.version = None
+        self.size = 0
+        self.allergies = {}
+        self.allergy_types = {}
+        self.classes = {}
+
+    def shared_version(self):
+        with connection.cursor() as cursor:
+            # Sequences are not transactional, so this sees every bump at once.
+            cursor.execute(f'SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {VERSION_SEQUENCE}')
+            return cursor.fetchone()[0]
+
+    def _checked_version(self):
+        version, checked_at = self._checked
+        now = time.monotonic()
+        if version is None or now - checked_at >= self.version_ttl:
+            version = self.shared_version()
+            self._checked = (version, now)
+        return version
+
+    def _bump(self, students=(), allergies=(), classes=(), rebuild=False):
+        """Take the next version and record what it touched; returns the version."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {CohortChange._meta.db_table} (version, students, allergies, classes, rebuild) '
+                'VALUES (nextval(%s), %s, %s, %s, %s) RETURNING version',
+                [VERSION_SEQUENCE, list(students), list(allergies), list(classes), rebuild],
+            )
+            version = cursor.fetchone()[0]
+        if version % 1000 == 0:
+            CohortChange.objects.filter(version__lte=version - self.keep_changes).delete()
+        return version
+
+    @property
+    def is_warm(self):
+        """In step with the shared version, after replaying any changes made elsewhere."""
+        if self.version is None:
+            return False
+        shared = self._checked_version()
+        if shared <= self.version:
+            return True
+        with self._lock:
+            return self.version is not None and (shared <= self.version or self._catch_up(shared))
+
+    def _catch_up(self, shared):
+        changes = list(
+            CohortChange.objects.filter(version__gt=self.version, version__lte=shared)
+            .values_list('students', 'allergies', 'classes', 'rebuild')
+        )
+        if len(changes) != shared - self.version or any(rebuild for *_, rebuild in changes):
+            return False
+        students, allergies, classes = ({pk for change in changes for pk in change[n]} for n in range(3))
+        if students:
+            self._replace(list(students), self._student_rows(students))
+        if allergies:
+            types = dict(Allergy.objects.filter(pk__in=allergies).values_list('id', 'type'))
+            for pk in allergies:
+                self._set_allergy(pk, types.get(pk))
+        if classes:
+            for pk in classes - set(ClassGroup.objects.filter(pk__in=classes).values_list('id', flat=True)):
+                self.classes.pop(pk, None)
+        self.version = shared
+        return True
+
+    # -- building -------------------------------------------------------
+
+    def rebuild(self):
+        version = self.shared_version()
+        students = list(Student.objects.values_list('id', 'class_group_id'))
+        links = list(
+            Student.objects.filter(latest_health__allergies__isnull=False)
+            .values_list('id', 'latest_health__allergies')
+        )
+        types = dict(Allergy.objects.values_list('id', 'type'))
+
+        size = self._capacity(max((pk for pk, _ in students), default=0))
+        by_class = defaultdict(list)
+        for pk, class_group in students:
+            if class_group is not None:
+                by_class[class_group].append(pk)
+        by_allergy = defaultdict(list)
+        for pk, allergy in links:
+            by_allergy[allergy].append(pk)
+
+        with self._lock:
+            self.size = size
+            self.classes = {key: _bitmap(ids, size) for key, ids in by_class.items()}
+            self.allergies = {key: _bitmap(ids, size) for key, ids in by_allergy.items()}
+            self.allergy_types = types
+            self.version = version
+
+    def warm(self):
+        """
+        Rebuild a cold index, in a background thread unless configured not to,
+        and no more often than every ``rebuild_interval`` seconds.
+        """
+        if self._built_at is not None and time.monotonic() - self._built_at < self.rebuild_interval:
+            return
+        if not self._building.acquire(blocking=False):
+            return
+        self._built_at = time.monotonic()
+        if not self.background:
+            try:
+                self.rebuild()
+            finally:
+                self._building.release()
+            return
+
+        def run():
+            close_old_connections()
+            try:
+                self.rebuild()
+            finally:
+                connection.close()
+                self._building.release()
+
+        threading.Thread(target=run, name='cohort-index-rebuild', daemon=True).start()
+
+    def _capacity(self, max_id):
+        # Room for the next ids without resizing, rounded to whole bytes.
+        return (int(max_id * 1.25) + 1024) // 8 * 8
+
+    def _grow(self, max_id):
+        if max_id < self.size:
+            return
+        size = self._capacity(max_id)
+        pad = (size - self.size) // 8
+        for bitmaps in (self.allergies, self.classes):
+            for key, bitmap in bitmaps.items():
+                bitmaps[key] = np.concatenate([bitmap, np.zeros(pad, dtype=np.uint8)])
+        self.size = size
+
+    # -- maintenance ----------------------------------------------------
+
+    def refresh_students(self, student_ids):
+        """Re-read the given students once the current transaction commits."""
+        student_ids = list(student_ids)
+        if student_ids:
+            transaction.on_commit(lambda: self._refresh(student_ids))
+
+    def _refresh(self, student_ids):
+        if self.version is None:
+            # Nothing to keep up to date; just let other processes know.
+            self._apply(None, students=student_ids)
+            return
+        rows = self._student_rows(student_ids)
+        self._apply(lambda: self._replace(student_ids, rows), students=student_ids)
+
+    @staticmethod
+    def _student_rows(student_ids):
+        return list(
+            Student.objects.filter(pk__in=student_ids)
+            .values_list('id', 'class_group_id', 'latest_health__allergies')
+        )
+
+    def _replace(self, student_ids, rows):
+        self._grow(max(student_ids))
+        clear = ~_bitmap(student_ids, self.size)
+        for bitmaps in (self.allergies, self.classes):
+            for bitmap in bitmaps.values():
+                np.bitwise_and(bitmap, clear, out=bitmap)
+
+        by_class = defaultdict(set)
+        by_allergy = defaultdict(set)
+        for pk, class_group, allergy in rows:
+            if class_group is not None:
+                by_class[class_group].add(pk)
+            if allergy is not None:
+                by_allergy[allergy].add(pk)
+        for bitmaps, additions in ((self.classes, by_class), (self.allergies, by_allergy)):
+            for key, ids in additions.items():
+                bits = _bitmap(list(ids), self.size)
+                if key in bitmaps:
+                    np.bitwise_or(bitmaps[key], bits, out=bitmaps[key])
+                else:
+                    bitmaps[key] = bits
+
+    def _set_allergy(self, pk, kind):
+        # ``kind`` None means the allergy is gone.
+        if kind is None:
+            self.allergies.pop(pk, None)
+            self.allergy_types.pop(pk, None)
+        else:
+            self.allergy_types[pk] = kind
+
+    def allergy_changed(self, allergy, deleted=False):
+        def change():
+            self._set_allergy(allergy.pk, None if deleted else allergy.type)
+        transaction.on_commit(lambda: self._apply(change, allergies=[allergy.pk]))
+
+    def class_deleted(self, class_group_id):
+        def change():
+            self.classes.pop(class_group_id, None)
+        transaction.on_commit(lambda: self._apply(change, classes=[class_group_id]))
+
+    def invalidate(self):
+        """Mark every process's index cold, e.g. after a bulk write that sent no signals."""
+        transaction.on_commit(lambda: self._apply(None, rebuild=True))
+
+    def _apply(self, change, rebuild=False, **touched):
+        with self._lock:
+            if self.version is not None and change is not None:
+                change()
+            version = self._bump(rebuild=rebuild, **touched)
+            if rebuild:
+                self.version = None
+            # Still in step only if no other process wrote in the meantime;
+            # otherwise stay behind and replay their changes (and this one,
+            # harmlessly) on the next lookup.
+            elif self.version is not None and version == self.version + 1:
+                self.version = version
+
+    # -- queries --------------------------------------------------------
+
+    def lookup(self, allergies=(), types=(), classes=None, visible_classes=None, visible_students=None):
+        """
+        Ids of students allergic to any of ``allergies`` or to any allergy of
+        one of ``types``, limited to ``classes`` and to what the caller may
+        see (``None`` meaning no limit). Returns None while the index is cold.
+        """
+        if not self.is_warm:
+            return None
+        with self._lock:
+            empty = np.zeros(self.size // 8, dtype=np.uint8)
+            wanted = set(allergies) | {pk for pk, kind in self.allergy_types.items() if kind in set(types)}
+            result = self._union(self.allergies, wanted, empty)
+            for limit in (classes, visible_classes):
+                if limit is not None:
+                    result &= self._union(self.classes, limit, empty)
+            if visible_students is not None:
+                result &= _bitmap([pk for pk in visible_students if pk < self.size], self.size)
+            return _ids(result)
+
+    @staticmethod
+    def _union(bitmaps, keys, empty):
+        result = empty.copy()
+        for key in keys:
+            if key in bitmaps:
+                result |= bitmaps[key]
+        return result
+
+
+def cohort_queryset(user, allergies=(), types=(), classes=None):
+    """The SQL equivalent of ``CohortIndex.lookup``, used while the index is cold."""
+    students = Student.objects.visible_to(user).filter(
+        Q(latest_health__allergies__in=allergies) | Q(latest_health__allergies__type__in=types)
+    )
+    if classes is not None:
+        students = students.filter(class_group__in=classes)
+    return students.distinct()
+
+
+def find_cohort(user, allergies=(), types=(), classes=None):
+    """Return ``(student ids, source)``, from the index when warm, else from SQL."""
+    role = getattr(user, 'role', None)
+    visible_classes = visible_students = None
+    if role == 'teacher':
+        visible_classes = list(ClassGroup.objects.visible_to(user).values_list('id', flat=True))
+    elif role == 'parent':
+        visible_students = list(Student.objects.visible_to(user).values_list('id', flat=True))
+    elif role != 'admin':
+        return [], 'index'
+
+    ids = cohort_index.lookup(allergies, types, classes, visible_classes, visible_students)
+    if ids is not None:
+        return ids, 'index'
+    cohort_index.warm()
+    queryset = cohort_queryset(user, allergies, types, classes)
+    return list(queryset.order_by('id').values_list('id', flat=True)), 'database'
+
+
+_config = getattr(settings, 'COHORT_INDEX', {})
+cohort_index = CohortIndex(
+    background=_config.get('BACKGROUND_REBUILD', True),
+    version_ttl=_config.get('VERSION_TTL', 1),
+    rebuild_interval=_config.get('REBUILD_INTERVAL', 30),
+    keep_changes=_config.get('KEEP_CHANGES', 10000),
+)
@@ -0,0 +1,106 @@
+"""
+Conditional GET (``ETag`` / ``Last-Modified``) for the APIView based endpoints.
+
+Validators are computed from ``updated_at`` columns before anything is
+serialized, so a client polling an unchanged resource gets a 304 for the price
+of one small query.
+
+``Last-Modified`` only has one-second granularity, so two writes within the
+same second are told apart by the ``ETag`` alone; clients should revalidate
+with ``If-None-Match`` rather than ``If-Modified-Since``.
+"""
+from hashlib import md5
+from inspect import isawaitable
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def collection_state(queryset):
+    """
+    ``(count, latest updated_at)`` of a queryset, in a single aggregate query.
+
+    The count is there so deletes change the state too.
+    """
+    state = queryset.order_by().aggregate(count=Count('pk'), latest=Max('updated_at'))
+    return state['count'], state['latest']
+
+
+def make_etag(request, *parts):
+    # Responses are role scoped, so the user is part of every validator along
+    # with the full path (query string included: fields, expand, cursor ...).
+    user = request.user
+    key = repr((request.get_full_path(), getattr(user, 'pk', None), getattr(user, 'role', None), parts))
+    return '"%s"' % md5(key.encode(), usedforsecurity=False).hexdigest()
+
+
+def conditional_response(request, render, etag, last_modified=None):
+    """
+    Return a 304 if the client's validators still match, otherwise ``render()``
+    with ``ETag`` (and ``Last-Modified`` when given) set on it.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if not_modified is not None:
+        return not_modified
+    return _set_validators(render(), etag, timestamp)
+
+
+def _set_validators(response, etag, timestamp):
+    if response.status_code == 200:
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+def conditional_list_response(request, state, render):
+    """
+    Conditional GET for a list endpoint whose page is summarised by ``state``
+    (see ``PaginatedListMixin.list_state``).
+
+    No ``Last-Modified`` is sent: a date alone cannot tell that a row was deleted.
+    """
+    return conditional_response(request, render, make_etag(request, state))
+
+
+def conditional_detail_response(request, updated_at, render, related=()):
+    """
+    Conditional GET for a single object last changed at ``updated_at``.
+    ``related`` takes querysets whose rows are nested in the payload, allergies
+    inside health data for instance; they only ever cover small reference tables.
+    """
+    states = [collection_state(qs) for qs in related]
+    last_modified = max([updated_at] + [latest for _, latest in states if latest])
+    etag = make_etag(request, updated_at, *states)
+    return conditional_response(request, render, etag, last_modified=last_modified)
+
+
+# Async variants for tracker.async_views; ``render`` may also be a coroutine function.
+
+async def acollection_state(queryset):
+    state = await queryset.order_by().aaggregate(count=Count('pk'), latest=Max('updated_at'))
+    return state['count'], state['latest']
+
+
+async def aconditional_response(request, render, etag, last_modified=None):
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if not_modified is not None:
+        return not_modified
+    response = render()
+    if isawaitable(response):
+        response = await response
+    return _set_validators(response, etag, timestamp)
+
+
+async def aconditional_list_response(request, state, render):
+    return await aconditional_response(request, render, make_etag(request, state))
+
+
+async def aconditional_detail_response(request, updated_at, render, related=()):
+    states = [await acollection_state(qs) for qs in related]
+    last_modified = max([updated_at] + [latest for _, latest in states if latest])
+    etag = make_etag(request, updated_at, *states)
+    return await aconditional_response(request, render, etag, last_modified=last_modified)
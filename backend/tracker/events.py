@@ -0,0 +1,328 @@
+"""
+Server-sent events for /api/events/.
+
+Test results, health data and medical history are pushed to connected clients
+as they are created, updated or deleted, so dashboards don't have to poll.
+
+Writes publish once their transaction commits, through the broker named in
+``EVENTS['BROKER']``. ``InProcessBroker`` fans messages out to the streams
+served by this process only. ``PostgresBroker`` relays them through
+PostgreSQL LISTEN/NOTIFY instead, for when writes are served by WSGI workers
+and the streams by a separate ASGI process (the ``events`` service in
+docker-compose). Messages are plain JSON-serialisable dicts for that reason,
+with the event body already encoded once.
+
+Each message carries the student's class and parent email as they were when
+the change was made, and every stream only passes on what its user may see,
+by the same rules as ``visible_to``. The stream opens with a ``ready`` event
+carrying the change feed cursor of that moment, and sends ``resync`` when it
+fell too far behind and had to drop events; clients catch up on anything
+they missed from /api/changes/.
+
+Every ``EVENTS['REFRESH']`` seconds, whether or not events are flowing, the
+stream re-reads a teacher's classes and re-checks its user and token. It
+sends ``closed`` and ends once the user is gone, has changed role or email,
+or the token has expired or been revoked.
+
+Streaming needs the ASGI application (``student_tracker.asgi``), e.g. under
+uvicorn; WSGI workers would be held for as long as a client stays connected.
+The API itself is served over WSGI by default, so ASGI is opt-in: run the
+``events`` service alongside it and route /api/events/ there, with
+``EVENTS_BROKER`` set to ``tracker.events.PostgresBroker`` in both.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+import psycopg2
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+
+from .auth.token import read_token
+from .changes import FEED_MODELS, head_cursor, student_scopes
+from .models import ClassGroup, HealthData, MedicalHistory, Student, TestResults, User
+
+logger = logging.getLogger(__name__)
+
+EVENT_MODELS = {model._meta.model_name: model for model in (HealthData, MedicalHistory, TestResults)}
+# Sent through a subscription's queue when it had to drop messages.
+RESYNC = None
+
+
+class Subscription:
+    """One stream's queue, fed from whichever thread publishes."""
+
+    def __init__(self, broker, maxsize):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, message):
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        if self.queue.full():
+            # A slow client: drop its backlog rather than buffer without bound.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = RESYNC
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Publishes to the subscriptions of this process."""
+
+    def __init__(self, queue_size=256):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    @property
+    def has_subscribers(self):
+        # Lets writers skip building messages nobody would receive.
+        return bool(self._subscriptions)
+
+    def subscribe(self):
+        """Call from the event loop the stream runs on."""
+        subscription = Subscription(self, self.queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.put(message)
+            except RuntimeError:
+                # Its event loop has shut down.
+                self.unsubscribe(subscription)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Publishes with ``pg_notify`` and delivers what a listener thread hears on
+    ``channel`` to this process's subscriptions, so every process sees every
+    write. The listener starts with the first subscription, so processes that
+    only write never open a listening connection. Notifications carry at most
+    8000 bytes; a message that does not fit is replaced by a resync.
+    """
+    MAX_PAYLOAD = 7999
+
+    def __init__(self, queue_size=256, channel='tracker_events'):
+        super().__init__(queue_size)
+        self.channel = channel
+        self.listening = threading.Event()
+        self._stopped = threading.Event()
+        self._listener = None
+
+    @property
+    def has_subscribers(self):
+        # Subscribers in other processes can't be seen from here.
+        return True
+
+    def subscribe(self):
+        subscription = super().subscribe()
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='event-broker-listener', daemon=True)
+                self._listener.start()
+        return subscription
+
+    def publish(self, message):
+        payload = json.dumps(message)
+        if len(payload.encode()) > self.MAX_PAYLOAD:
+            payload = json.dumps({'resync': True})
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, payload])
+
+    def stop(self):
+        self._stopped.set()
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            try:
+                self._relay()
+            except psycopg2.Error:
+                logger.exception("Event listener lost its connection; reconnecting")
+                self.listening.clear()
+                # Anything sent meanwhile is lost; let every stream catch up.
+                self._deliver(RESYNC)
+                self._stopped.wait(1)
+
+    def _relay(self):
+        listener = psycopg2.connect(**connection.get_connection_params())
+        try:
+            listener.autocommit = True
+            with listener.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            self.listening.set()
+            while not self._stopped.is_set():
+                if select.select([listener], [], [], 1)[0]:
+                    listener.poll()
+                    while listener.notifies:
+                        message = json.loads(listener.notifies.pop(0).payload)
+                        self._deliver(RESYNC if message.get('resync') else message)
+        finally:
+            listener.close()
+
+    def _deliver(self, message):
+        super().publish(message)
+
+
+def _scope(student_id):
+    class_group, email = student_scopes(Student.objects.filter(pk=student_id)).get(student_id, (None, ''))
+    return {'class_group': class_group, 'parent_email': email}
+
+
+def publish_change(instance, action):
+    """Publish a change to ``instance`` once the current transaction commits."""
+    if not broker.has_subscribers:
+        return
+    # Taken now: after a delete the student may be gone by commit time.
+    scope = _scope(instance.student_id)
+    entry = (instance.pk, instance.student_id, action, scope)
+    transaction.on_commit(lambda: _publish(type(instance), [entry]))
+
+
+def publish_bulk(model, student_ids, action, scopes):
+    """
+    Publish rows written without signals. ``student_ids`` maps each row's id
+    to its student's id and ``scopes`` comes from ``changes.student_scopes``.
+    """
+    if not broker.has_subscribers:
+        return
+    entries = []
+    for object_id, student_id in student_ids.items():
+        class_group, email = scopes.get(student_id, (None, ''))
+        entries.append((object_id, student_id, action, {'class_group': class_group, 'parent_email': email}))
+    transaction.on_commit(lambda: _publish(model, entries))
+
+
+def _publish(model, entries):
+    label = model._meta.model_name
+    _, serializer_class, _ = FEED_MODELS[label]
+    ids = [object_id for object_id, _, action, _ in entries if action != 'deleted']
+    current = {}
+    if ids:
+        queryset = model.objects.filter(pk__in=ids)
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        current = {row['id']: row for row in serializer_class(queryset, many=True).data}
+
+    encoder = JSONEncoder()
+    for object_id, student_id, action, scope in entries:
+        data = current.get(object_id)
+        if data is None:
+            action = 'deleted'
+        body = {'model': label, 'id': object_id, 'action': action, 'student': student_id, 'data': data}
+        broker.publish({'event': label, 'student': student_id, **scope, 'body': encoder.encode(body)})
+
+
+class Viewer:
+    """Decides which messages a stream's user may receive."""
+
+    def __init__(self, user, models=None, students=None, token=None):
+        self.user = user
+        self.role = getattr(user, 'role', None)
+        self.models = models
+        self.students = students
+        self.token = token
+        self.classes = set()
+
+    def refresh(self):
+        """
+        Re-check the user (and token, if the stream was opened with one) and
+        re-read a teacher's classes. Returns False once the stream must close.
+        """
+        if self.token is not None:
+            try:
+                read_token(self.token)
+            except AuthenticationFailed:
+                return False
+        current = User.objects.filter(pk=self.user.pk).values_list('role', 'email').first()
+        if current != (self.role, self.user.email):
+            return False
+        # Teachers can be added to or removed from classes while connected.
+        if self.role == 'teacher':
+            self.classes = set(ClassGroup.objects.visible_to(self.user).values_list('id', flat=True))
+        return True
+
+    def wants(self, message):
+        if self.models is not None and message['event'] not in self.models:
+            return False
+        if self.students is not None and message['student'] not in self.students:
+            return False
+        if self.role == 'admin':
+            return True
+        if self.role == 'teacher':
+            return message['class_group'] in self.classes
+        if self.role == 'parent':
+            return message['parent_email'] == self.user.email
+        return False
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def event_stream(viewer, keepalive=None, refresh=None):
+    """Yield server-sent events for ``viewer`` until the client disconnects."""
+    keepalive = keepalive or _config.get('KEEPALIVE', 15)
+    refresh = _config.get('REFRESH', 15) if refresh is None else refresh
+    encoder = JSONEncoder()
+    closed = format_event('closed', encoder.encode({'detail': "Credentials are no longer valid."}))
+    subscription = broker.subscribe()
+    try:
+        # Subscribed first, so nothing falls between the cursor and the stream.
+        if not await sync_to_async(viewer.refresh)():
+            yield closed
+            return
+        refreshed = time.monotonic()
+        cursor = await sync_to_async(head_cursor)(viewer.user)
+        yield f"retry: {keepalive * 1000}\n" + format_event('ready', encoder.encode({'cursor': cursor}))
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), keepalive)
+            except TimeoutError:
+                message = None
+            # Checked before every event, so steady traffic can't postpone it.
+            if time.monotonic() - refreshed >= refresh:
+                if not await sync_to_async(viewer.refresh)():
+                    yield closed
+                    return
+                refreshed = time.monotonic()
+            if message is None:
+                yield ": keepalive\n\n"
+            elif message is RESYNC:
+                cursor = await sync_to_async(head_cursor)(viewer.user)
+                yield format_event('resync', encoder.encode({'cursor': cursor}))
+            elif viewer.wants(message):
+                yield format_event(message['event'], message['body'])
+    finally:
+        subscription.close()
+
+
+_config = getattr(settings, 'EVENTS', {})
+broker = import_string(_config.get('BROKER', 'tracker.events.InProcessBroker'))(
+    **_config.get('BROKER_OPTIONS', {'queue_size': 256})
+)
@@ -0,0 +1,167 @@
+import http.client
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+from statistics import quantiles
+
+from django.core.management.base import BaseCommand, CommandError
+
+SERVERS = {
+    # The previous deployment: sync views in a threaded WSGI worker.
+    'wsgi': lambda port, workers, threads: [
+        sys.executable, '-m', 'gunicorn', 'student_tracker.wsgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads),
+        '--log-level', 'warning',
+    ],
+    'asgi': lambda port, workers, threads: [
+        sys.executable, '-m', 'uvicorn', 'student_tracker.asgi:application',
+        '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers),
+        '--log-level', 'warning', '--no-access-log',
+    ],
+}
+DEFAULT_PATHS = ['/api/testresults/', '/api/medicalhistory/', '/api/healthdata/']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def summarise(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    if len(latencies) < 2:
+        return {'requests': len(latencies), 'errors': errors}
+    cuts = quantiles(latencies, n=100)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(cuts[49] * 1000, 2),
+        'p95_ms': round(cuts[94] * 1000, 2),
+        'p99_ms': round(cuts[98] * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent throughput and tail latency of the API served by "
+        "gunicorn (WSGI) and by uvicorn (ASGI). Both servers run against the "
+        "configured database, so point it at a seeded copy, not production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', required=True, help="Login for the benchmark user.")
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+        parser.add_argument('--path', action='append', dest='paths', help="GET path to load; repeatable.")
+        parser.add_argument('--no-login', action='store_true', help="Skip the password check scenario.")
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per scenario.")
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=8, help="Threads per WSGI worker.")
+        parser.add_argument('--output', help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or DEFAULT_PATHS
+        login_body = json.dumps({'email': options['email'], 'password': options['password']})
+        results = {}
+        for name in options['servers']:
+            port = free_port()
+            command = SERVERS[name](port, options['workers'], options['threads'])
+            server = subprocess.Popen(command)
+            try:
+                self.wait_until_ready(port, server)
+                token = self.login(port, login_body)
+                scenarios = [('GET', path, None, {'Authorization': f'Bearer {token}'}) for path in paths]
+                if not options['no_login']:
+                    scenarios.append(('POST', '/api/login/', login_body, {'Content-Type': 'application/json'}))
+
+                results[name] = {}
+                for method, path, body, headers in scenarios:
+                    label = f'{method} {path}'
+                    stats = self.load(port, method, path, body, headers, options['concurrency'], options['duration'])
+                    results[name][label] = stats
+                    self.stdout.write(f"{name:5} {label:40} {self.format_stats(stats)}")
+            finally:
+                server.terminate()
+                server.wait(10)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump({'options': {k: options[k] for k in ('concurrency', 'duration', 'workers', 'threads')},
+                           'results': results}, handle, indent=2)
+
+    def wait_until_ready(self, port, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"Server exited with status {server.returncode}; is it installed?")
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"Server did not start listening on port {port}.")
+
+    def login(self, port, body):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        connection.request('POST', '/api/login/', body, {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        data = json.loads(response.read() or b'{}')
+        connection.close()
+        if response.status != 200 or 'token' not in data:
+            raise CommandError(f"Login failed ({response.status}); check the credentials and that token auth is enabled.")
+        return data['token']
+
+    def load(self, port, method, path, body, headers, concurrency, duration):
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        start = threading.Barrier(concurrency + 1)
+        deadline = [0.0]
+
+        def client():
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            mine = []
+            failed = 0
+            start.wait()
+            while time.perf_counter() < deadline[0]:
+                began = time.perf_counter()
+                try:
+                    connection.request(method, path, body, headers)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status >= 400:
+                        failed += 1
+                        continue
+                except (OSError, http.client.HTTPException):
+                    failed += 1
+                    connection.close()
+                    continue
+                mine.append(time.perf_counter() - began)
+            connection.close()
+            with lock:
+                latencies.extend(mine)
+                errors.append(failed)
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        deadline[0] = time.perf_counter() + duration
+        began = time.perf_counter()
+        start.wait()
+        for thread in threads:
+            thread.join()
+        return summarise(latencies, sum(errors), time.perf_counter() - began)
+
+    @staticmethod
+    def format_stats(stats):
+        if 'p50_ms' not in stats:
+            return f"{stats['requests']} requests, {stats['errors']} errors"
+        return (f"{stats['throughput']:8.1f} req/s  p50 {stats['p50_ms']:7.1f}  p95 {stats['p95_ms']:7.1f}  "
+                f"p99 {stats['p99_ms']:7.1f} ms  errors {stats['errors']}")
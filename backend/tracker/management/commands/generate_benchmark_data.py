@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.benchmark import dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic school for benchmarking: families of "
+        "students spread over classes with their teachers, health data every six "
+        "months, test results, medical history and allergies. Use a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=100_000)
+        parser.add_argument('--class-size', type=int, default=28)
+        parser.add_argument('--teachers-per-class', type=int, default=2)
+        parser.add_argument('--health-rows', type=int, default=10, help="Health data rows per student.")
+        parser.add_argument('--test-results', type=int, default=10, help="Test results per student.")
+        parser.add_argument('--conditions', type=float, default=0.6, help="Average medical conditions per student.")
+        parser.add_argument('--allergic-share', type=float, default=0.25, help="Share of students with allergies.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--replace', action='store_true', help="Remove a previously generated dataset first.")
+        parser.add_argument('--clear', action='store_true', help="Only remove a previously generated dataset.")
+
+    def handle(self, *args, **options):
+        if options['clear'] or options['replace']:
+            removed = dataset.clear()
+            self.stdout.write(f"Removed {removed} synthetic students.")
+            if options['clear']:
+                return
+        elif dataset.exists():
+            raise CommandError("A benchmark dataset already exists; pass --replace to regenerate it.")
+
+        started = time.perf_counter()
+        counts = dataset.generate(
+            students=options['students'],
+            class_size=options['class_size'],
+            teachers_per_class=options['teachers_per_class'],
+            health_rows=options['health_rows'],
+            test_results=options['test_results'],
+            conditions_per_student=options['conditions'],
+            allergic_share=options['allergic_share'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        summary = ', '.join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {summary} in {time.perf_counter() - started:.1f}s. "
+            f"Every user's password is '{dataset.PASSWORD}'."
+        ))
@@ -0,0 +1,191 @@
+import csv
+import json
+import sys
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tracker.changes import log_bulk
+from tracker.models import ClassGroup, HealthData, Student
+
+GENDERS = {'male', 'female'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a roster of students (and optionally their current health data) "
+        "from CSV, NDJSON or a JSON array. Columns: name, date_of_birth, gender, "
+        "address, parent_email, contact, class_group, and optionally height, "
+        "weight, blood_type."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument('--format', dest='fmt', choices=['csv', 'ndjson', 'json'], help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true', help="Validate without writing anything.")
+
+    def handle(self, *args, path, fmt, batch_size, dry_run, **options):
+        fmt = fmt or self.guess_format(path)
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+
+        self.verbosity = options['verbosity']
+        self.dry_run = dry_run
+        self.class_groups = dict(ClassGroup.objects.values_list('name', 'id'))
+        self.imported = self.health_rows = self.skipped = 0
+        started = time.perf_counter()
+
+        try:
+            batch = []
+            for lineno, record in self.read_records(stream, fmt):
+                try:
+                    if isinstance(record, ValueError):
+                        raise record
+                    batch.append(self.build(record))
+                except ValueError as exc:
+                    self.skipped += 1
+                    self.stderr.write(f"Record {lineno}: {exc}")
+                    continue
+
+                if len(batch) >= batch_size:
+                    self.flush(batch)
+                    batch = []
+            self.flush(batch)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        rate = self.imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Validated' if dry_run else 'Imported'} {self.imported} students and {self.health_rows} health rows "
+            f"in {elapsed:.1f}s ({rate:,.0f} students/s); skipped {self.skipped}."
+        ))
+
+    def guess_format(self, path):
+        for fmt in ('csv', 'ndjson', 'json'):
+            if path.endswith(f'.{fmt}'):
+                return fmt
+        raise CommandError("Cannot tell the input format from the file name, pass --format.")
+
+    def read_records(self, stream, fmt):
+        """
+        ``(line or record number, record)`` pairs. NDJSON lines that do not
+        parse come back as a ValueError, to be skipped like invalid records.
+        """
+        if fmt == 'csv':
+            # Line 1 is the header.
+            yield from enumerate(csv.DictReader(stream), start=2)
+        elif fmt == 'ndjson':
+            for lineno, line in enumerate(stream, start=1):
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except ValueError as exc:
+                        record = ValueError(f"invalid JSON ({exc})")
+                    yield lineno, record
+        else:
+            # A JSON array has to be parsed in full; prefer NDJSON for very large files.
+            yield from enumerate(json.load(stream), start=1)
+
+    @staticmethod
+    def text(record, field, model_field=None, numbers=False):
+        """
+        A stripped string column, checked against the max_length of
+        ``model_field`` (the Student field of the same name by default).
+        """
+        value = record.get(field)
+        if value is None:
+            return ''
+        if numbers and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+        value = value.strip()
+        max_length = (model_field or Student._meta.get_field(field)).max_length
+        if max_length is not None and len(value) > max_length:
+            raise ValueError(f"{field} is longer than {max_length} characters")
+        return value
+
+    @staticmethod
+    def number(record, field):
+        try:
+            return float(record[field])
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number")
+
+    def build(self, record):
+        if not isinstance(record, dict):
+            raise ValueError("expected an object")
+        name = self.text(record, 'name')
+        if not name:
+            raise ValueError("name is required")
+
+        gender = self.text(record, 'gender').lower() or None
+        if gender is not None and gender not in GENDERS:
+            raise ValueError(f"unknown gender '{gender}'")
+
+        dob = record.get('date_of_birth') or None
+        if dob is not None:
+            if not isinstance(dob, str):
+                raise ValueError("date_of_birth must be an ISO date string")
+            dob = date.fromisoformat(dob)
+
+        student = Student(
+            name=name,
+            date_of_birth=dob,
+            gender=gender,
+            address=self.text(record, 'address'),
+            parent_email=self.text(record, 'parent_email'),
+            contact=self.text(record, 'contact', numbers=True),
+        )
+        # Checked here, looked up or created in flush().
+        class_group = self.text(record, 'class_group', ClassGroup._meta.get_field('name'), numbers=True) or None
+
+        health = None
+        if record.get('height') not in (None, '') and record.get('weight') not in (None, ''):
+            health = HealthData(
+                height=self.number(record, 'height'),
+                weight=self.number(record, 'weight'),
+                blood_type=self.text(record, 'blood_type', HealthData._meta.get_field('blood_type')),
+            )
+        return student, health, class_group
+
+    def assign_classes(self, batch):
+        """Point the batch at its classes, creating missing ones in the batch's transaction."""
+        created = {}
+        for student, _, name in batch:
+            if name is None:
+                continue
+            class_id = self.class_groups.get(name) or created.get(name)
+            if class_id is None:
+                class_id = created[name] = ClassGroup.objects.create(name=name).id
+            student.class_group_id = class_id
+        return created
+
+    def flush(self, batch):
+        if not batch:
+            return
+        if not self.dry_run:
+            with transaction.atomic():
+                created = self.assign_classes(batch)
+                students = Student.objects.bulk_create([student for student, _, _ in batch])
+                health = []
+                for student, row in zip(students, (row for _, row, _ in batch)):
+                    if row is not None:
+                        row.student = student
+                        health.append(row)
+                HealthData.objects.bulk_create(health)
+                # bulk_create sends no signals, so point latest_health at the new
+                # rows and log them for the change feed here.
+                Student.objects.filter(pk__in=[row.student_id for row in health]).refresh_latest_health()
+                log_bulk(Student, {student.id: student.id for student in students}, 'created')
+                log_bulk(HealthData, {row.id: row.student_id for row in health}, 'created')
+            # Only remembered once committed; a failed batch rolls its classes back.
+            self.class_groups.update(created)
+        self.imported += len(batch)
+        self.health_rows += sum(1 for _, row, _ in batch if row is not None)
+        if self.verbosity >= 2:
+            self.stdout.write(f"  {self.imported} students so far")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tracker.cohorts import cohort_index
+from tracker.models import Student
+
+
+class Command(BaseCommand):
+    help = "Recompute every student's latest_health pointer from their HealthData rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, batch_size, **options):
+        ids = Student.objects.order_by('id').values_list('id', flat=True)
+        last_id = 0
+        updated = 0
+        while True:
+            batch = list(ids.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                updated += Student.objects.filter(id__gte=batch[0], id__lte=batch[-1]).refresh_latest_health()
+            last_id = batch[-1]
+        # Queryset updates send no signals.
+        cohort_index.invalidate()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt health snapshots for {updated} students."))
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.benchmark import runner
+
+
+class Command(BaseCommand):
+    help = (
+        "Request every read endpoint as the benchmark admin, teacher and parent "
+        "and report latency percentiles, queries per request and peak memory. "
+        "Run generate_benchmark_data first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--roles', nargs='+', choices=runner.ROLES, default=list(runner.ROLES))
+        parser.add_argument('--only', nargs='+', help="Only URL names containing one of these strings.")
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--host', default='localhost', help="Host header; must be in ALLOWED_HOSTS.")
+        parser.add_argument('--output', help="Write the report to this JSON file.")
+        parser.add_argument('--compare', help="Report from an earlier run to check for regressions.")
+        parser.add_argument('--threshold', type=float, default=0.2, help="Allowed p95 slowdown, as a fraction.")
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError("--iterations must be at least 2.")
+        try:
+            report = runner.run(
+                roles=options['roles'], only=options['only'], iterations=options['iterations'],
+                warmup=options['warmup'], host=options['host'], log=self.stdout.write,
+            )
+        except LookupError as exc:
+            raise CommandError(str(exc))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump(report, handle, indent=2, sort_keys=True)
+                handle.write('\n')
+            self.stdout.write(f"Wrote {options['output']}.")
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as handle:
+                baseline = json.load(handle)
+            regressions = runner.compare(baseline, report, options['threshold'])
+            for (role, endpoint), before, after in regressions:
+                self.stdout.write(self.style.WARNING(
+                    f"{role:8} {endpoint:60} p95 {before['p95_ms']:.2f} -> {after['p95_ms']:.2f} ms, "
+                    f"queries {before['queries']} -> {after['queries']}"
+                ))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+            elif options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} endpoint(s) regressed.")
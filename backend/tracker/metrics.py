@@ -0,0 +1,257 @@
+"""
+Per-endpoint request metrics, exported in Prometheus text format at /metrics.
+
+``MetricsMiddleware`` times every request and labels it with the resolved URL
+name and method. A database execute wrapper, installed on each connection as
+it opens, counts the queries run on behalf of the request and their time;
+the request is found through a context variable, which asgiref carries into
+the threads async views run their queries in.
+
+Recording takes no locks: each thread that records owns a shard of plain
+counters, and /metrics adds the shards up when scraped. A scrape racing a
+request may see its count before its histogram bucket, which Prometheus
+tolerates. The figures are per process; with several workers, scrape each
+one (or accept seeing one worker per scrape).
+
+Streaming responses are timed until the view returns them, not until the
+last byte is sent, and their size is not recorded.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .auth.cache import user_cache
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_request = ContextVar('tracker_metrics_request', default=None)
+
+
+def _config(key, default):
+    return getattr(settings, 'METRICS', {}).get(key, default)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - started
+        stats.queries += 1
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Shard:
+    """One thread's counters, only ever written by that thread."""
+
+    def __init__(self):
+        self.requests = {}
+        self.series = {}
+
+    def histogram(self, name, labels, buckets):
+        key = (name, labels)
+        histogram = self.series.get(key)
+        if histogram is None:
+            histogram = self.series[key] = Histogram(buckets)
+        return histogram
+
+
+class Registry:
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = Shard()
+            # Only taken once per thread; recording itself never locks.
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def record(self, view, method, status, duration, stats, size):
+        shard = self.shard()
+        labels = (view, method)
+        key = labels + (str(status),)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        shard.histogram('http_request_duration_seconds', labels, LATENCY_BUCKETS).observe(duration)
+        shard.histogram('db_queries_per_request', labels, QUERY_BUCKETS).observe(stats.queries)
+        shard.histogram('db_query_duration_seconds_per_request', labels, LATENCY_BUCKETS).observe(stats.db_time)
+        if size is not None:
+            shard.histogram('http_response_size_bytes', labels, SIZE_BUCKETS).observe(size)
+
+    def collect(self):
+        """Return ``(request counters, histograms)`` summed over every shard."""
+        with self._lock:
+            shards = list(self._shards)
+        requests = {}
+        series = {}
+        for shard in shards:
+            for key, value in list(shard.requests.items()):
+                requests[key] = requests.get(key, 0) + value
+            for key, histogram in list(shard.series.items()):
+                total = series.get(key)
+                if total is None:
+                    total = series[key] = Histogram(histogram.buckets)
+                total.counts = [a + b for a, b in zip(total.counts, histogram.counts)]
+                total.sum += histogram.sum
+                total.count += histogram.count
+        return requests, series
+
+    def clear(self):
+        with self._lock:
+            for shard in self._shards:
+                shard.requests = {}
+                shard.series = {}
+
+
+registry = Registry()
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_label_value(value)}"' for key, value in labels.items()) + '}'
+
+
+def render_metrics():
+    requests, series = registry.collect()
+    lines = [
+        '# HELP tracker_http_requests_total Requests by URL name, method and status.',
+        '# TYPE tracker_http_requests_total counter',
+    ]
+    for (view, method, status), value in sorted(requests.items()):
+        lines.append(f'tracker_http_requests_total{_labels(view=view, method=method, status=status)} {value}')
+
+    help_text = {
+        'http_request_duration_seconds': 'Time spent handling the request.',
+        'db_queries_per_request': 'Database queries run by the request.',
+        'db_query_duration_seconds_per_request': 'Time the request spent waiting on the database.',
+        'http_response_size_bytes': 'Response body size.',
+    }
+    for name, text in help_text.items():
+        metric = f'tracker_{name}'
+        lines.append(f'# HELP {metric} {text}')
+        lines.append(f'# TYPE {metric} histogram')
+        for (series_name, (view, method)), histogram in sorted(series.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                labels = _labels(view=view, method=method, le=bound)
+                lines.append(f'{metric}_bucket{labels} {cumulative}')
+            lines.append(f'{metric}_sum{_labels(view=view, method=method)} {histogram.sum}')
+            lines.append(f'{metric}_count{_labels(view=view, method=method)} {histogram.count}')
+
+    cache = user_cache.stats()
+    for key, kind in (('hits', 'counter'), ('misses', 'counter'), ('evictions', 'counter'), ('size', 'gauge')):
+        metric = f'tracker_user_cache_{key}' + ('_total' if kind == 'counter' else '')
+        lines.append(f'# TYPE {metric} {kind}')
+        lines.append(f'{metric} {cache[key]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _allowed(request):
+    if request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS:
+        return True
+    token = _config('TOKEN', None)
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+
+
+def metrics_view(request):
+    """Prometheus scrape target, for INTERNAL_IPS or ``Bearer <METRICS['TOKEN']>``."""
+    if not _allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = _config('SERVER_TIMING', True)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    def finish(self, request, response, stats, duration):
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        registry.record(view, request.method, response.status_code, duration, stats, size)
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+                f'app;dur={(duration - stats.db_time) * 1000:.1f}'
+            )
+        return response
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0007_testresults_notes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='healthdata',
+            index=models.Index(fields=['student', '-created_at'], name='healthdata_student_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='healthdata',
+            index=models.Index(fields=['-created_at', '-id'], name='healthdata_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalhistory',
+            index=models.Index(fields=['student', '-created_at'], name='medhistory_student_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalhistory',
+            index=models.Index(fields=['-created_at', '-id'], name='medhistory_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['parent_email'], name='student_parent_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testresults',
+            index=models.Index(fields=['student', '-created_at'], name='testres_student_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testresults',
+            index=models.Index(fields=['-created_at', '-id'], name='testres_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testresults',
+            index=models.Index(fields=['test', 'created_at'], name='testres_test_created_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0008_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testresults',
+            name='test_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='results', to='tracker.tests'),
+        ),
+        migrations.AddField(
+            model_name='testresults',
+            name='result_category',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='testresults',
+            name='result_value',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:35
+
+from django.db import migrations
+
+
+def parse_result(result):
+    # Frozen copy of tracker.models.parse_result.
+    text = str(result).strip()
+    try:
+        return float(text.rstrip('%').strip()), ''
+    except ValueError:
+        return None, text.lower()[:50]
+
+
+def link_tests(apps, schema_editor):
+    Tests = apps.get_model('tracker', 'Tests')
+    TestResults = apps.get_model('tracker', 'TestResults')
+
+    # Map each distinct free-text test name onto a Tests row, creating the ones
+    # that were never registered, then repoint results one UPDATE per name.
+    known = {}
+    for test_id, name in Tests.objects.order_by('-id').values_list('id', 'test_name'):
+        known[name] = test_id
+    for name in TestResults.objects.values_list('test', flat=True).distinct():
+        if name not in known:
+            known[name] = Tests.objects.create(test_name=name).id
+        TestResults.objects.filter(test=name).update(test_ref=known[name])
+
+    batch = []
+    for row in TestResults.objects.only('id', 'result').iterator(chunk_size=2000):
+        row.result_value, row.result_category = parse_result(row.result)
+        batch.append(row)
+        if len(batch) == 2000:
+            TestResults.objects.bulk_update(batch, ['result_value', 'result_category'])
+            batch = []
+    TestResults.objects.bulk_update(batch, ['result_value', 'result_category'])
+
+
+def unlink_tests(apps, schema_editor):
+    Tests = apps.get_model('tracker', 'Tests')
+    TestResults = apps.get_model('tracker', 'TestResults')
+    for test_id, name in Tests.objects.values_list('id', 'test_name'):
+        TestResults.objects.filter(test_ref=test_id).update(test=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0009_testresults_test_ref'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_tests, unlink_tests),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0010_link_testresults_tests'),
+    ]
+
+    operations = [
+        # Give the old column a default so this migration can be reversed on a
+        # populated table; 0010 refills it on the way back.
+        migrations.AlterField(
+            model_name='testresults',
+            name='test',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.RemoveIndex(
+            model_name='testresults',
+            name='testres_test_created_idx',
+        ),
+        migrations.RemoveField(
+            model_name='testresults',
+            name='test',
+        ),
+        migrations.RenameField(
+            model_name='testresults',
+            old_name='test_ref',
+            new_name='test',
+        ),
+        migrations.AlterField(
+            model_name='testresults',
+            name='test',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='results', to='tracker.tests'),
+        ),
+        migrations.AddIndex(
+            model_name='testresults',
+            index=models.Index(fields=['test', 'created_at'], name='testres_test_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testresults',
+            index=models.Index(fields=['test', 'result_value'], name='testres_test_value_idx'),
+        ),
+    ]
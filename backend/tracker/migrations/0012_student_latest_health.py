@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_latest_health(apps, schema_editor):
+    Student = apps.get_model('tracker', 'Student')
+    HealthData = apps.get_model('tracker', 'HealthData')
+    latest = HealthData.objects.filter(student=models.OuterRef('pk')).order_by('-created_at', '-id').values('id')[:1]
+    Student.objects.update(latest_health=models.Subquery(latest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0011_testresults_test_fk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='latest_health',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tracker.healthdata'),
+        ),
+        migrations.RunPython(fill_latest_health, migrations.RunPython.noop),
+    ]
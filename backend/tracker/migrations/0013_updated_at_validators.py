@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0012_student_latest_health'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='classgroup',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='tests',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
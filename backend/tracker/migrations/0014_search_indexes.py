@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:50
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0013_updated_at_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicalhistory',
+            name='search_document',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('medical_condition', config='english'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='search_document',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', config='simple', weight='A'), '||', django.contrib.postgres.search.SearchVector('parent_email', config='simple', weight='B'), django.contrib.postgres.search.SearchConfig('simple')), '||', django.contrib.postgres.search.SearchVector('address', config='simple', weight='C'), django.contrib.postgres.search.SearchConfig('simple')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='medicalhistory',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='medhistory_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='student_search_idx'),
+        ),
+    ]
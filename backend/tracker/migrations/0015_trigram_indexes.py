@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# Trigram indexes for fuzzy type-ahead in /api/search/. pg_trgm ships with the
+# standard contrib package but not with every Postgres build, so the extension
+# and indexes are only created where the server offers it; tracker.search
+# falls back to full-text matching alone when it is missing.
+TRIGRAM_INDEXES = [
+    ('student_name_trgm_idx', 'tracker_student', 'name'),
+    ('student_email_trgm_idx', 'tracker_student', 'parent_email'),
+    ('medhistory_cond_trgm_idx', 'tracker_medicalhistory', 'medical_condition'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)")
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0014_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
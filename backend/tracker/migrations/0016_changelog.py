@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:56
+
+import tracker.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0015_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('txid', models.BigIntegerField(db_default=tracker.models.CurrentTransactionId())),
+                ('model', models.CharField(max_length=20)),
+                ('object_id', models.IntegerField()),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=10)),
+                ('class_group_id', models.IntegerField(blank=True, null=True)),
+                ('parent_email', models.EmailField(blank=True, default='', max_length=254)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['txid', 'id'], name='changelog_cursor_idx'), models.Index(fields=['class_group_id', 'txid', 'id'], name='changelog_class_cursor_idx'), models.Index(fields=['parent_email', 'txid', 'id'], name='changelog_parent_cursor_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0016_changelog'),
+    ]
+
+    operations = [
+        # Version counter of the in-memory cohort index, see tracker/cohorts.py.
+        migrations.RunSQL(
+            'CREATE SEQUENCE tracker_cohort_version',
+            'DROP SEQUENCE tracker_cohort_version',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:43
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0017_cohort_version_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CohortChange',
+            fields=[
+                ('version', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('students', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+                ('allergies', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+                ('classes', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+                ('rebuild', models.BooleanField(default=False)),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# Only the name is matched by similarity in tracker.search; parent emails and
+# medical conditions go through the full-text indexes, so these two trigram
+# indexes from migration 0015 only slowed writes down.
+UNUSED_INDEXES = [
+    ('student_email_trgm_idx', 'tracker_student', 'parent_email'),
+    ('medhistory_cond_trgm_idx', 'tracker_medicalhistory', 'medical_condition'),
+]
+
+
+def drop_indexes(apps, schema_editor):
+    for name, _, _ in UNUSED_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def create_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    for name, table, column in UNUSED_INDEXES:
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0018_cohortchange'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_indexes, create_indexes),
+    ]
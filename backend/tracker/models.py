@@ -1,4 +1,74 @@
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def student_scope(user, prefix=''):
+    """
+    Q object limiting students (or rows reached through ``prefix``) to the ones
+    ``user`` may see, or None when the user may see nothing.
+    """
+    role = getattr(user, 'role', None)
+    if role == 'admin':
+        return Q()
+    if role == 'teacher':
+        return Q(**{f'{prefix}class_group__teachers': user})
+    if role == 'parent':
+        return Q(**{f'{prefix}parent_email': user.email})
+    return None
+
+
+class UserQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        role = getattr(user, 'role', None)
+        if role == 'admin':
+            return self
+        if role is None:
+            return self.none()
+        return self.filter(pk=user.pk)
+
+
+class ClassGroupQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        role = getattr(user, 'role', None)
+        if role == 'admin':
+            return self
+        if role == 'teacher':
+            return self.filter(teachers=user)
+        return self.none()
+
+
+class StudentScopedQuerySet(models.QuerySet):
+    # Lookup path from this model to Student.
+    student_prefix = ''
+
+    def visible_to(self, user):
+        scope = student_scope(user, self.student_prefix)
+        if scope is None:
+            return self.none()
+        return self.filter(scope)
+
+
+class StudentQuerySet(StudentScopedQuerySet):
+    def refresh_latest_health(self):
+        """
+        Repoint ``latest_health`` at each student's most recent HealthData row,
+        in a single UPDATE for every student in the queryset.
+        """
+        latest = HealthData.objects.filter(student=models.OuterRef('pk')).order_by('-created_at', '-id').values('id')[:1]
+        return self.update(latest_health=models.Subquery(latest), updated_at=timezone.now())
+
+    def touch(self):
+        """Bump ``updated_at`` after a change to a student's nested records."""
+        return self.update(updated_at=timezone.now())
+
+
+class StudentRecordQuerySet(StudentScopedQuerySet):
+    student_prefix = 'student__'
+
 
 # Create your models here.
 class User(models.Model):
@@ -16,6 +86,8 @@ class User(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = UserQuerySet.as_manager()
+
 
 class ClassGroup(models.Model):
     id = models.AutoField(primary_key=True)
@@ -26,6 +98,20 @@ class ClassGroup(models.Model):
         related_name='class_groups',
         blank=True,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ClassGroupQuerySet.as_manager()
+
+
+# Full-text documents behind /api/search/ (see tracker.search), stored as
+# generated columns so matching and ranking never re-parse the text. Names outrank emails, which
+# outrank addresses.
+STUDENT_SEARCH_VECTOR = (
+    SearchVector('name', config='simple', weight='A')
+    + SearchVector('parent_email', config='simple', weight='B')
+    + SearchVector('address', config='simple', weight='C')
+)
+MEDICAL_SEARCH_VECTOR = SearchVector('medical_condition', config='english')
 
 
 class Student(models.Model):
@@ -37,6 +123,23 @@ class Student(models.Model):
     parent_email = models.EmailField()
     contact = models.CharField(max_length=15)
     class_group = models.ForeignKey(ClassGroup, on_delete=models.SET_NULL, null=True)
+    # Denormalised pointer to the newest HealthData row, kept current by
+    # tracker.signals so "current state" reads need no per-student sort.
+    latest_health = models.ForeignKey('HealthData', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Also bumped when the student's health data, medical history or test
+    # results change, so it validates the nested representation too.
+    updated_at = models.DateTimeField(auto_now=True)
+    search_document = models.GeneratedField(
+        expression=STUDENT_SEARCH_VECTOR, output_field=SearchVectorField(), db_persist=True
+    )
+
+    objects = StudentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['parent_email'], name='student_parent_email_idx'),
+            GinIndex(fields=['search_document'], name='student_search_idx'),
+        ]
 
 
 ALLERGY_TYPE_CHOICES = [
@@ -63,6 +166,14 @@ class HealthData(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = StudentRecordQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', '-created_at'], name='healthdata_student_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='healthdata_created_idx'),
+        ]
+
 
 class MedicalHistory(models.Model):
     id = models.AutoField(primary_key=True)
@@ -70,16 +181,121 @@ class MedicalHistory(models.Model):
     medical_condition = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    search_document = models.GeneratedField(
+        expression=MEDICAL_SEARCH_VECTOR, output_field=SearchVectorField(), db_persist=True
+    )
+
+    objects = StudentRecordQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', '-created_at'], name='medhistory_student_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='medhistory_created_idx'),
+            GinIndex(fields=['search_document'], name='medhistory_search_idx'),
+        ]
 
 class  Tests(models.Model):
     id = models.AutoField(primary_key=True)
     test_name = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+def parse_result(result):
+    """
+    Split a free-text result into ``(result_value, result_category)``.
+
+    Numeric results ("85", "85%", "12.5") become a float so they can be range
+    queried; anything else is kept as a normalised category ("pending", "normal").
+    """
+    text = str(result).strip()
+    try:
+        return float(text.rstrip('%').strip()), ''
+    except ValueError:
+        return None, text.lower()[:50]
+
 
 class TestResults(models.Model):
     id = models.AutoField(primary_key=True)
-    test = models.CharField(max_length=100)
+    test = models.ForeignKey(Tests, on_delete=models.PROTECT, related_name='results')
     result = models.CharField(max_length=100)
+    result_value = models.FloatField(null=True, blank=True)
+    result_category = models.CharField(max_length=50, blank=True, default="")
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     notes = models.TextField(blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    def save(self, *args, **kwargs):
+        self.result_value, self.result_category = parse_result(self.result)
+        super().save(*args, **kwargs)
+
+    objects = StudentRecordQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', '-created_at'], name='testres_student_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='testres_created_idx'),
+            models.Index(fields=['test', 'created_at'], name='testres_test_created_idx'),
+            models.Index(fields=['test', 'result_value'], name='testres_test_value_idx'),
+        ]
+
+
+class CurrentTransactionId(models.Func):
+    # pg_current_xact_id() returns xid8, which only casts to bigint via text.
+    template = 'pg_current_xact_id()::text::bigint'
+    output_field = models.BigIntegerField()
+
+
+class ChangeLogQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        # Scoped on the snapshot taken when the change was logged, so tombstones
+        # stay visible after the student row itself is gone.
+        role = getattr(user, 'role', None)
+        if role == 'admin':
+            return self
+        if role == 'teacher':
+            return self.filter(class_group_id__in=ClassGroup.objects.filter(teachers=user).values('id'))
+        if role == 'parent':
+            return self.filter(parent_email=user.email)
+        return self.none()
+
+
+class ChangeLog(models.Model):
+    """
+    Append-only log of writes to students and their records, read by the
+    /api/changes/ feed. ``txid`` is the writing transaction's id, which is
+    what makes the feed's cursor safe against out-of-order commits.
+    """
+    ACTIONS = [('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')]
+
+    id = models.BigAutoField(primary_key=True)
+    txid = models.BigIntegerField(db_default=CurrentTransactionId())
+    model = models.CharField(max_length=20)
+    object_id = models.IntegerField()
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    class_group_id = models.IntegerField(null=True, blank=True)
+    parent_email = models.EmailField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ChangeLogQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['txid', 'id'], name='changelog_cursor_idx'),
+            models.Index(fields=['class_group_id', 'txid', 'id'], name='changelog_class_cursor_idx'),
+            models.Index(fields=['parent_email', 'txid', 'id'], name='changelog_parent_cursor_idx'),
+        ]
+
+
+class CohortChange(models.Model):
+    """
+    What each bump of the cohort index version touched, so processes that
+    missed it can replay the change instead of rebuilding (tracker/cohorts.py).
+    ``version`` comes from the ``tracker_cohort_version`` sequence; ``rebuild``
+    marks writes that cannot be replayed.
+    """
+    version = models.BigIntegerField(primary_key=True)
+    students = ArrayField(models.IntegerField(), default=list)
+    allergies = ArrayField(models.IntegerField(), default=list)
+    classes = ArrayField(models.IntegerField(), default=list)
+    rebuild = models.BooleanField(default=False)
@@ -0,0 +1,75 @@
+from asgiref.sync import sync_to_async
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from .conditional import aconditional_list_response, conditional_list_response
+from .response_cache import response_cache
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination keyed on the view's ``cursor_ordering``.
+
+    Pages are fetched with ``WHERE key < cursor ... LIMIT n`` instead of
+    ``OFFSET``/``COUNT(*)``, so every page costs the same no matter how deep
+    into the table it is. The page size defaults to ``REST_FRAMEWORK['PAGE_SIZE']``
+    and can be overridden per request with ``?page_size=``, up to ``max_page_size``.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
+
+
+class PaginatedListMixin:
+    """
+    Shared list handling for the APIView based list endpoints.
+
+    Every list is paginated: responses are ``{"next", "previous", "results"}``
+    pages, so no request can make the server serialize a whole table.
+    """
+    pagination_class = KeysetPagination
+    cursor_ordering = ('-created_at', '-id')
+
+    def list_state(self, request, queryset, related=()):
+        """
+        Validator state for the requested page: ``(pk, updated_at)`` of its rows,
+        read through the same keyset query so list requests stay free of
+        COUNT(*) and full scans, plus the ``response_cache`` versions of the
+        ``related`` models whose rows are nested in the payload.
+        """
+        paginator = self.pagination_class()
+        ordering = [field.lstrip('-') for field in paginator.get_ordering(request, queryset, self)]
+        rows = queryset.prefetch_related(None).values('pk', 'updated_at', *ordering)
+        page = [(row['pk'], row['updated_at']) for row in paginator.paginate_queryset(rows, request, view=self)]
+        return page, response_cache.versions(related)
+
+    def render_list(self, request, queryset, serializer_class, **serializer_kwargs):
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = serializer_class(page, many=True, **serializer_kwargs)
+        return paginator.get_paginated_response(serializer.data)
+
+    def paginated_response(self, request, queryset, serializer_class, related=(), **serializer_kwargs):
+        """
+        Serialize the requested page of ``queryset`` unless the client's ETag
+        still matches, in which case nothing is serialized and a 304 is sent.
+        ``related`` lists the models nested in each row (see ``list_state``).
+        """
+        def render():
+            return self.render_list(request, queryset, serializer_class, **serializer_kwargs)
+
+        return conditional_list_response(request, self.list_state(request, queryset, related), render)
+
+    async def apaginated_response(self, request, queryset, serializer_class, related=(), **serializer_kwargs):
+        """
+        ``paginated_response`` for async views. DRF's paginator is synchronous,
+        so the page is read and serialized in a worker thread.
+        """
+        async def render():
+            return await sync_to_async(self.render_list)(request, queryset, serializer_class, **serializer_kwargs)
+
+        state = await sync_to_async(self.list_state)(request, queryset, related)
+        return await aconditional_list_response(request, state, render)
@@ -0,0 +1,208 @@
+"""
+On-demand profiling of single requests, for admins.
+
+An admin sends ``X-Profile: 1`` (or ``?profile=1``) and ``ProfilingMiddleware``
+runs the rest of the request under cProfile while capturing every SQL
+statement it executes. The report (top functions, each statement with its
+time and the code that issued it, repeated statements flagged) is stored in
+the cache under a fresh request id, which comes back in the ``X-Profile-Id``
+header; fetch it from /api/profiles/<id>/. Requests without the flag, or
+from anyone but an admin, are passed through untouched.
+
+cProfile only sees the thread it is enabled in. On the async path the
+request is therefore driven from a worker thread with ``async_to_sync``, so
+the thread-sensitive work of async views (queries, serializers) runs in the
+profiled thread, as it does under WSGI; coroutine frames themselves and
+``thread_sensitive=False`` work are not profiled, though their queries are
+still captured. Timings include the profiler's own overhead, which inflates
+Python time far more than database time. Query parameters are compared to
+flag exact repeats but never stored. Streaming responses are profiled until
+the view returns them.
+"""
+import cProfile
+import os
+import pstats
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+HEADER = 'X-Profile'
+ID_HEADER = 'X-Profile-Id'
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Execute wrappers, never the code that issued the query.
+WRAPPER_FILES = {os.path.join(APP_DIR, 'profiling.py'), os.path.join(APP_DIR, 'metrics.py')}
+
+_profile = ContextVar('tracker_profile', default=None)
+
+
+def _config(key, default):
+    return getattr(settings, 'PROFILING', {}).get(key, default)
+
+
+def _cache():
+    return caches[_config('CACHE_ALIAS', 'default')]
+
+
+def _cache_key(request_id):
+    return f'profile:{request_id}'
+
+
+def _origin():
+    """The innermost frame in this app that led to the query."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR) and filename not in WRAPPER_FILES:
+            return f'{os.path.relpath(filename, APP_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def capture_query(execute, sql, params, many, context):
+    queries = _profile.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.append({
+            'sql': sql,
+            'ms': round((time.perf_counter() - started) * 1000, 3),
+            'many': many,
+            'origin': _origin(),
+            'params': hash(repr(params)),
+        })
+
+
+def install_query_capture(connection):
+    if capture_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(capture_query)
+
+
+def requested(request):
+    return request.headers.get(HEADER) == '1' or request.GET.get('profile') == '1'
+
+
+def is_admin(request):
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        return getattr(drf_request.user, 'role', None) == 'admin'
+    except APIException:
+        return False
+
+
+def _functions(profiler, top):
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+    return [
+        {
+            'function': name if filename == '~' else f'{os.path.basename(filename)}:{line}({name})',
+            'file': filename,
+            'calls': calls,
+            'self_ms': round(own * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        }
+        for (filename, line, name), (_, calls, own, cumulative, _) in rows
+    ]
+
+
+def _statements(queries):
+    """Attach repeat counts and collapse parameters; also return the repeated statements."""
+    by_sql = {}
+    exact = {}
+    for query in queries:
+        by_sql[query['sql']] = by_sql.get(query['sql'], 0) + 1
+        key = (query['sql'], query['params'])
+        exact[key] = exact.get(key, 0) + 1
+
+    seen = set()
+    statements = []
+    for query in queries:
+        key = (query['sql'], query.pop('params'))
+        statements.append(dict(query, similar=by_sql[query['sql']], duplicate=key in seen))
+        seen.add(key)
+
+    repeated = []
+    for sql, count in by_sql.items():
+        if count > 1:
+            exact_repeats = sum(n - 1 for (text, _), n in exact.items() if text == sql)
+            total = sum(query['ms'] for query in statements if query['sql'] == sql)
+            repeated.append({'sql': sql, 'count': count, 'exact_repeats': exact_repeats, 'total_ms': round(total, 3)})
+    repeated.sort(key=lambda row: row['count'], reverse=True)
+    return statements, repeated
+
+
+def build_report(request_id, request, response, profiler, queries, duration):
+    statements, repeated = _statements(queries)
+    db_ms = sum(query['ms'] for query in statements)
+    total_ms = duration * 1000
+    return {
+        'id': request_id,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'created': timezone.now().isoformat(),
+        'total_ms': round(total_ms, 3),
+        'db_ms': round(db_ms, 3),
+        'python_ms': round(total_ms - db_ms, 3),
+        'query_count': len(statements),
+        'repeated_queries': repeated,
+        'queries': statements,
+        'functions': _functions(profiler, _config('TOP_FUNCTIONS', 40)),
+    }
+
+
+def load_report(request_id):
+    return _cache().get(_cache_key(request_id))
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not requested(request) or not is_admin(request):
+            return self.get_response(request)
+        return self.profile(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not requested(request) or not await sync_to_async(is_admin)(request):
+            return await self.get_response(request)
+        return await sync_to_async(self.profile, thread_sensitive=False)(request, async_to_sync(self.get_response))
+
+    def profile(self, request, get_response):
+        request_id = uuid.uuid4().hex
+        queries = []
+        token = _profile.set(queries)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+            _profile.reset(token)
+        duration = time.perf_counter() - started
+
+        report = build_report(request_id, request, response, profiler, queries, duration)
+        _cache().set(_cache_key(request_id), report, _config('TIMEOUT', 60 * 60))
+        response[ID_HEADER] = request_id
+        return response
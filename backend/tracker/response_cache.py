@@ -0,0 +1,102 @@
+"""
+Response cache for the small reference-data lists (allergies, tests, classes).
+
+Entries are keyed by endpoint, query string and role (plus the user for roles
+whose view is personal), and by a version counter per model kept in the same
+cache. Writes never delete entries: signals bump the version, so every key
+built before the write simply stops being looked up and ages out. Because the
+counters live in the cache backend, pointing ``RESPONSE_CACHE['ALIAS']`` at a
+shared backend (Redis, Memcached) keeps every worker process consistent; the
+local-memory default is only coherent within one process.
+"""
+import time
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from .conditional import conditional_response
+
+
+class ResponseCache:
+
+    def __init__(self, alias='default', timeout=300):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def _version_key(self, model):
+        return f"respcache:version:{model._meta.label_lower}"
+
+    def versions(self, models):
+        keys = [self._version_key(model) for model in models]
+        found = self.backend.get_many(keys)
+        missing = {key: time.time_ns() for key in keys if key not in found}
+        if missing:
+            # A counter that was evicted restarts from the clock rather than
+            # from 1, so it can never line up with keys built before.
+            self.backend.set_many(missing, None)
+            found.update(missing)
+        return tuple(found[key] for key in keys)
+
+    def bump(self, model):
+        key = self._version_key(model)
+        try:
+            self.backend.incr(key)
+        except ValueError:
+            self.backend.set(key, time.time_ns(), None)
+
+    def invalidate(self, model):
+        # Bump now for this process and again once the transaction commits, so
+        # a worker that re-cached the old rows in between is caught as well.
+        self.bump(model)
+        transaction.on_commit(lambda: self.bump(model))
+
+    def key(self, request, models, per_user_roles=()):
+        user = request.user
+        role = getattr(user, 'role', None)
+        owner = user.pk if role in per_user_roles else None
+        raw = repr((request.get_full_path(), role, owner, self.versions(models)))
+        return "respcache:" + md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.timeout)
+
+    def clear(self):
+        self.backend.clear()
+
+
+class CachedListMixin:
+    """
+    Serve a list endpoint from ``response_cache``.
+
+    ``cached_models`` lists every model whose rows end up in the response;
+    ``tracker.signals`` invalidates them on save, delete and m2m changes.
+    """
+    cached_models = ()
+    # Roles whose list depends on who is asking, not only on the role.
+    per_user_roles = ('teacher', 'parent')
+
+    def cached_response(self, request, render):
+        key = response_cache.key(request, self.cached_models, self.per_user_roles)
+        entry = response_cache.get(key)
+        if entry is None:
+            response = render()
+            if response.status_code == 200 and not getattr(response, 'streaming', False):
+                response_cache.set(key, (response.get('ETag'), response.data))
+            return response
+
+        etag, data = entry
+        return conditional_response(request, lambda: Response(data), etag)
+
+
+_config = getattr(settings, 'RESPONSE_CACHE', {})
+response_cache = ResponseCache(alias=_config.get('ALIAS', 'default'), timeout=_config.get('TIMEOUT', 300))
@@ -0,0 +1,113 @@
+"""
+Ranked student search for /api/search/.
+
+Three matchers run against indexes and are merged in Python:
+
+* full-text prefix match on the student's name, parent email and address
+  (``Student.search_document``),
+* full-text prefix match on medical conditions
+  (``MedicalHistory.search_document``),
+* fuzzy trigram match on the name, when the pg_trgm extension is installed
+  (``student_name_trgm_idx``, see migration 0015).
+
+ts_rank and trigram similarity are on unrelated scales, so scores are never
+compared across matchers: results are ranked by matcher first, in the order
+above, then by that matcher's score. A student's place comes from the best
+matcher that found them. Each matcher only returns its best
+``offset + limit + 1`` rows, so merging those windows yields the exact top
+results of the union.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import F, Max
+
+from .models import MedicalHistory, Student
+
+MIN_QUERY_LENGTH = 2
+# Every matcher reads ``offset + limit + 1`` rows, so deep pages are refused;
+# narrowing the query is cheaper than paging that far.
+MAX_OFFSET = 1000
+_trigram_available = {}
+
+
+def trigram_available(using='default'):
+    if using not in _trigram_available:
+        with connections[using].cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available[using] = cursor.fetchone() is not None
+    return _trigram_available[using]
+
+
+def prefix_query(text):
+    """``to_tsquery`` source matching every word of ``text`` as a prefix, or None."""
+    # Only word characters reach the raw tsquery, so user input can't inject
+    # tsquery operators.
+    terms = re.findall(r'\w+', text.lower())
+    return ' & '.join(f'{term}:*' for term in terms) or None
+
+
+def search_students(user, text, limit=20, offset=0):
+    """
+    Return ``(rows, has_more)`` for the students visible to ``user`` that
+    match ``text``, best first. Raises ValueError past ``MAX_OFFSET``.
+    """
+    if offset > MAX_OFFSET:
+        raise ValueError(f"offset cannot exceed {MAX_OFFSET}")
+    prefix = prefix_query(text)
+    if prefix is None:
+        return [], False
+    window = offset + limit + 1
+    students = Student.objects.visible_to(user)
+
+    student_query = SearchQuery(prefix, config='simple', search_type='raw')
+    by_student = (
+        students.filter(search_document=student_query)
+        .annotate(rank=SearchRank(F('search_document'), student_query))
+        .order_by('-rank', 'id')
+        .values_list('id', 'rank')[:window]
+    )
+
+    medical_query = SearchQuery(prefix, config='english', search_type='raw')
+    by_condition = (
+        MedicalHistory.objects.visible_to(user)
+        .filter(search_document=medical_query)
+        .values('student')
+        .annotate(rank=Max(SearchRank(F('search_document'), medical_query)))
+        .order_by('-rank', 'student')
+        .values_list('student', 'rank')[:window]
+    )
+
+    matchers = [('student', by_student), ('medical_history', by_condition)]
+    if trigram_available(students.db):
+        by_similarity = (
+            students.filter(name__trigram_word_similar=text)
+            .annotate(rank=TrigramWordSimilarity(text, 'name'))
+            .order_by('-rank', 'id')
+            .values_list('id', 'rank')[:window]
+        )
+        matchers.append(('name', by_similarity))
+
+    # Matchers run best first, so the first one to find a student places them.
+    keys = {}
+    matched = {}
+    for tier, (source, rows) in enumerate(matchers):
+        for student_id, rank in rows:
+            keys.setdefault(student_id, (tier, -rank))
+            matched.setdefault(student_id, []).append(source)
+
+    ranked = sorted(keys, key=lambda pk: (keys[pk], pk))
+    page = ranked[offset:offset + limit]
+    details = Student.objects.only('name', 'class_group').in_bulk(page)
+    rows = [
+        {
+            'id': pk,
+            'name': details[pk].name,
+            'class_group': details[pk].class_group_id,
+            'rank': round(-keys[pk][1], 4),
+            'matched': matched[pk],
+        }
+        for pk in page if pk in details
+    ]
+    return rows, len(ranked) > offset + limit
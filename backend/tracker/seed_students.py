@@ -31,11 +31,14 @@ contacts = [
     "6789012345", "7890123456", "8901234567", "9012345678", "0123456789"
 ]
 
-for i in range(20):
-    Student.objects.create(
+# For real rosters use `python manage.py import_students <file>`.
+Student.objects.bulk_create(
+    Student(
         name=names[i],
         address=addresses[i],
         parent_email=parent_emails[i],
         contact=contacts[i],
         class_group=cg
-    )
\ No newline at end of file
+    )
+    for i in range(20)
+)
\ No newline at end of file
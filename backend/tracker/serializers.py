@@ -1,5 +1,8 @@
+from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Student, ClassGroup, User, Allergy, HealthData, MedicalHistory, Tests, TestResults
+from .fields import BatchedPrimaryKeyRelatedField
 from django.contrib.auth.hashers import make_password
 
 class UserSerializer(serializers.ModelSerializer):
@@ -32,8 +35,24 @@ class LoginSerializer(serializers.Serializer):
 
 
 
+class VisibleStudentMixin:
+    """
+    Restricts the writable ``student`` field to students the requesting user
+    can see, so records can't be attached to someone else's child. The check
+    rides on the lookup the field already does.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        student = fields.get('student')
+        if request is not None and isinstance(student, serializers.RelatedField) and not student.read_only:
+            student.queryset = Student.objects.visible_to(request.user)
+        return fields
+
+
 class ClassGroupSerializer(serializers.ModelSerializer):
-    teachers = serializers.PrimaryKeyRelatedField(
+    teachers = BatchedPrimaryKeyRelatedField(
         many=True,
         queryset=User.objects.filter(role='teacher'),
         required=False,
@@ -44,15 +63,19 @@ class ClassGroupSerializer(serializers.ModelSerializer):
         model = ClassGroup
         fields = ['id', 'name', 'teachers']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.prefetch_related('teachers')
+
 
 class AllergySerializer(serializers.ModelSerializer):
     class Meta:
         model = Allergy
         fields = ['id', 'allergy', 'type', 'created_at', 'updated_at']
 
-class HealthDataSerializer(serializers.ModelSerializer):
+class HealthDataSerializer(VisibleStudentMixin, serializers.ModelSerializer):
     allergies = AllergySerializer(many=True, read_only=True)
-    allergy_ids = serializers.PrimaryKeyRelatedField(
+    allergy_ids = BatchedPrimaryKeyRelatedField(
         queryset=Allergy.objects.all(), many=True, write_only=True, source='allergies', required=False
     )
 
@@ -63,7 +86,11 @@ class HealthDataSerializer(serializers.ModelSerializer):
             'allergies', 'allergy_ids', 'created_at', 'updated_at'
         ]
 
-class MedicalHistorySerializer(serializers.ModelSerializer):
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.prefetch_related('allergies')
+
+class MedicalHistorySerializer(VisibleStudentMixin, serializers.ModelSerializer):
     class Meta:
         model = MedicalHistory
         fields = ['id', 'student', 'medical_condition', 'created_at', 'updated_at']
@@ -73,19 +100,162 @@ class TestsSerializer(serializers.ModelSerializer):
         model = Tests
         fields = ['id', 'test_name']
 
-class TestResultsSerializer(serializers.ModelSerializer):
+# Roles that may register a new test name by recording a result against it.
+TEST_CREATOR_ROLES = ('admin', 'teacher')
+
+
+class TestNameField(serializers.SlugRelatedField):
+    """
+    Reads and writes ``TestResults.test`` by test name, as clients always have.
+    A name that isn't registered in ``Tests`` yet resolves to an unsaved test
+    for admins and teachers, which ``TestResultsSerializer`` saves along with
+    the result; for anyone else it is a validation error.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(slug_field='test_name', queryset=Tests.objects.all(), **kwargs)
+
+    def to_internal_value(self, data):
+        name = str(data).strip()
+        if not name:
+            self.fail('invalid')
+        if len(name) > 100:
+            raise serializers.ValidationError("Ensure this field has no more than 100 characters.")
+        test = self.get_queryset().filter(test_name=name).order_by('id').first()
+        if test is not None:
+            return test
+        request = self.context.get('request')
+        if getattr(getattr(request, 'user', None), 'role', None) not in TEST_CREATOR_ROLES:
+            raise serializers.ValidationError(f'Unknown test "{name}".')
+        return Tests(test_name=name)
+
+
+class TestResultsSerializer(VisibleStudentMixin, serializers.ModelSerializer):
+    test = TestNameField()
+
     class Meta:
         model = TestResults
-        fields = ['id', 'test', 'result', 'notes', 'student', 'created_at', 'updated_at']
+        fields = [
+            'id', 'test', 'result', 'result_value', 'result_category', 'notes', 'student',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = ['result_value', 'result_category']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('test')
+
+    @staticmethod
+    def save_new_test(validated_data):
+        # Only now that every field has passed validation.
+        test = validated_data.get('test')
+        if test is not None and test.pk is None:
+            test.save()
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            self.save_new_test(validated_data)
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            self.save_new_test(validated_data)
+            return super().update(instance, validated_data)
+
+class TestResultsBulkItemSerializer(TestResultsSerializer):
+    # Students and test names are resolved for the whole batch at once by the
+    # bulk view, not with one query per item.
+    student = serializers.IntegerField()
+    test = serializers.CharField(max_length=100)
+
+
+class SparseFieldsetMixin:
+    """
+    Lets callers trim a serializer with ``fields=`` and ``expand=`` kwargs.
+
+    ``fields`` limits the output to the named fields. Nested relations listed in
+    ``expandable_fields`` are only rendered when named in ``expand`` (or in
+    ``fields``). Passing neither keeps the full, fully nested shape.
+    """
+    expandable_fields = ()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.selected_fields(fields, expand)
+        for name in list(self.fields):
+            if name not in selected:
+                self.fields.pop(name)
+
+    @classmethod
+    def selected_fields(cls, fields=None, expand=None):
+        selected = set(cls.Meta.fields)
+        if fields is not None:
+            selected &= set(fields) | set(expand or ())
+        if expand is not None:
+            selected -= set(cls.expandable_fields) - set(expand) - set(fields or ())
+        return selected
 
-class StudentSerializer(serializers.ModelSerializer):
+    @classmethod
+    def expanded_fields(cls, fields=None, expand=None):
+        return set(cls.expandable_fields) & cls.selected_fields(fields, expand)
+
+
+def parse_fieldset_params(request, serializer_class):
+    """
+    Read ``?fields=`` and ``?expand=`` into serializer kwargs.
+
+    Raises ValidationError for unknown fields and for relations that cannot
+    be expanded.
+    """
+    shape = {}
+    for param in ('fields', 'expand'):
+        value = request.query_params.get(param)
+        if value is not None:
+            shape[param] = [name.strip() for name in value.split(',') if name.strip()]
+
+    unknown = set(shape.get('fields', ())) - set(serializer_class.Meta.fields)
+    if unknown:
+        raise serializers.ValidationError(
+            {"fields": f"Unknown fields: {', '.join(sorted(unknown))}. Choose from: {', '.join(serializer_class.Meta.fields)}."}
+        )
+    unknown = set(shape.get('expand', ())) - set(serializer_class.expandable_fields)
+    if unknown:
+        raise serializers.ValidationError(
+            {"expand": f"Cannot expand: {', '.join(sorted(unknown))}. Choose from: {', '.join(serializer_class.expandable_fields)}."}
+        )
+    return shape
+
+
+class StudentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     healthdata = HealthDataSerializer(many=True, read_only=True, source='healthdata_set')
     medicalhistory = MedicalHistorySerializer(many=True, read_only=True, source='medicalhistory_set')
     testresults = TestResultsSerializer(many=True, read_only=True, source='testresults_set')
+    latest_health = HealthDataSerializer(read_only=True)
+
+    expandable_fields = ('healthdata', 'medicalhistory', 'testresults', 'latest_health')
 
     class Meta:
         model = Student
         fields = [
             'id', 'name', 'date_of_birth', 'gender', 'address', 'parent_email', 'contact', 'class_group',
-            'healthdata', 'medicalhistory', 'testresults'
+            'healthdata', 'medicalhistory', 'testresults', 'latest_health'
         ]
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, expand=None):
+        # One query per relation (plus one for the nested allergies) instead of
+        # one per student, so listing cost no longer grows with the row count.
+        # Relations left out of the requested shape are not fetched at all.
+        prefetches = {
+            'healthdata': Prefetch('healthdata_set', queryset=HealthDataSerializer.setup_eager_loading(HealthData.objects.all())),
+            'medicalhistory': 'medicalhistory_set',
+            'testresults': Prefetch('testresults_set', queryset=TestResultsSerializer.setup_eager_loading(TestResults.objects.all())),
+            'latest_health': Prefetch('latest_health', queryset=HealthDataSerializer.setup_eager_loading(HealthData.objects.all())),
+        }
+        expanded = cls.expanded_fields(fields, expand)
+        queryset = queryset.prefetch_related(*(prefetches[name] for name in cls.expandable_fields if name in expanded))
+        if fields is not None:
+            # latest_health is a forward FK, so its column must stay loaded for the prefetch.
+            reverse = set(prefetches) - {'latest_health'}
+            queryset = queryset.only(*(name for name in cls.selected_fields(fields, expand) if name not in reverse))
+        return queryset
@@ -0,0 +1,154 @@
+from django.db.models import Q
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .auth.cache import user_cache
+from .changes import log_change, log_scope_change
+from .cohorts import cohort_index
+from .events import publish_change
+from .metrics import install_query_recorder
+from .profiling import install_query_capture
+from .models import Allergy, ClassGroup, HealthData, MedicalHistory, Student, TestResults, Tests, User
+from .response_cache import response_cache
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+    if instance.role == 'teacher' and kwargs.get('created') is not True:
+        # Deleting a teacher drops their class memberships without an
+        # m2m_changed signal.
+        response_cache.invalidate(ClassGroup)
+
+
+@receiver(pre_delete, sender=User)
+def touch_deleted_teacher_classes(sender, instance, **kwargs):
+    # Their memberships are about to go without an m2m_changed signal, so
+    # move the classes' ETags on while the rows can still be found.
+    if instance.role == 'teacher':
+        ClassGroup.objects.filter(teachers=instance).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=HealthData)
+def refresh_latest_health(sender, instance, **kwargs):
+    # Also refresh whoever currently points at this row, in case it was moved
+    # to another student. This bumps Student.updated_at as well.
+    student_ids = list(
+        Student.objects.filter(Q(pk=instance.student_id) | Q(latest_health=instance.pk)).values_list('pk', flat=True)
+    )
+    Student.objects.filter(pk__in=student_ids).refresh_latest_health()
+    cohort_index.refresh_students(student_ids)
+
+
+@receiver([post_save, post_delete], sender=Student)
+def refresh_student_cohorts(sender, instance, **kwargs):
+    cohort_index.refresh_students([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=MedicalHistory)
+@receiver([post_save, post_delete], sender=TestResults)
+def touch_student(sender, instance, **kwargs):
+    # Student responses nest these records, so their ETags must change too.
+    Student.objects.filter(pk=instance.student_id).touch()
+
+
+def _changed_ids(instance, action, reverse, pk_set):
+    """Primary keys of the owning side whose relation just changed."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return ()
+    if not reverse:
+        return (instance.pk,)
+    # pk_set is None after a reverse clear, which nothing here does.
+    return pk_set or ()
+
+
+@receiver(m2m_changed, sender=HealthData.allergies.through)
+def touch_healthdata_allergies(sender, instance, action, reverse, pk_set, **kwargs):
+    # Changing a many-to-many relation saves neither side.
+    ids = _changed_ids(instance, action, reverse, pk_set)
+    if ids:
+        HealthData.objects.filter(pk__in=ids).update(updated_at=timezone.now())
+        Student.objects.filter(healthdata__in=ids).touch()
+        cohort_index.refresh_students(Student.objects.filter(latest_health__in=ids).values_list('pk', flat=True))
+        for healthdata in HealthData.objects.filter(pk__in=ids):
+            log_change(healthdata, 'updated')
+
+
+@receiver(m2m_changed, sender=ClassGroup.teachers.through)
+def touch_class_teachers(sender, instance, action, reverse, pk_set, **kwargs):
+    ids = _changed_ids(instance, action, reverse, pk_set)
+    if ids:
+        ClassGroup.objects.filter(pk__in=ids).update(updated_at=timezone.now())
+        response_cache.invalidate(ClassGroup)
+
+
+@receiver([post_save, post_delete], sender=Allergy)
+@receiver([post_save, post_delete], sender=Tests)
+@receiver([post_save, post_delete], sender=ClassGroup)
+def invalidate_cached_lists(sender, instance, **kwargs):
+    response_cache.invalidate(sender)
+
+
+@receiver([post_save, post_delete], sender=Allergy)
+def update_cohort_allergy(sender, instance, **kwargs):
+    cohort_index.allergy_changed(instance, deleted='created' not in kwargs)
+
+
+@receiver(post_delete, sender=ClassGroup)
+def drop_cohort_class(sender, instance, **kwargs):
+    cohort_index.class_deleted(instance.pk)
+
+
+@receiver(pre_save, sender=Student)
+def remember_feed_scope(sender, instance, update_fields=None, **kwargs):
+    # The change log snapshots the scope after the save; keep the previous
+    # one so log_saved can tell the teacher or parent who loses the student.
+    instance._previous_scope = None
+    if instance.pk is None or (update_fields is not None and not {'class_group', 'parent_email'} & set(update_fields)):
+        return
+    instance._previous_scope = (
+        Student.objects.filter(pk=instance.pk).values_list('class_group_id', 'parent_email').first()
+    )
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=HealthData)
+@receiver(post_save, sender=MedicalHistory)
+@receiver(post_save, sender=TestResults)
+def log_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_scope', None)
+    if previous is not None and previous != (instance.class_group_id, instance.parent_email):
+        log_scope_change(instance, previous)
+    log_change(instance, 'created' if created else 'updated')
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=HealthData)
+@receiver(post_delete, sender=MedicalHistory)
+@receiver(post_delete, sender=TestResults)
+def log_deleted(sender, instance, **kwargs):
+    log_change(instance, 'deleted')
+
+
+@receiver(post_save, sender=HealthData)
+@receiver(post_save, sender=MedicalHistory)
+@receiver(post_save, sender=TestResults)
+def publish_saved(sender, instance, created, **kwargs):
+    # Health data allergies are set after save() but in the same
+    # transaction, and events go out on commit, so they are included.
+    publish_change(instance, 'created' if created else 'updated')
+
+
+@receiver(post_delete, sender=HealthData)
+@receiver(post_delete, sender=MedicalHistory)
+@receiver(post_delete, sender=TestResults)
+def publish_deleted(sender, instance, **kwargs):
+    publish_change(instance, 'deleted')
+
+
+@receiver(connection_created)
+def record_request_queries(sender, connection, **kwargs):
+    install_query_recorder(connection)
+    install_query_capture(connection)
@@ -0,0 +1,98 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+STREAM_CONTENT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+STREAM_CHUNK_SIZE = 500
+# Bytes gathered per thread hop when streaming to an ASGI server.
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def is_asgi(request):
+    """True when ``request`` (Django's or DRF's) came through the ASGI application."""
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+def stream_format(request):
+    """
+    Return the export format requested with ``?stream=``, or None.
+
+    ``?stream=1`` is shorthand for a JSON array. Raises ValueError for formats
+    we don't know how to stream.
+    """
+    value = request.query_params.get('stream')
+    if not value or value == '0':
+        return None
+    if value == '1':
+        return 'json'
+    if value not in STREAM_CONTENT_TYPES:
+        raise ValueError(f"Unsupported stream format '{value}'. Use one of: {', '.join(STREAM_CONTENT_TYPES)}.")
+    return value
+
+
+def serialized_chunks(queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE, **serializer_kwargs):
+    """
+    Serialize a queryset ``chunk_size`` rows at a time.
+
+    ``iterator()`` reads through a server-side cursor (and still honours
+    ``prefetch_related`` per chunk), so only one chunk is held in memory.
+    """
+    batch = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        batch.append(obj)
+        if len(batch) == chunk_size:
+            yield serializer_class(batch, many=True, **serializer_kwargs).data
+            batch = []
+    if batch:
+        yield serializer_class(batch, many=True, **serializer_kwargs).data
+
+
+def _encode_json_array(chunks):
+    encoder = JSONEncoder()
+    first = True
+    yield '['
+    for rows in chunks:
+        for row in rows:
+            yield ('' if first else ',') + encoder.encode(row)
+            first = False
+    yield ']'
+
+
+def _encode_ndjson(chunks):
+    encoder = JSONEncoder()
+    for rows in chunks:
+        yield ''.join(encoder.encode(row) + '\n' for row in rows)
+
+
+def _next_block(parts, size=STREAM_BLOCK_SIZE):
+    block = []
+    length = 0
+    for part in parts:
+        block.append(part)
+        length += len(part)
+        if length >= size:
+            break
+    return ''.join(block)
+
+
+async def _async_body(body):
+    # Django's ASGI handler would otherwise read a synchronous iterator to the
+    # end before sending anything. Reading block by block in the request's
+    # thread keeps the server-side cursor on the connection that opened it.
+    parts = iter(body)
+    read = sync_to_async(_next_block)
+    while block := await read(parts):
+        yield block
+
+
+def stream_response(queryset, serializer_class, fmt, asynchronous=False, **serializer_kwargs):
+    """Pass ``asynchronous=True`` when serving through the ASGI application."""
+    chunks = serialized_chunks(queryset, serializer_class, **serializer_kwargs)
+    body = _encode_ndjson(chunks) if fmt == 'ndjson' else _encode_json_array(chunks)
+    if asynchronous:
+        body = _async_body(body)
+    return StreamingHttpResponse(body, content_type=STREAM_CONTENT_TYPES[fmt])
@@ -0,0 +1,92 @@
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Max, Min, Q
+
+from .models import ALLERGY_TYPE_CHOICES, HealthData, Student, TestResults
+
+# Adult cut-offs, matching the ones the frontend reports use.
+BMI_BANDS = [
+    ('underweight', Q(bmi__lt=18.5)),
+    ('normal', Q(bmi__gte=18.5, bmi__lt=25)),
+    ('overweight', Q(bmi__gte=25, bmi__lt=30)),
+    ('obese', Q(bmi__gte=30)),
+]
+
+
+def _round(value, digits=1):
+    return None if value is None else round(value, digits)
+
+
+def latest_health_rows(students):
+    """HealthData rows holding the most recent measurement of each student."""
+    return HealthData.objects.filter(id__in=students.values('latest_health'))
+
+
+def class_health_summary(class_group):
+    """
+    Health overview of a class, aggregated in the database.
+
+    Measurements come from each student's latest health row; test results
+    cover every result recorded for the class.
+    """
+    students = Student.objects.filter(class_group=class_group)
+    latest = latest_health_rows(students)
+
+    # height is stored in cm and weight in kg.
+    with_bmi = latest.filter(height__gt=0).annotate(
+        bmi=ExpressionWrapper(F('weight') / ((F('height') / 100.0) * (F('height') / 100.0)), output_field=FloatField())
+    )
+    measurements = with_bmi.aggregate(
+        measured=Count('id'),
+        average_bmi=Avg('bmi'),
+        average_height=Avg('height'),
+        average_weight=Avg('weight'),
+        **{band: Count('id', filter=condition) for band, condition in BMI_BANDS},
+    )
+
+    blood_types = {
+        row['blood_type'] or 'unknown': row['count']
+        for row in latest.values('blood_type').annotate(count=Count('id')).order_by('blood_type')
+    }
+
+    allergies = dict.fromkeys((value for value, _ in ALLERGY_TYPE_CHOICES), 0)
+    allergies.update(
+        (row['allergy__type'], row['students'])
+        for row in HealthData.allergies.through.objects.filter(healthdata__in=latest)
+        .values('allergy__type')
+        .annotate(students=Count('healthdata__student', distinct=True))
+    )
+
+    results = TestResults.objects.filter(student__class_group=class_group)
+    tests = {
+        row['test_id']: {
+            'test': row['test__test_name'],
+            'results': row['results'],
+            'students': row['students'],
+            'average': _round(row['average']),
+            'minimum': row['minimum'],
+            'maximum': row['maximum'],
+            'categories': {},
+        }
+        for row in results.values('test_id', 'test__test_name').annotate(
+            results=Count('id'),
+            students=Count('student', distinct=True),
+            average=Avg('result_value'),
+            minimum=Min('result_value'),
+            maximum=Max('result_value'),
+        ).order_by('test__test_name')
+    }
+    for row in results.filter(result_value__isnull=True).values('test_id', 'result_category').annotate(count=Count('id')):
+        tests[row['test_id']]['categories'][row['result_category']] = row['count']
+
+    return {
+        'class_group': class_group.id,
+        'name': class_group.name,
+        'students': students.count(),
+        'measured_students': measurements['measured'],
+        'average_bmi': _round(measurements['average_bmi']),
+        'average_height': _round(measurements['average_height']),
+        'average_weight': _round(measurements['average_weight']),
+        'bmi_distribution': {band: measurements[band] for band, _ in BMI_BANDS},
+        'blood_types': blood_types,
+        'allergy_prevalence': allergies,
+        'tests': list(tests.values()),
+    }
@@ -1,3 +1,1250 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+from datetime import date
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+
+from .models import Student, ClassGroup, User, Allergy, HealthData, MedicalHistory, Tests, TestResults
+from .serializers import ClassGroupSerializer, HealthDataSerializer
+from . import growth
+from .auth.cache import user_cache
+from .response_cache import response_cache
+from .cohorts import cohort_index
+from .events import RESYNC, PostgresBroker, Viewer, broker, event_stream
+from .metrics import registry
+from .auth.token import issue_token, read_token, revoke_token
+from .benchmark import dataset, runner
+from .pagination import KeysetPagination
+from . import urls as tracker_urls
+
+# The growth endpoints are only routed when the reference tables are
+# installed; GrowthTests routes them against synthetic tables through this.
+urlpatterns = [
+    path('api/', include(tracker_urls.urlpatterns + tracker_urls.growth_urlpatterns)),
+]
+
+
+def login(client, user):
+    session = client.session
+    session['user_id'] = user.id
+    session.save()
+
+
+class QueryCountTests(TestCase):
+    """Listing cost must stay flat no matter how many rows are returned."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        cls.class_group = ClassGroup.objects.create(name="Grade 1")
+        cls.vision = Tests.objects.create(test_name="Vision")
+        cls.allergies = [
+            Allergy.objects.create(allergy="Peanuts", type="food"),
+            Allergy.objects.create(allergy="Pollen", type="environment"),
+        ]
+
+    def setUp(self):
+        login(self.client, self.admin)
+
+    def add_students(self, count, rows=2):
+        for i in range(count):
+            student = Student.objects.create(
+                name=f"Student {i}", address="1 Main St", parent_email=f"parent{i}@example.com",
+                contact="0000000000", class_group=self.class_group,
+            )
+            for _ in range(rows):
+                healthdata = HealthData.objects.create(student=student, height=120, weight=25, blood_type="O+")
+                healthdata.allergies.set(self.allergies)
+            MedicalHistory.objects.create(student=student, medical_condition="Asthma")
+            TestResults.objects.create(student=student, test=self.vision, result="20/20")
+            teacher = User.objects.create(name=f"Teacher {student.id}", email=f"teacher{student.id}@example.com", password="x", role="teacher")
+            self.class_group.teachers.add(teacher)
+        return student
+
+    def count_queries(self, url):
+        user_cache.clear()
+        response_cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(ctx.captured_queries)
+
+    def assertFlatQueryCount(self, url_for):
+        student = self.add_students(2, rows=1)
+        small = self.count_queries(url_for(student))
+        student = self.add_students(8, rows=4)
+        large = self.count_queries(url_for(student))
+        self.assertEqual(small, large, f"query count for {url_for(student)} grew with data size")
+
+    def test_list_endpoints(self):
+        for url in [
+            '/api/students/', '/api/healthdata/', '/api/medicalhistory/', '/api/testresults/',
+            '/api/classes/', '/api/allergies/', '/api/users/',
+        ]:
+            with self.subTest(url=url):
+                self.assertFlatQueryCount(lambda student: url)
+
+    def test_student_detail(self):
+        self.assertFlatQueryCount(lambda student: f'/api/students/{student.id}/')
+
+
+class TestResultsListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        student = Student.objects.create(name="Ava", address="1 Main St", parent_email="p@example.com", contact="0")
+        cls.vision = Tests.objects.create(test_name="Vision")
+        TestResults.objects.bulk_create(
+            TestResults(student=student, test=cls.vision, result=str(i)) for i in range(7)
+        )
+
+    def setUp(self):
+        login(self.client, self.admin)
+
+    def test_walks_every_row_once(self):
+        seen = []
+        url = '/api/testresults/?page_size=3'
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                body = self.client.get(url).json()
+            # A COUNT over the small tests table validates the nested test names.
+            self.assertFalse(any(
+                'OFFSET' in q['sql'] or ('COUNT(' in q['sql'] and '"tracker_testresults"' in q['sql'])
+                for q in ctx.captured_queries
+            ))
+            seen.extend(row['id'] for row in body['results'])
+            url = body['next']
+        self.assertEqual(sorted(seen), sorted(TestResults.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_result_is_typed_on_write(self):
+        student = TestResults.objects.first().student_id
+        row = self.client.post('/api/testresults/', {'student': student, 'test': 'ADHD screening', 'result': '85'}).json()
+        self.assertEqual((row['test'], row['result_value'], row['result_category']), ('ADHD screening', 85.0, ''))
+        self.assertTrue(Tests.objects.filter(test_name='ADHD screening').exists())
+
+    def test_paginated_by_default(self):
+        body = self.client.get('/api/testresults/').json()
+        self.assertEqual((len(body['results']), body['next']), (7, None))
+        with mock.patch.object(KeysetPagination, 'max_page_size', 5):
+            self.assertEqual(len(self.client.get('/api/testresults/?page_size=1000').json()['results']), 5)
+
+    def test_stream_formats(self):
+        response = self.client.get('/api/testresults/?stream=1')
+        self.assertTrue(response.streaming)
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 7)
+
+        response = self.client.get('/api/testresults/?stream=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], sorted(r['id'] for r in rows))
+
+        self.assertEqual(self.client.get('/api/testresults/?stream=xml').status_code, 400)
+
+
+class StudentFieldsetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        cls.student = Student.objects.create(name="Ava", address="1 Main St", parent_email="p@example.com", contact="0")
+        HealthData.objects.create(student=cls.student, height=120, weight=25, blood_type="O+")
+        cls.vision = Tests.objects.create(test_name="Vision")
+        TestResults.objects.create(student=cls.student, test=cls.vision, result="20/20")
+
+    def setUp(self):
+        login(self.client, self.admin)
+
+    def test_roster_shape_skips_relations(self):
+        with CaptureQueriesContext(connection) as ctx:
+            rows = self.client.get('/api/students/?fields=id,name,class_group').json()['results']
+        self.assertEqual(rows, [{'id': self.student.id, 'name': 'Ava', 'class_group': None}])
+        self.assertFalse(any('tracker_healthdata' in q['sql'] for q in ctx.captured_queries))
+
+    def test_expand_selects_relations(self):
+        row = self.client.get(f'/api/students/{self.student.id}/?expand=testresults').json()
+        self.assertIn('testresults', row)
+        self.assertNotIn('healthdata', row)
+        self.assertNotIn('medicalhistory', row)
+        self.assertEqual(row['name'], 'Ava')
+
+    def test_default_shape_is_fully_nested(self):
+        row = self.client.get(f'/api/students/{self.student.id}/').json()
+        self.assertEqual(len(row['healthdata']), 1)
+        self.assertIn('medicalhistory', row)
+
+    def test_unknown_expand_is_rejected(self):
+        self.assertEqual(self.client.get('/api/students/?expand=grades').status_code, 400)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(f'/api/students/{self.student.id}/?fields=id,nmae')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('nmae', response.json()['fields'])
+
+
+class UserCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+
+    def setUp(self):
+        user_cache.clear()
+        login(self.client, self.admin)
+
+    def test_second_request_skips_user_lookup(self):
+        self.client.get('/api/allergies/')
+        hits = user_cache.hits
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/allergies/')
+        self.assertFalse(any('"tracker_user"' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(self.client.get('/api/auth/cache-stats/').json()['hits'], hits + 2)
+
+    def test_save_invalidates(self):
+        self.client.get('/api/allergies/')
+        self.admin.role = 'parent'
+        self.admin.save()
+        self.assertEqual(self.client.get('/api/auth/cache-stats/').status_code, 403)
+
+
+class SignedTokenTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create(name="Nurse", email="nurse@example.com", password=make_password("secret"), role="admin")
+
+    def setUp(self):
+        response = self.client.post('/api/login/', {'email': 'nurse@example.com', 'password': 'secret'})
+        self.token = response.json()['token']
+        self.client = self.client_class(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_authenticates_without_user_or_session_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/allergies/')
+        self.assertEqual(response.status_code, 200)
+        tables = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('tracker_user', tables)
+        self.assertNotIn('django_session', tables)
+
+    def test_refresh_revokes_previous_token(self):
+        new_token = self.client.post('/api/token/refresh/').json()['token']
+        self.assertEqual(self.client.get('/api/allergies/').status_code, 403)
+        response = self.client.get('/api/allergies/', HTTP_AUTHORIZATION=f'Bearer {new_token}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_tampered_token_is_rejected(self):
+        response = self.client.get('/api/allergies/', HTTP_AUTHORIZATION=f'Bearer {self.token[:-2]}xx')
+        self.assertEqual(response.status_code, 403)
+
+
+class RoleScopingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(name="Teacher", email="teacher@example.com", password="x", role="teacher")
+        cls.parent = User.objects.create(name="Parent", email="parent@example.com", password="x", role="parent")
+        cls.own_class = ClassGroup.objects.create(name="Grade 1")
+        cls.own_class.teachers.add(cls.teacher)
+        other_class = ClassGroup.objects.create(name="Grade 2")
+        cls.mine = Student.objects.create(
+            name="Ava", address="1 Main St", parent_email="parent@example.com", contact="0", class_group=cls.own_class,
+        )
+        cls.other = Student.objects.create(
+            name="Liam", address="2 Main St", parent_email="other@example.com", contact="0", class_group=other_class,
+        )
+        cls.vision = Tests.objects.create(test_name="Vision")
+        cls.other_result = TestResults.objects.create(student=cls.other, test=cls.vision, result="20/20")
+
+    def setUp(self):
+        user_cache.clear()
+
+    def test_teacher_sees_only_their_classes(self):
+        login(self.client, self.teacher)
+        self.assertEqual([s['id'] for s in self.client.get('/api/students/').json()['results']], [self.mine.id])
+        self.assertEqual([c['id'] for c in self.client.get('/api/classes/').json()['results']], [self.own_class.id])
+        self.assertEqual(self.client.get(f'/api/students/{self.mine.id}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/students/{self.other.id}/').status_code, 404)
+
+    def test_parent_cannot_reach_other_records(self):
+        login(self.client, self.parent)
+        self.assertEqual(self.client.get(f'/api/testresults/{self.other_result.id}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/testresults/').json()['results'], [])
+        response = self.client.post('/api/testresults/', {'student': self.other.id, 'test': 'Vision', 'result': 'ok'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/testresults/', {'student': self.mine.id, 'test': 'Vision', 'result': 'ok'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_only_staff_add_test_names_and_only_once_valid(self):
+        login(self.client, self.parent)
+        response = self.client.post('/api/testresults/', {'student': self.mine.id, 'test': 'Bogus test', 'result': 'ok'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('test', response.json())
+        response = self.client.post('/api/testresults/bulk/', [{'student': self.mine.id, 'test': 'Bogus test', 'result': 'ok'}],
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        login(self.client, self.teacher)
+        response = self.client.post('/api/testresults/', {'student': self.other.id, 'test': 'Hearing', 'result': 'ok'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Tests.objects.filter(test_name__in=['Bogus test', 'Hearing']).exists())
+        response = self.client.post('/api/testresults/', {'student': self.mine.id, 'test': 'Hearing', 'result': 'ok'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['test'], 'Hearing')
+        self.assertTrue(Tests.objects.filter(test_name='Hearing').exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', "EXPLAIN plans are PostgreSQL specific")
+class IndexPlanTests(TestCase):
+    """
+    Every query an endpoint issues against the large tables must be servable
+    from an index. Sequential scans are disabled (not forbidden) while
+    planning, so a Seq Scan in the plan means no usable index exists.
+    """
+    LARGE_TABLES = (
+        'tracker_student', 'tracker_healthdata', 'tracker_healthdata_allergies',
+        'tracker_medicalhistory', 'tracker_testresults', 'tracker_changelog',
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        cls.teacher = User.objects.create(name="Teacher", email="teacher@example.com", password="x", role="teacher")
+        cls.parent = User.objects.create(name="Parent", email="parent0@example.com", password="x", role="parent")
+        classes = [ClassGroup.objects.create(name=f"Grade {i}") for i in range(3)]
+        classes[0].teachers.add(cls.teacher)
+        students = Student.objects.bulk_create(
+            Student(
+                name=f"Student {i}", address="1 Main St", parent_email=f"parent{i % 20}@example.com",
+                contact="0", class_group=classes[i % 3],
+            )
+            for i in range(60)
+        )
+        cls.student = students[0]
+        allergy = Allergy.objects.create(allergy="Peanuts", type="food")
+        for model, fields in (
+            (HealthData, {'height': 120, 'weight': 25, 'blood_type': 'O+'}),
+            (MedicalHistory, {'medical_condition': 'Asthma'}),
+            (TestResults, {'test': Tests.objects.create(test_name='Vision'), 'result': '20/20'}),
+        ):
+            model.objects.bulk_create(model(student=s, **fields) for s in students for _ in range(3))
+        HealthData.allergies.through.objects.bulk_create(
+            HealthData.allergies.through(healthdata=h, allergy=allergy) for h in HealthData.objects.all()
+        )
+
+    def setUp(self):
+        user_cache.clear()
+
+    def seq_scans(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+        found = []
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            for query in ctx.captured_queries:
+                if not query['sql'].lstrip().upper().startswith('SELECT'):
+                    continue
+                cursor.execute(f"EXPLAIN {query['sql']}")
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+                found += [table for table in self.LARGE_TABLES if f"Seq Scan on {table} " in plan + " "]
+        return found
+
+    def test_endpoints_use_indexes(self):
+        student = self.student.id
+        urls = [
+            '/api/students/?page_size=20', f'/api/students/{student}/',
+            '/api/healthdata/?page_size=20', f'/api/healthdata/?student={student}',
+            '/api/medicalhistory/?page_size=20', f'/api/medicalhistory/?student={student}',
+            '/api/testresults/?page_size=20', f'/api/testresults/?student={student}',
+            '/api/search/?q=student 1', '/api/search/?q=asth', '/api/changes/', '/api/changes/?since=0-0',
+        ]
+        for user in (self.admin, self.teacher, self.parent):
+            login(self.client, user)
+            for url in urls:
+                with self.subTest(role=user.role, url=url):
+                    self.assertEqual(self.seq_scans(url), [])
+
+
+class TestResultsBulkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        cls.students = Student.objects.bulk_create(
+            Student(name=f"Student {i}", address="1 Main St", parent_email="p@example.com", contact="0")
+            for i in range(5)
+        )
+
+    def setUp(self):
+        user_cache.clear()
+        login(self.client, self.admin)
+
+    def test_creates_batch_in_constant_queries(self):
+        items = [{'student': s.id, 'test': 'Vision', 'result': '20/20'} for s in self.students] * 40
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/testresults/bulk/', items, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 200)
+        # Includes the change-log insert for the feed.
+        self.assertLessEqual(len(ctx.captured_queries), 10)
+
+    def test_reports_every_bad_item_and_inserts_nothing(self):
+        body = "\n".join(json.dumps(item) for item in [
+            {'student': self.students[0].id, 'test': 'Vision', 'result': '20/20'},
+            {'student': 999999, 'test': 'Vision', 'result': '20/20'},
+            {'student': self.students[1].id, 'test': 'Vision'},
+        ])
+        response = self.client.post('/api/testresults/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['index'] for e in response.json()['errors']], [1, 2])
+        self.assertFalse(TestResults.objects.exists())
+
+
+class ClassSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        cls.class_group = ClassGroup.objects.create(name="Grade 1")
+        peanuts = Allergy.objects.create(allergy="Peanuts", type="food")
+        vision = Tests.objects.create(test_name="Vision")
+        for i, (height, weight) in enumerate([(150, 30), (150, 50), (150, 80)]):
+            student = Student.objects.create(
+                name=f"Student {i}", address="1 Main St", parent_email="p@example.com", contact="0",
+                class_group=cls.class_group,
+            )
+            # Only the latest row counts.
+            HealthData.objects.create(student=student, height=100, weight=100, blood_type="AB-")
+            latest = HealthData.objects.create(student=student, height=height, weight=weight, blood_type="O+")
+            if i == 0:
+                latest.allergies.add(peanuts)
+            TestResults.objects.create(student=student, test=vision, result=str(80 + i))
+        TestResults.objects.create(student=student, test=vision, result="pending")
+
+    def setUp(self):
+        user_cache.clear()
+        login(self.client, self.admin)
+
+    def test_summary(self):
+        with CaptureQueriesContext(connection) as ctx:
+            summary = self.client.get(f'/api/classes/{self.class_group.id}/summary/').json()
+        self.assertLess(len(ctx.captured_queries), 12)
+        self.assertEqual(summary['students'], 3)
+        self.assertEqual(summary['bmi_distribution'], {'underweight': 1, 'normal': 1, 'overweight': 0, 'obese': 1})
+        self.assertEqual(summary['blood_types'], {'O+': 3})
+        self.assertEqual(summary['allergy_prevalence']['food'], 1)
+        self.assertEqual(summary['allergy_prevalence']['medication'], 0)
+        [vision] = summary['tests']
+        self.assertEqual((vision['results'], vision['average'], vision['categories']), (4, 81.0, {'pending': 1}))
+
+
+class HealthSnapshotTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        cls.student = Student.objects.create(name="Ava", address="1 Main St", parent_email="p@example.com", contact="0")
+
+    def setUp(self):
+        user_cache.clear()
+        login(self.client, self.admin)
+
+    def latest(self):
+        self.student.refresh_from_db()
+        return self.student.latest_health_id
+
+    def test_follows_writes_through_the_api(self):
+        first = self.client.post('/api/healthdata/', {'student': self.student.id, 'height': 120, 'weight': 25, 'blood_type': 'O+'}).json()
+        second = self.client.post('/api/healthdata/', {'student': self.student.id, 'height': 122, 'weight': 26, 'blood_type': 'O+'}).json()
+        self.assertEqual(self.latest(), second['id'])
+
+        self.client.delete(f"/api/healthdata/{second['id']}/")
+        self.assertEqual(self.latest(), first['id'])
+
+        other = Student.objects.create(name="Liam", address="2 Main St", parent_email="q@example.com", contact="0")
+        self.client.patch(f"/api/healthdata/{first['id']}/", {'student': other.id}, content_type='application/json')
+        self.assertIsNone(self.latest())
+        other.refresh_from_db()
+        self.assertEqual(other.latest_health_id, first['id'])
+
+    def test_rebuild_command(self):
+        row = HealthData.objects.create(student=self.student, height=120, weight=25, blood_type="O+")
+        Student.objects.update(latest_health=None)
+        call_command('rebuild_health_snapshots', stdout=io.StringIO())
+        self.assertEqual(self.latest(), row.id)
+
+
+class GrowthTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        cls.student = Student.objects.create(
+            name="Ava", address="1 Main St", parent_email="p@example.com", contact="0",
+            gender="female", date_of_birth=date(2015, 1, 1),
+        )
+        HealthData.objects.create(student=cls.student, height=150, weight=49.5, blood_type="O+")
+
+    def setUp(self):
+        user_cache.clear()
+        login(self.client, self.admin)
+        reference_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(reference_dir.cleanup)
+        # Flat synthetic tables: BMI ~ Box-Cox with L=1, height ~ log-normal (L=0).
+        for name, l, m, s in (('bmi_for_age', 1, 20, 0.1), ('height_for_age', 0, 150, 0.05)):
+            with open(os.path.join(reference_dir.name, f'{name}.csv'), 'w') as f:
+                f.write("sex,age_months,L,M,S\n")
+                f.writelines(f"{sex},{age},{l},{m},{s}\n" for sex in (1, 2) for age in (60, 240))
+        self.enterContext(override_settings(GROWTH_REFERENCE_DIR=reference_dir.name, ROOT_URLCONF='tracker.tests'))
+        growth.reference.cache_clear()
+        self.addCleanup(growth.reference.cache_clear)
+
+    def test_student_percentiles(self):
+        row = self.client.get(f'/api/students/{self.student.id}/growth/').json()
+        self.assertEqual(row['bmi'], 22.0)
+        self.assertEqual(row['bmi_for_age_z'], 1.0)
+        self.assertEqual(row['bmi_for_age_percentile'], 84.1)
+        self.assertEqual(row['height_for_age_z'], 0.0)
+        self.assertEqual(row['height_for_age_percentile'], 50.0)
+
+    def test_student_edits_are_not_served_from_cache(self):
+        url = f'/api/students/{self.student.id}/growth/'
+        before = self.client.get(url).json()['age_months']
+        Student.objects.filter(pk=self.student.pk).update(date_of_birth=date(2016, 1, 1))
+        self.assertAlmostEqual(self.client.get(url).json()['age_months'], before - 12, delta=0.2)
+
+    def test_bulk_omits_students_without_health_data(self):
+        Student.objects.create(name="Liam", address="2 Main St", parent_email="q@example.com", contact="0")
+        rows = self.client.get('/api/growth/').json()
+        self.assertEqual([row['student'] for row in rows], [self.student.id])
+
+    def test_bad_class_group(self):
+        self.assertEqual(self.client.get('/api/growth/', {'class_group': 'x'}).status_code, 400)
+
+    def test_missing_reference_tables(self):
+        with override_settings(GROWTH_REFERENCE_DIR='/nonexistent'):
+            growth.reference.cache_clear()
+            cache.clear()
+            self.assertEqual(self.client.get('/api/growth/').status_code, 503)
+
+
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        cls.student = Student.objects.create(name="Ava", address="1 Main St", parent_email="p@example.com", contact="0")
+        cls.vision = Tests.objects.create(test_name="Vision")
+        TestResults.objects.create(student=cls.student, test=cls.vision, result="20/20")
+
+    def setUp(self):
+        user_cache.clear()
+        login(self.client, self.admin)
+
+    def revalidate(self, url, etag):
+        user_cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return response, ctx.captured_queries
+
+    def test_unchanged_student_is_not_reloaded(self):
+        url = f'/api/students/{self.student.id}/'
+        etag = self.client.get(url)['ETag']
+        response, queries = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any('tracker_healthdata' in q['sql'] for q in queries))
+
+    def test_nested_write_changes_student_etag(self):
+        url = f'/api/students/{self.student.id}/'
+        etag = self.client.get(url)['ETag']
+        MedicalHistory.objects.create(student=self.student, medical_condition="Asthma")
+        response, _ = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_notices_deletes(self):
+        url = '/api/testresults/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.revalidate(url, etag)[0].status_code, 304)
+        TestResults.objects.all().delete()
+        self.assertEqual(self.revalidate(url, etag)[0].status_code, 200)
+
+    def test_list_validates_nested_names_by_cache_version(self):
+        url = '/api/testresults/'
+        etag = self.client.get(url)['ETag']
+        response, queries = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any('"tracker_tests"' in q['sql'] for q in queries))
+        self.vision.test_name = "Eyesight"
+        self.vision.save()
+        self.assertEqual(self.revalidate(url, etag)[0].status_code, 200)
+
+    def test_deleting_a_teacher_changes_class_etags(self):
+        teacher = User.objects.create(name="Teacher", email="t@example.com", password="x", role="teacher")
+        grade = ClassGroup.objects.create(name="Grade 1")
+        grade.teachers.add(teacher)
+        urls = [f'/api/classes/{grade.id}/', '/api/classes/']
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        teacher.delete()
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.revalidate(url, etag)[0].status_code, 200)
+        self.assertEqual(self.client.get(urls[0]).json()['teachers'], [])
+
+    def test_paginated_page(self):
+        url = '/api/students/?page_size=10'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.revalidate(url, etag)[0].status_code, 304)
+        Student.objects.filter(pk=self.student.pk).update(name="Ava B")
+        Student.objects.filter(pk=self.student.pk).touch()
+        self.assertEqual(self.revalidate(url, etag)[0].status_code, 200)
+
+
+class ResponseCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        cls.teacher = User.objects.create(name="Teacher", email="teacher@example.com", password="x", role="teacher")
+        cls.class_group = ClassGroup.objects.create(name="Grade 1")
+        Allergy.objects.create(allergy="Peanuts", type="food")
+
+    def setUp(self):
+        user_cache.clear()
+        response_cache.clear()
+        login(self.client, self.admin)
+
+    def get(self, url):
+        user_cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(ctx.captured_queries)
+
+    def test_hit_skips_the_database(self):
+        first, _ = self.get('/api/allergies/')
+        second, queries = self.get('/api/allergies/')
+        self.assertEqual(first, second)
+        # Only the session and user lookups remain.
+        self.assertEqual(queries, 2)
+
+    def test_write_invalidates(self):
+        self.get('/api/allergies/')
+        Allergy.objects.create(allergy="Pollen", type="environment")
+        body, _ = self.get('/api/allergies/')
+        self.assertEqual(len(body['results']), 2)
+
+    def test_global_lists_are_shared_between_users(self):
+        login(self.client, self.teacher)
+        self.get('/api/allergies/')
+        self.get('/api/tests/')
+        other = User.objects.create(name="Other", email="other@example.com", password="x", role="teacher")
+        login(self.client, other)
+        self.assertEqual(self.get('/api/allergies/')[1], 2)
+        self.assertEqual(self.get('/api/tests/')[1], 2)
+
+    def test_teacher_membership_invalidates_and_is_per_user(self):
+        login(self.client, self.teacher)
+        self.assertEqual(self.get('/api/classes/')[0]['results'], [])
+        self.class_group.teachers.add(self.teacher)
+        self.assertEqual([row['id'] for row in self.get('/api/classes/')[0]['results']], [self.class_group.id])
+
+        login(self.client, self.admin)
+        self.assertEqual(len(self.get('/api/classes/')[0]['results']), 1)
+
+
+class BatchedPrimaryKeyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.allergies = [Allergy.objects.create(allergy=f"Allergy {i}", type="food") for i in range(15)]
+        cls.student = Student.objects.create(name="Ava", address="1 Main St", parent_email="p@example.com", contact="0")
+
+    def test_ids_resolve_in_one_query(self):
+        ids = [allergy.id for allergy in self.allergies]
+        serializer = HealthDataSerializer(data={'student': self.student.id, 'height': 120, 'weight': 25, 'blood_type': 'O+', 'allergy_ids': ids})
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(sum('tracker_allergy' in q['sql'] for q in ctx.captured_queries), 1)
+        self.assertEqual([allergy.id for allergy in serializer.validated_data['allergies']], ids)
+
+    def test_every_bad_id_is_reported(self):
+        teacher = User.objects.create(name="T", email="t@example.com", password="x", role="teacher")
+        serializer = ClassGroupSerializer(data={'name': "Grade 1", 'teachers': [teacher.id, 998, 999, 'x']})
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['teachers'], [
+            'Incorrect type. Expected pk value, received str.',
+            'Invalid pk "998" - object does not exist.',
+            'Invalid pk "999" - object does not exist.',
+        ])
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        cls.parent = User.objects.create(name="Parent", email="kim@example.com", password="x", role="parent")
+        cls.ava = Student.objects.create(name="Ava Lindqvist", address="1 Main St", parent_email="kim@example.com", contact="0")
+        cls.avery = Student.objects.create(name="Avery Stone", address="9 Lindqvist Rd", parent_email="q@example.com", contact="0")
+        MedicalHistory.objects.create(student=cls.avery, medical_condition="Diabetes")
+
+    def setUp(self):
+        user_cache.clear()
+        login(self.client, self.admin)
+
+    def search(self, query):
+        response = self.client.get('/api/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_prefix_terms_and_ranking(self):
+        rows = self.search('lindq')['results']
+        self.assertEqual({row['id'] for row in rows}, {self.ava.id, self.avery.id})
+        self.assertEqual([row['id'] for row in self.search('av lind')['results']][:1], [self.ava.id])
+
+    def test_medical_conditions(self):
+        rows = self.search('diabet')['results']
+        self.assertEqual([(row['id'], row['matched']) for row in rows], [(self.avery.id, ['medical_history'])])
+
+    def test_name_matches_rank_above_condition_matches(self):
+        diana = Student.objects.create(name="Diana Brook", address="3 Main St", parent_email="d@example.com", contact="0")
+        rows = self.search('dia')['results']
+        self.assertEqual([row['id'] for row in rows], [diana.id, self.avery.id])
+        self.assertEqual(rows[0]['matched'][0], 'student')
+
+    def test_role_scoping(self):
+        login(self.client, self.parent)
+        self.assertEqual([row['id'] for row in self.search('av')['results']], [self.ava.id])
+
+    def test_pagination(self):
+        body = self.client.get('/api/search/', {'q': 'av', 'page_size': 1}).json()
+        self.assertEqual(len(body['results']), 1)
+        rest = self.client.get(body['next']).json()
+        self.assertEqual(len(rest['results']), 1)
+        self.assertIsNone(rest['next'])
+        self.assertNotEqual(body['results'][0]['id'], rest['results'][0]['id'])
+
+    def test_short_query_is_rejected(self):
+        self.assertEqual(self.client.get('/api/search/', {'q': 'a'}).status_code, 400)
+
+    def test_offset_is_capped(self):
+        self.assertEqual(self.client.get('/api/search/', {'q': 'av', 'offset': 1000}).status_code, 200)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'av', 'offset': 1001}).status_code, 400)
+
+
+class AllergyCohortTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        cls.teacher = User.objects.create(name="Teacher", email="teacher@example.com", password="x", role="teacher")
+        cls.grade1, cls.grade2 = ClassGroup.objects.create(name="Grade 1"), ClassGroup.objects.create(name="Grade 2")
+        cls.grade1.teachers.add(cls.teacher)
+        cls.peanuts = Allergy.objects.create(allergy="Peanuts", type="food")
+        cls.pollen = Allergy.objects.create(allergy="Pollen", type="environment")
+        cls.ava, cls.liam, cls.noah = (
+            Student.objects.create(name=name, address="1 Main St", parent_email="p@example.com", contact="0", class_group=group)
+            for name, group in (("Ava", cls.grade1), ("Liam", cls.grade2), ("Noah", cls.grade1))
+        )
+        for student, allergies in ((cls.ava, [cls.peanuts]), (cls.liam, [cls.peanuts, cls.pollen]), (cls.noah, [cls.pollen])):
+            HealthData.objects.create(student=student, height=120, weight=25, blood_type="O+").allergies.set(allergies)
+
+    def setUp(self):
+        user_cache.clear()
+        cache.clear()
+        login(self.client, self.admin)
+        for name, value in (('background', False), ('version_ttl', 0), ('rebuild_interval', 0)):
+            self.addCleanup(setattr, cohort_index, name, getattr(cohort_index, name))
+            setattr(cohort_index, name, value)
+        cohort_index.version = None
+        cohort_index._built_at = None
+
+    def cohort(self, **params):
+        response = self.client.get('/api/allergies/cohort/', params)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        return [row['id'] for row in body['students']], body['source']
+
+    def test_cold_then_warm_agree(self):
+        query = {'allergy': self.peanuts.id, 'class_group': f'{self.grade1.id},{self.grade2.id}'}
+        cold = self.cohort(**query)
+        warm = self.cohort(**query)
+        self.assertEqual(cold, ([self.ava.id, self.liam.id], 'database'))
+        self.assertEqual(warm, ([self.ava.id, self.liam.id], 'index'))
+        self.assertEqual(self.cohort(type='environment', class_group=self.grade1.id), ([self.noah.id], 'index'))
+
+    def test_teacher_sees_own_classes_only(self):
+        self.cohort(type='food')
+        login(self.client, self.teacher)
+        self.assertEqual(self.cohort(type='food'), ([self.ava.id], 'index'))
+
+    def test_index_follows_allergy_changes(self):
+        self.cohort(type='food')
+        with self.captureOnCommitCallbacks(execute=True):
+            HealthData.objects.get(student=self.noah).allergies.add(self.peanuts)
+        self.assertEqual(self.cohort(allergy=self.peanuts.id), ([self.ava.id, self.liam.id, self.noah.id], 'index'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            HealthData.objects.create(student=self.ava, height=121, weight=25, blood_type="O+")
+        self.assertEqual(self.cohort(allergy=self.peanuts.id), ([self.liam.id, self.noah.id], 'index'))
+
+    def test_changes_from_another_process_are_replayed(self):
+        self.cohort(type='food')
+        # Another process writes and logs the change; this one never sees the signal.
+        HealthData.objects.get(student=self.noah).allergies.add(self.peanuts)
+        cohort_index._bump(students=[self.noah.id])
+        with mock.patch.object(cohort_index, 'rebuild') as rebuild:
+            self.assertEqual(self.cohort(type='food'), ([self.ava.id, self.liam.id, self.noah.id], 'index'))
+        rebuild.assert_not_called()
+
+    def test_invalidate_rebuilds_at_most_once_per_interval(self):
+        self.cohort(type='food')
+        cohort_index.rebuild_interval = 3600
+        with self.captureOnCommitCallbacks(execute=True):
+            cohort_index.invalidate()
+        self.assertEqual(self.cohort(type='food')[1], 'database')
+        self.assertEqual(self.cohort(type='food')[1], 'database')
+
+    def test_bump_from_another_process_makes_index_cold(self):
+        self.cohort(type='food')
+        # What a management command in its own process does; nothing here is shared but the database.
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval('tracker_cohort_version')")
+        self.assertEqual(self.cohort(type='food')[1], 'database')
+        self.assertEqual(self.cohort(type='food')[1], 'index')
+
+
+class ChangeFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        cls.parent = User.objects.create(name="Parent", email="kim@example.com", password="x", role="parent")
+        cls.ava = Student.objects.create(name="Ava", address="1 Main St", parent_email="kim@example.com", contact="0")
+        cls.liam = Student.objects.create(name="Liam", address="2 Main St", parent_email="q@example.com", contact="0")
+
+    def setUp(self):
+        user_cache.clear()
+        login(self.client, self.admin)
+        self.cursor = self.client.get('/api/changes/').json()['cursor']
+
+    def changes(self, cursor=None, **params):
+        response = self.client.get('/api/changes/', {'since': cursor or self.cursor, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_only_changes_since_cursor(self):
+        self.assertEqual(self.changes()['changes'], [])
+        history = MedicalHistory.objects.create(student=self.ava, medical_condition="Asthma")
+        history.medical_condition = "Asthma (mild)"
+        history.save()
+
+        body = self.changes()
+        self.assertEqual(len(body['changes']), 1)
+        change = body['changes'][0]
+        self.assertEqual((change['model'], change['id'], change['action']), ('medicalhistory', history.id, 'updated'))
+        self.assertEqual(change['data']['medical_condition'], "Asthma (mild)")
+        self.assertEqual(self.changes(body['cursor'])['changes'], [])
+
+    def test_detail_delete_leaves_tombstone(self):
+        result = TestResults.objects.create(student=self.liam, test=Tests.objects.create(test_name="Vision"), result="20/20")
+        cursor = self.changes()['cursor']
+        self.assertEqual(self.client.delete(f'/api/testresults/{result.id}/').status_code, 204)
+        self.assertEqual(self.changes(cursor)['changes'], [
+            {'model': 'testresults', 'id': result.id, 'action': 'deleted', 'data': None},
+        ])
+
+    def test_parent_sees_own_children_and_their_tombstones(self):
+        HealthData.objects.create(student=self.liam, height=120, weight=25, blood_type="O+")
+        ava_id = self.ava.id
+        self.ava.delete()
+        login(self.client, self.parent)
+        body = self.changes()
+        self.assertEqual({(c['model'], c['action']) for c in body['changes']}, {('student', 'deleted')})
+        self.assertEqual({c['id'] for c in body['changes'] if c['model'] == 'student'}, {ava_id})
+
+    def test_moved_student_leaves_previous_scope(self):
+        teacher = User.objects.create(name="Teacher", email="teacher@example.com", password="x", role="teacher")
+        old_class = ClassGroup.objects.create(name="Grade 1")
+        old_class.teachers.add(teacher)
+        new_class = ClassGroup.objects.create(name="Grade 2")
+        self.ava.class_group = old_class
+        self.ava.save()
+        history = MedicalHistory.objects.create(student=self.ava, medical_condition="Asthma")
+
+        login(self.client, teacher)
+        cursor = self.changes()['cursor']
+        self.ava.class_group = new_class
+        self.ava.save()
+        self.assertEqual(self.client.get(f'/api/students/{self.ava.id}/').status_code, 404)
+        self.assertEqual(
+            {(c['model'], c['id'], c['action']) for c in self.changes(cursor)['changes']},
+            {('student', self.ava.id, 'deleted'), ('medicalhistory', history.id, 'deleted')},
+        )
+
+        login(self.client, self.parent)
+        cursor = self.changes()['cursor']
+        self.ava.parent_email = "new@example.com"
+        self.ava.save()
+        self.assertEqual(
+            {(c['model'], c['id'], c['action']) for c in self.changes(cursor)['changes']},
+            {('student', self.ava.id, 'deleted'), ('medicalhistory', history.id, 'deleted')},
+        )
+
+        new_parent = User.objects.create(name="New", email="new@example.com", password="x", role="parent")
+        login(self.client, new_parent)
+        self.assertEqual(
+            {(c['model'], c['action']) for c in self.changes(cursor)['changes']},
+            {('student', 'updated'), ('medicalhistory', 'updated')},
+        )
+
+    def test_paging(self):
+        for i in range(5):
+            MedicalHistory.objects.create(student=self.ava, medical_condition=f"Condition {i}")
+        first = self.changes(limit=3)
+        self.assertTrue(first['has_more'])
+        rest = self.changes(first['cursor'], limit=3)
+        self.assertFalse(rest['has_more'])
+        self.assertEqual(len(first['changes']) + len(rest['changes']), 5)
+
+    def test_bad_cursor(self):
+        self.assertEqual(self.client.get('/api/changes/', {'since': 'abc'}).status_code, 400)
+
+
+class AsyncViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create(name="Nurse", email="nurse@example.com", password=make_password("secret"), role="admin")
+        cls.ava = Student.objects.create(name="Ava", address="1 Main St", parent_email="kim@example.com", contact="0")
+        cls.result = TestResults.objects.create(student=cls.ava, test=Tests.objects.create(test_name="Vision"), result="20/20")
+
+    async def test_login_and_conditional_get_under_asgi(self):
+        response = await self.async_client.post(
+            '/api/login/', {'email': 'nurse@example.com', 'password': 'secret'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        headers = {'Authorization': f"Bearer {response.json()['token']}"}
+
+        response = await self.async_client.get('/api/testresults/', {'student': self.ava.id}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.result.id])
+        response = await self.async_client.get(
+            '/api/testresults/', {'student': self.ava.id}, headers={**headers, 'If-None-Match': response['ETag']}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.get(f'/api/testresults/{self.result.id}/', headers=headers)
+        self.assertEqual(response.json()['result'], "20/20")
+
+    async def test_wrong_password(self):
+        response = await self.async_client.post(
+            '/api/login/', {'email': 'nurse@example.com', 'password': 'nope'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_sync_handlers_still_run(self):
+        response = self.client.post('/api/login/', {'email': 'nurse@example.com', 'password': 'secret'})
+        client = self.client_class(HTTP_AUTHORIZATION=f"Bearer {response.json()['token']}")
+        response = client.post('/api/medicalhistory/', {'student': self.ava.id, 'medical_condition': "Asthma"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(client.get(f"/api/medicalhistory/{response.json()['id']}/").status_code, 200)
+
+class PostgresBrokerTests(SimpleTestCase):
+    # NOTIFY is only delivered on commit, so this runs outside a test transaction.
+    databases = {'default'}
+
+    async def test_relays_notifications(self):
+        relay = PostgresBroker(queue_size=8, channel='tracker_events_test')
+        self.addCleanup(relay.stop)
+        subscription = relay.subscribe()
+        self.assertTrue(await sync_to_async(relay.listening.wait)(5))
+
+        await sync_to_async(relay.publish)({'event': 'testresults', 'student': 1, 'body': '{}'})
+        self.assertEqual((await asyncio.wait_for(subscription.get(), 5))['event'], 'testresults')
+        await sync_to_async(relay.publish)({'event': 'testresults', 'student': 1, 'body': 'x' * 8000})
+        self.assertIs(await asyncio.wait_for(subscription.get(), 5), RESYNC)
+        subscription.close()
+
+
+class EventStreamTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.parent = User.objects.create(name="Parent", email="kim@example.com", password="x", role="parent")
+        cls.ava = Student.objects.create(name="Ava", address="1 Main St", parent_email="kim@example.com", contact="0")
+        cls.liam = Student.objects.create(name="Liam", address="2 Main St", parent_email="q@example.com", contact="0")
+        cls.vision = Tests.objects.create(test_name="Vision")
+
+    def write(self, func):
+        with self.captureOnCommitCallbacks(execute=True):
+            return func()
+
+    async def next_event(self, chunks):
+        chunk = await asyncio.wait_for(chunks.get(), 5)
+        fields = dict(line.split(': ', 1) for line in chunk.decode().splitlines() if ': ' in line)
+        return fields.get('event'), json.loads(fields.get('data', 'null'))
+
+    async def test_pushes_visible_changes(self):
+        token = await sync_to_async(issue_token)(self.parent)
+        response = await self.async_client.get('/api/events/', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        chunks = asyncio.Queue()
+
+        async def read():
+            async for chunk in response.streaming_content:
+                await chunks.put(chunk)
+
+        # The ASGI handler cancels the response like this when the client disconnects.
+        reader = asyncio.create_task(read())
+        try:
+            event, data = await self.next_event(chunks)
+            self.assertEqual(event, 'ready')
+            self.assertIn('cursor', data)
+
+            create = sync_to_async(self.write)
+            await create(lambda: TestResults.objects.create(student=self.liam, test=self.vision, result="20/40"))
+            result = await create(lambda: TestResults.objects.create(student=self.ava, test=self.vision, result="20/20"))
+            event, data = await self.next_event(chunks)
+            self.assertEqual(event, 'testresults')
+            self.assertEqual((data['id'], data['action'], data['data']['result']), (result.id, 'created', "20/20"))
+
+            await create(result.delete)
+            event, data = await self.next_event(chunks)
+            self.assertEqual((event, data['action'], data['data']), ('testresults', 'deleted', None))
+        finally:
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+        self.assertFalse(broker.has_subscribers)
+
+    async def read_stream(self, stream):
+        chunk = await asyncio.wait_for(anext(stream), 5)
+        fields = dict(line.split(': ', 1) for line in chunk.splitlines() if ': ' in line)
+        return fields.get('event'), json.loads(fields.get('data', 'null'))
+
+    async def test_rechecks_classes_under_steady_traffic(self):
+        teacher = await User.objects.acreate(name="Teacher", email="t@example.com", password="x", role="teacher")
+        kept, dropped = await ClassGroup.objects.acreate(name="Grade 1"), await ClassGroup.objects.acreate(name="Grade 2")
+        await kept.teachers.aadd(teacher)
+        await dropped.teachers.aadd(teacher)
+        ben = await Student.objects.acreate(name="Ben", address="3 Main St", parent_email="b@example.com", contact="0", class_group=kept)
+        cal = await Student.objects.acreate(name="Cal", address="4 Main St", parent_email="c@example.com", contact="0", class_group=dropped)
+        create = sync_to_async(self.write)
+
+        stream = event_stream(Viewer(teacher), keepalive=5, refresh=0)
+        try:
+            self.assertEqual((await self.read_stream(stream))[0], 'ready')
+            await create(lambda: TestResults.objects.create(student=cal, test=self.vision, result="20/20"))
+            self.assertEqual((await self.read_stream(stream))[1]['student'], cal.id)
+
+            await dropped.teachers.aremove(teacher)
+            await create(lambda: TestResults.objects.create(student=cal, test=self.vision, result="20/30"))
+            await create(lambda: TestResults.objects.create(student=ben, test=self.vision, result="20/40"))
+            self.assertEqual((await self.read_stream(stream))[1]['student'], ben.id)
+        finally:
+            await stream.aclose()
+
+    async def test_closes_when_token_is_revoked(self):
+        token = await sync_to_async(issue_token)(self.parent)
+        stream = event_stream(Viewer(self.parent, token=token), keepalive=5, refresh=0)
+        try:
+            self.assertEqual((await self.read_stream(stream))[0], 'ready')
+            await sync_to_async(revoke_token)(read_token(token))
+            await sync_to_async(self.write)(lambda: TestResults.objects.create(student=self.ava, test=self.vision, result="20/20"))
+            self.assertEqual((await self.read_stream(stream))[0], 'closed')
+            with self.assertRaises(StopAsyncIteration):
+                await anext(stream)
+        finally:
+            await stream.aclose()
+        self.assertFalse(broker.has_subscribers)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get('/api/events/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_not_served_over_wsgi(self):
+        login(self.client, self.parent)
+        self.assertEqual(self.client.get('/api/events/').status_code, 501)
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        cls.ava = Student.objects.create(name="Ava", address="1 Main St", parent_email="kim@example.com", contact="0")
+        TestResults.objects.create(student=cls.ava, test=Tests.objects.create(test_name="Vision"), result="20/20")
+
+    def setUp(self):
+        user_cache.clear()
+        registry.clear()
+        login(self.client, self.admin)
+
+    def sample(self, body, name, **labels):
+        prefix = name + '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+        for line in body.splitlines():
+            if line.startswith(prefix + ' '):
+                return float(line.split()[-1])
+        return None
+
+    def test_records_requests_and_queries(self):
+        response = self.client.get('/api/testresults/', {'student': self.ava.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+$')
+        self.client.get('/api/testresults/', {'student': self.ava.id})
+
+        body = self.client.get('/metrics').content.decode()
+        labels = {'view': 'testresults-list-create', 'method': 'GET'}
+        self.assertEqual(self.sample(body, 'tracker_http_requests_total', **labels, status='200'), 2)
+        self.assertEqual(self.sample(body, 'tracker_http_request_duration_seconds_count', **labels), 2)
+        # Counted even though the async view runs its queries in another thread.
+        self.assertGreater(self.sample(body, 'tracker_db_queries_per_request_sum', **labels), 2)
+        self.assertEqual(self.sample(body, 'tracker_http_request_duration_seconds_bucket', **labels, le='+Inf'), 2)
+
+    def test_unmatched_urls_share_a_label(self):
+        self.client.get('/api/nope/')
+        body = self.client.get('/metrics').content.decode()
+        self.assertEqual(self.sample(body, 'tracker_http_requests_total', view='unmatched', method='GET', status='404'), 1)
+
+    @override_settings(METRICS={'TOKEN': 'scrape'})
+    def test_only_internal_or_token(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.1.2.3').status_code, 403)
+        response = self.client.get('/metrics', REMOTE_ADDR='10.1.2.3', HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        response_cache.clear()
+
+    def test_generate_and_run(self):
+        counts = dataset.generate(students=12, class_size=4, health_rows=2, test_results=3, seed=1, batch_size=5)
+        self.assertEqual(counts['students'], 12)
+        self.assertEqual(counts['healthdata'], 24)
+        self.assertEqual(counts['testresults'], 36)
+        self.assertTrue(dataset.exists())
+
+        report = runner.run(iterations=2, warmup=0, only=['testresults', 'student-detail'], host='testserver')
+        rows = {(row['role'], row['endpoint']): row for row in report['results']}
+        for role in runner.ROLES:
+            row = rows[(role, 'GET testresults-list-create?student=<student>')]
+            self.assertEqual(row['status'], 200)
+            self.assertGreater(row['queries'], 0)
+            self.assertEqual(rows[(role, 'GET student-detail')]['status'], 200)
+        self.assertEqual(report['meta']['dataset']['students'], 12)
+        self.assertIn('event-stream', report['skipped'])
+
+        self.assertEqual(runner.compare(report, report), [])
+        slower = {'results': [dict(row, p95_ms=row['p95_ms'] * 2) for row in report['results']]}
+        self.assertEqual(len(runner.compare(report, slower)), len(report['results']))
+
+        self.addCleanup(setattr, cohort_index, 'version', None)
+        cohort_index.version = cohort_index.shared_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(dataset.clear(), 12)
+        self.assertFalse(dataset.exists())
+        self.assertIsNone(cohort_index.version)
+
+
+class ProfilingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(name="Admin", email="admin@example.com", password="x", role="admin")
+        cls.parent = User.objects.create(name="Kim", email="kim@example.com", password="x", role="parent")
+        vision = Tests.objects.create(test_name="Vision")
+        for name in ("Ava", "Ben"):
+            student = Student.objects.create(name=name, address="1 Main St", parent_email="kim@example.com", contact="0")
+            TestResults.objects.create(student=student, test=vision, result="20/20")
+
+    def setUp(self):
+        user_cache.clear()
+
+    def test_admin_gets_report(self):
+        login(self.client, self.admin)
+        response = self.client.get('/api/students/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        request_id = response['X-Profile-Id']
+
+        report = self.client.get(f'/api/profiles/{request_id}/').json()
+        self.assertEqual(report['path'], '/api/students/')
+        self.assertEqual(report['query_count'], len(report['queries']))
+        self.assertGreater(report['query_count'], 0)
+        self.assertTrue(all('params' not in query for query in report['queries']))
+        self.assertTrue(any(row['function'].startswith('views.py:') and row['function'].endswith('(get)')
+                            for row in report['functions']))
+        self.assertTrue(any(query['origin'] for query in report['queries']))
+
+    def test_repeated_queries_are_flagged(self):
+        from .profiling import _statements
+        queries = [{'sql': 'SELECT %s', 'ms': 1.0, 'many': False, 'origin': None, 'params': hash(repr(p))}
+                   for p in ((1,), (1,), (2,))]
+        statements, repeated = _statements(queries)
+        self.assertEqual([query['duplicate'] for query in statements], [False, True, False])
+        self.assertEqual(repeated, [{'sql': 'SELECT %s', 'count': 3, 'exact_repeats': 1, 'total_ms': 3.0}])
+
+    def test_ignored_for_non_admins(self):
+        login(self.client, self.parent)
+        response = self.client.get('/api/students/', {'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.client.get('/api/profiles/abc/').status_code, 403)
+
+
+class ImportStudentsTests(TestCase):
+
+    def run_import(self, *records):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            # Strings are written as they are, to feed in malformed lines.
+            f.writelines((record if isinstance(record, str) else json.dumps(record)) + "\n" for record in records)
+        self.addCleanup(os.unlink, f.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_students', f.name, stdout=out, stderr=err)
+        return err.getvalue()
+
+    def test_bad_records_are_reported_not_fatal(self):
+        good = {'name': "Ava", 'address': "1 Main St", 'parent_email': "p@example.com", 'contact': 5550100,
+                'class_group': "Grade 9", 'height': 120, 'weight': 25}
+        errors = self.run_import(
+            good,
+            {**good, 'name': 42},
+            {**good, 'gender': ["female"]},
+            {**good, 'contact': "0" * 16},
+            {**good, 'name': "A" * 101},
+            {**good, 'height': {}},
+            '{"name": "Liam",',
+        )
+        self.assertEqual(len(errors.splitlines()), 6)
+        self.assertIn("Record 4: contact is longer than 15 characters", errors)
+        self.assertIn("Record 7: invalid JSON", errors)
+        student = Student.objects.get()
+        self.assertEqual((student.contact, student.class_group.name), ("5550100", "Grade 9"))
+
+    def test_failed_batch_leaves_no_classes(self):
+        record = {'name': "Ava", 'address': "1 Main St", 'parent_email': "p@example.com", 'contact': "0",
+                  'class_group': "Grade 9", 'height': 120, 'weight': 25}
+        with mock.patch.object(HealthData.objects, 'bulk_create', side_effect=DatabaseError("boom")):
+            with self.assertRaises(DatabaseError):
+                self.run_import(record)
+        self.assertFalse(ClassGroup.objects.exists())
+        self.assertFalse(Student.objects.exists())
@@ -1,19 +1,29 @@
 from django.urls import path, re_path
-from .views import StudentListCreateView, StudentDetailView, ClassGroupListCreateView, ClassGroupDetailView, UserListCreateView, UserDetailView, LoginView, AllergyListCreateView, AllergyDetailView, HealthDataListCreateView, HealthDataDetailView, MedicalHistoryListCreateView, MedicalHistoryDetailView, TestsListCreateView, TestsDetailView, TestResultsListCreateView, TestResultsDetailView
+from .growth import tables_installed
+from .views import StudentListCreateView, StudentDetailView, StudentGrowthView, GrowthListView, SearchView, ChangeFeedView, EventStreamView, ClassGroupListCreateView, ClassGroupDetailView, ClassGroupSummaryView, UserListCreateView, UserDetailView, LoginView, AllergyListCreateView, AllergyDetailView, AllergyCohortView, HealthDataListCreateView, HealthDataDetailView, MedicalHistoryListCreateView, MedicalHistoryDetailView, TestsListCreateView, TestsDetailView, TestResultsListCreateView, TestResultsBulkCreateView, TestResultsDetailView, AuthCacheStatsView, ProfileReportView, TokenRefreshView, TokenRevokeView
 
 urlpatterns = [
     # Student endpoints
     path('students/', StudentListCreateView.as_view(), name='student-list-create'),
     path('students/<int:pk>/', StudentDetailView.as_view(), name='student-detail'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('changes/', ChangeFeedView.as_view(), name='change-feed'),
+    path('events/', EventStreamView.as_view(), name='event-stream'),
     # Class endpoints
     path('classes/', ClassGroupListCreateView.as_view(), name='class-list-create'),
     path('classes/<int:pk>/', ClassGroupDetailView.as_view(), name='class-detail'),
+    path('classes/<int:pk>/summary/', ClassGroupSummaryView.as_view(), name='class-summary'),
     # User endpoints
     path('users/', UserListCreateView.as_view(), name='user-list-create'),
     path('users/<int:pk>/', UserDetailView.as_view(), name='user-detail'),
 
     path('login/', LoginView.as_view(), name='login'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('token/revoke/', TokenRevokeView.as_view(), name='token-revoke'),
+    path('auth/cache-stats/', AuthCacheStatsView.as_view(), name='auth-cache-stats'),
+    path('profiles/<str:request_id>/', ProfileReportView.as_view(), name='profile-report'),
 
+    path('allergies/cohort/', AllergyCohortView.as_view(), name='allergy-cohort'),
     path('allergies/', AllergyListCreateView.as_view(), name='allergy-list-create'),
     path('allergies/<int:pk>/', AllergyDetailView.as_view(), name='allergy-detail'),
 
@@ -27,5 +37,15 @@ urlpatterns = [
     path('tests/<int:pk>/', TestsDetailView.as_view(), name='tests-detail'),
 
     path('testresults/', TestResultsListCreateView.as_view(), name='testresults-list-create'),
+    path('testresults/bulk/', TestResultsBulkCreateView.as_view(), name='testresults-bulk-create'),
     path('testresults/<int:pk>/', TestResultsDetailView.as_view(), name='testresults-detail'),
 ]
+
+# Growth percentiles need the LMS reference tables, which are not bundled (see
+# growth_reference/README.md), so they are only routed once installed.
+growth_urlpatterns = [
+    path('students/<int:pk>/growth/', StudentGrowthView.as_view(), name='student-growth'),
+    path('growth/', GrowthListView.as_view(), name='growth-list'),
+]
+if tables_installed():
+    urlpatterns += growth_urlpatterns
@@ -4,11 +4,39 @@ from rest_framework import status
 from rest_framework.permissions import AllowAny
 from rest_framework import generics
 
-from .models import Student, ClassGroup, User, Allergy, HealthData, MedicalHistory, Tests, TestResults
-from .serializers import StudentSerializer, ClassGroupSerializer, UserSerializer, LoginSerializer, AllergySerializer, HealthDataSerializer, MedicalHistorySerializer, TestsSerializer, TestResultsSerializer
+from .models import Student, ClassGroup, User, Allergy, HealthData, MedicalHistory, Tests, TestResults, ALLERGY_TYPE_CHOICES, parse_result
+from django.db.models import ProtectedError
+from .serializers import StudentSerializer, ClassGroupSerializer, UserSerializer, LoginSerializer, AllergySerializer, HealthDataSerializer, MedicalHistorySerializer, TestsSerializer, TestResultsSerializer, TestResultsBulkItemSerializer, TEST_CREATOR_ROLES, parse_fieldset_params
+from rest_framework.exceptions import ValidationError
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from django.contrib.auth.hashers import check_password
+from .pagination import PaginatedListMixin
+from .async_views import AsyncAPIView
+from .conditional import aconditional_detail_response, conditional_detail_response
+from .response_cache import CachedListMixin, response_cache
+from .streaming import is_asgi, stream_format, stream_response
+from .auth.cache import user_cache
+from .auth.authenticate import CustomSessionAuthentication
+from .auth.token import SignedTokenAuthentication, issue_token, revoke_token, token_auth_enabled, token_max_age
+from .auth.hashing import acheck_password
+from rest_framework.settings import api_settings
+from rest_framework.parsers import JSONParser
+from .parsers import NDJSONParser
+from .summaries import class_health_summary
+from .growth import ReferenceUnavailable, growth_for_students
+from .search import MAX_OFFSET, MIN_QUERY_LENGTH, search_students
+from .cohorts import find_cohort
+from .changes import MAX_LIMIT, head_cursor, log_bulk, parse_cursor, read_changes, student_scopes
+from .events import EVENT_MODELS, Viewer, event_stream, publish_bulk
+from .profiling import load_report
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.request import Request
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authentication import get_authorization_header
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.db import transaction
 from rest_framework.permissions import AllowAny 
 
 # from rest_framework_simplejwt.tokens import RefreshToken
@@ -17,14 +45,13 @@ from rest_framework.permissions import AllowAny
 # -------------------------
 # User Views
 # -------------------------
-class UserListCreateView(APIView):
+class UserListCreateView(PaginatedListMixin, APIView):
     permission_classes = [AllowAny]
 
     @swagger_auto_schema(responses={200: UserSerializer(many=True)})
     def get(self, request):
-        users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
-        return Response(serializer.data)
+        users = User.objects.visible_to(request.user)
+        return self.paginated_response(request, users, UserSerializer)
 
     @swagger_auto_schema(request_body=UserSerializer, responses={201: UserSerializer})
     def post(self, request):
@@ -43,9 +70,9 @@ class UserListCreateView(APIView):
 class UserDetailView(APIView):
     permission_classes = [AllowAny]
 
-    def get_user(self, pk):
+    def get_user(self, request, pk):
         try:
-            return User.objects.get(pk=pk)
+            return User.objects.visible_to(request.user).get(pk=pk)
         except User.DoesNotExist:
             return None
 
@@ -54,15 +81,11 @@ class UserDetailView(APIView):
         responses={200: UserSerializer}
     )
     def get(self, request, pk):
-        user = self.get_user(pk)
+        user = self.get_user(request, pk)
         if not user:
             return Response({"detail": "Not found"}, status=404)
 
-        if request.user.role != 'admin' and request.user.pk != user.pk:
-            return Response({"detail": "Forbidden"}, status=403)
-
-        serializer = UserSerializer(user)
-        return Response(serializer.data)
+        return conditional_detail_response(request, user.updated_at, lambda: Response(UserSerializer(user).data))
 
     @swagger_auto_schema(
         operation_summary="Update user",
@@ -70,13 +93,10 @@ class UserDetailView(APIView):
         responses={200: UserSerializer}
     )
     def put(self, request, pk):
-        user = self.get_user(pk)
+        user = self.get_user(request, pk)
         if not user:
             return Response({"detail": "Not found"}, status=404)
 
-        if request.user.role != 'admin' and request.user.pk != user.pk:
-            return Response({"detail": "Only admins or the user themselves can update this record."}, status=403)
-
         serializer = UserSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
@@ -88,7 +108,7 @@ class UserDetailView(APIView):
         responses={204: "No Content"}
     )
     def delete(self, request, pk):
-        user = self.get_user(pk)
+        user = self.get_user(request, pk)
         if not user:
             return Response({"detail": "Not found"}, status=404)
 
@@ -102,20 +122,19 @@ class UserDetailView(APIView):
 # -------------------------
 # Class Views
 # -------------------------
-class ClassGroupListCreateView(APIView):
+class ClassGroupListCreateView(CachedListMixin, PaginatedListMixin, APIView):
     permission_classes = [AllowAny]
+    cursor_ordering = ('id',)
+    cached_models = (ClassGroup,)
 
     @swagger_auto_schema(responses={200: ClassGroupSerializer(many=True)})
     def get(self, request):
         user = request.user
-        if user.role == 'admin':
-            classes = ClassGroup.objects.all()
-        elif user.role == 'teacher':
-            classes = ClassGroup.objects.filter(teacher=user)
-        else:
+        if getattr(user, 'role', None) not in ('admin', 'teacher'):
             return Response({"detail": "Forbidden"}, status=403)
 
-        return Response(ClassGroupSerializer(classes, many=True).data)
+        classes = ClassGroupSerializer.setup_eager_loading(ClassGroup.objects.visible_to(user))
+        return self.cached_response(request, lambda: self.paginated_response(request, classes, ClassGroupSerializer))
 
     @swagger_auto_schema(request_body=ClassGroupSerializer, responses={201: ClassGroupSerializer})
     def post(self, request):
@@ -131,9 +150,9 @@ class ClassGroupListCreateView(APIView):
 class ClassGroupDetailView(APIView):
     permission_classes = [AllowAny]
 
-    def get_class(self, pk):
+    def get_class(self, request, pk):
         try:
-            return ClassGroup.objects.get(pk=pk)
+            return ClassGroup.objects.visible_to(request.user).get(pk=pk)
         except ClassGroup.DoesNotExist:
             return None
 
@@ -142,16 +161,13 @@ class ClassGroupDetailView(APIView):
         responses={200: ClassGroupSerializer}
     )
     def get(self, request, pk):
-        class_group = self.get_class(pk)
+        class_group = self.get_class(request, pk)
         if not class_group:
             return Response({"detail": "Not found"}, status=404)
 
-        user = request.user
-        if user.role != 'admin' and (user.role != 'teacher' or class_group.teacher != user):
-            return Response({"detail": "Forbidden"}, status=403)
-
-        serializer = ClassGroupSerializer(class_group)
-        return Response(serializer.data)
+        return conditional_detail_response(
+            request, class_group.updated_at, lambda: Response(ClassGroupSerializer(class_group).data)
+        )
 
     @swagger_auto_schema(
         operation_summary="Update class group",
@@ -159,7 +175,7 @@ class ClassGroupDetailView(APIView):
         responses={200: ClassGroupSerializer}
     )
     def put(self, request, pk):
-        class_group = self.get_class(pk)
+        class_group = self.get_class(request, pk)
         if not class_group:
             return Response({"detail": "Not found"}, status=404)
 
@@ -177,7 +193,7 @@ class ClassGroupDetailView(APIView):
         responses={204: "No Content"}
     )
     def delete(self, request, pk):
-        class_group = self.get_class(pk)
+        class_group = self.get_class(request, pk)
         if not class_group:
             return Response({"detail": "Not found"}, status=404)
 
@@ -189,6 +205,23 @@ class ClassGroupDetailView(APIView):
 
 
 
+class ClassGroupSummaryView(APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Class health summary",
+        operation_description="BMI distribution, blood types, allergy prevalence and test result breakdowns "
+                              "for a class, computed from each student's latest health data.",
+    )
+    def get(self, request, pk):
+        try:
+            class_group = ClassGroup.objects.visible_to(request.user).get(pk=pk)
+        except ClassGroup.DoesNotExist:
+            return Response({"detail": "Not found"}, status=404)
+
+        return Response(class_health_summary(class_group))
+
+
 # -------------------------
 # Auth Views
 # -------------------------
@@ -204,10 +237,10 @@ class ClassGroupDetailView(APIView):
 #         return Response(serializer.errors, status=400)
 
 
-class LoginView(APIView):
+class LoginView(AsyncAPIView):
     permission_classes = [AllowAny]
     @swagger_auto_schema(request_body=LoginSerializer)
-    def post(self, request):
+    async def post(self, request):
         serializer = LoginSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -216,46 +249,106 @@ class LoginView(APIView):
         password = serializer.validated_data['password']
 
         try:
-            user = User.objects.get(email=email)
-            if not check_password(password, user.password):
+            user = await User.objects.aget(email=email)
+            if not await acheck_password(password, user.password):
                 return Response({"error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
         except User.DoesNotExist:
             return Response({"error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
 
-        request.session['user_id'] = user.id
-        request.session['email'] = user.email
-        request.session['name'] = user.name
-        request.session['role'] = user.role
-        request.session.set_expiry(60 * 120)
+        if CustomSessionAuthentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            await request.session.aset('user_id', user.id)
+            await request.session.aset('email', user.email)
+            await request.session.aset('name', user.name)
+            await request.session.aset('role', user.role)
+            await request.session.aset_expiry(60 * 120)
+
+        data = {"message": "Login successful","user_id":user.id, "email": user.email, "name": user.name, "role": user.role}
+        if token_auth_enabled():
+            data.update(token=issue_token(user), expires_in=token_max_age())
+        return Response(data)
+
+
+class TokenRefreshView(APIView):
+    authentication_classes = [SignedTokenAuthentication]
+
+    @swagger_auto_schema(operation_summary="Rotate the bearer token")
+    def post(self, request):
+        # Re-read the user so role changes and deletions are picked up on rotation.
+        try:
+            user = User.objects.get(pk=request.user.pk)
+        except User.DoesNotExist:
+            return Response({"detail": "User no longer exists."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        revoke_token(request.auth)
+        return Response({"token": issue_token(user), "expires_in": token_max_age()})
+
+
+class TokenRevokeView(APIView):
+    authentication_classes = [SignedTokenAuthentication]
+
+    @swagger_auto_schema(operation_summary="Revoke the bearer token")
+    def post(self, request):
+        revoke_token(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AuthCacheStatsView(APIView):
+    @swagger_auto_schema(operation_summary="Authenticated user cache statistics")
+    def get(self, request):
+        if request.user.role != 'admin':
+            return Response({"detail": "Only admins can view cache statistics."}, status=403)
+        return Response(user_cache.stats())
+
 
-        return Response({"message": "Login successful","user_id":user.id, "email": user.email, "name": user.name, "role": user.role})
+class ProfileReportView(APIView):
+    @swagger_auto_schema(
+        operation_summary="Profile report for one request",
+        operation_description="Report stored for a request an admin sent with X-Profile: 1 (or ?profile=1); "
+                              "the id is returned in its X-Profile-Id header.",
+    )
+    def get(self, request, request_id):
+        if request.user.role != 'admin':
+            return Response({"detail": "Only admins can view profiles."}, status=403)
+        report = load_report(request_id)
+        if report is None:
+            return Response({"detail": "No profile with this id, or it has expired."}, status=404)
+        return Response(report)
 
 
 
 # -------------------------
 # Student List + Create
 # -------------------------
-class StudentListCreateView(APIView):
+class StudentListCreateView(PaginatedListMixin, APIView):
     permission_classes = [AllowAny]
+    cursor_ordering = ('id',)
 
     @swagger_auto_schema(
         operation_summary="List students",
-        operation_description="List students accessible to the logged-in user based on role.",
+        operation_description="List students accessible to the logged-in user based on role. "
+                              "Use ?fields= to pick fields and ?expand=healthdata,medicalhistory,testresults "
+                              "to choose which nested relations are included.",
         responses={200: StudentSerializer(many=True)}
     )
     def get(self, request):
-        user = request.user
-        if user.role == 'admin':
-            students = Student.objects.all()
-        elif user.role == 'teacher':
-            students = Student.objects.filter(class_group__teachers=user)
-        elif user.role == 'parent':
-            students = Student.objects.filter(parent_email=user.email)
-        else:
-            students = Student.objects.none()
+        try:
+            shape = parse_fieldset_params(request, StudentSerializer)
+        except ValidationError as exc:
+            return Response(exc.detail, status=400)
+
+        students = Student.objects.visible_to(request.user)
+        students = StudentSerializer.setup_eager_loading(students, **shape)
 
-        serializer = StudentSerializer(students, many=True)
-        return Response(serializer.data)
+        try:
+            fmt = stream_format(request)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
+        if fmt:
+            return stream_response(students.order_by('id'), StudentSerializer, fmt, asynchronous=is_asgi(request), **shape)
+
+        # Nested records bump Student.updated_at themselves; allergy and test
+        # names are nested too, so their tables are validated as well.
+        return self.paginated_response(request, students, StudentSerializer, related=(Allergy, Tests), **shape)
 
     @swagger_auto_schema(
         operation_summary="Create student",
@@ -281,9 +374,14 @@ class StudentListCreateView(APIView):
 class StudentDetailView(APIView):
     permission_classes = [AllowAny]
 
-    def get_student(self, pk):
+    def get_student(self, request, pk, shape=None):
+        # Visibility is part of the lookup, so rows the user may not see are
+        # never loaded and simply come back as 404.
+        students = Student.objects.visible_to(request.user)
+        if shape is not None:
+            students = StudentSerializer.setup_eager_loading(students, **shape)
         try:
-            return Student.objects.get(pk=pk)
+            return students.get(pk=pk)
         except Student.DoesNotExist:
             return None
 
@@ -292,20 +390,25 @@ class StudentDetailView(APIView):
         responses={200: StudentSerializer}
     )
     def get(self, request, pk):
-        student = self.get_student(pk)
-        if not student:
+        try:
+            shape = parse_fieldset_params(request, StudentSerializer)
+        except ValidationError as exc:
+            return Response(exc.detail, status=400)
+
+        # Check the validators before loading the student and its relations.
+        updated_at = Student.objects.visible_to(request.user).filter(pk=pk).values_list('updated_at', flat=True).first()
+        if updated_at is None:
             return Response({"detail": "Not found"}, status=404)
 
-        user = request.user
-        if user.role == 'admin':
-            pass
-        elif user.role == 'teacher' and student.class_group.teacher != user:
-            return Response({"detail": "Forbidden"}, status=403)
-        elif user.role == 'parent' and student.parent_email != user.email:
-            return Response({"detail": "Forbidden"}, status=403)
+        def render():
+            student = self.get_student(request, pk, shape=shape)
+            if not student:
+                return Response({"detail": "Not found"}, status=404)
+            return Response(StudentSerializer(student, **shape).data)
 
-        serializer = StudentSerializer(student)
-        return Response(serializer.data)
+        return conditional_detail_response(
+            request, updated_at, render, related=(Allergy.objects.all(), Tests.objects.all())
+        )
 
     @swagger_auto_schema(
         operation_summary="Update student",
@@ -313,7 +416,7 @@ class StudentDetailView(APIView):
         responses={200: StudentSerializer}
     )
     def put(self, request, pk):
-        student = self.get_student(pk)
+        student = self.get_student(request, pk)
         if not student:
             return Response({"detail": "Not found"}, status=404)
 
@@ -331,7 +434,7 @@ class StudentDetailView(APIView):
         responses={204: "No Content"}
     )
     def delete(self, request, pk):
-        student = self.get_student(pk)
+        student = self.get_student(request, pk)
         if not student:
             return Response({"detail": "Not found"}, status=404)
 
@@ -342,13 +445,201 @@ class StudentDetailView(APIView):
         return Response(status=204)
 
 
-class AllergyListCreateView(APIView):
+class StudentGrowthView(APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Student growth percentiles",
+        operation_description="BMI-for-age and height-for-age z-scores and percentiles from the student's latest health data.",
+    )
+    def get(self, request, pk):
+        students = Student.objects.visible_to(request.user).filter(pk=pk)
+        try:
+            growth = growth_for_students(students)
+        except ReferenceUnavailable as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        if pk in growth:
+            return Response(growth[pk])
+        if students.exists():
+            return Response({"detail": "No health data recorded for this student."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+
+class GrowthListView(APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Growth percentiles for many students",
+        operation_description="Growth figures for every visible student with health data, optionally limited with ?class_group=.",
+        manual_parameters=[openapi.Parameter('class_group', openapi.IN_QUERY, type=openapi.TYPE_INTEGER)],
+    )
+    def get(self, request):
+        students = Student.objects.visible_to(request.user)
+        class_group = request.GET.get('class_group')
+        if class_group:
+            try:
+                students = students.filter(class_group=int(class_group))
+            except ValueError:
+                return Response({"detail": "class_group must be an id."}, status=400)
+        try:
+            growth = growth_for_students(students)
+        except ReferenceUnavailable as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(sorted(growth.values(), key=lambda row: row['student']))
+
+
+class SearchView(APIView):
+    permission_classes = [AllowAny]
+    default_page_size = 20
+    max_page_size = 100
+
+    @swagger_auto_schema(
+        operation_summary="Search students",
+        operation_description="Ranked search over student names, addresses, parent emails and medical conditions. "
+                              "Every word of ?q= is matched as a prefix; page with ?page_size= and ?offset= "
+                              f"(at most {MAX_OFFSET}).",
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+            openapi.Parameter('offset', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        ],
+    )
+    def get(self, request):
+        text = request.GET.get('q', '').strip()
+        if len(text) < MIN_QUERY_LENGTH:
+            return Response({"detail": f"Search for at least {MIN_QUERY_LENGTH} characters."}, status=400)
+        try:
+            page_size = min(int(request.GET.get('page_size', self.default_page_size)), self.max_page_size)
+            offset = int(request.GET.get('offset', 0))
+        except ValueError:
+            return Response({"detail": "page_size and offset must be integers."}, status=400)
+        if page_size < 1 or offset < 0:
+            return Response({"detail": "page_size must be positive and offset non-negative."}, status=400)
+        if offset > MAX_OFFSET:
+            return Response({"detail": f"offset cannot exceed {MAX_OFFSET}; narrow the search instead."}, status=400)
+
+        results, has_more = search_students(request.user, text, limit=page_size, offset=offset)
+        next_url = None
+        if has_more and offset + page_size <= MAX_OFFSET:
+            next_url = replace_query_param(request.build_absolute_uri(), 'offset', offset + page_size)
+        return Response({"results": results, "next": next_url})
+
+
+class ChangeFeedView(APIView):
     permission_classes = [AllowAny]
+    default_limit = 500
+
+    @swagger_auto_schema(
+        operation_summary="Change feed",
+        operation_description="Students, health data, medical history and test results created, updated or deleted "
+                              "after ?since=<cursor>. Without ?since= only the current cursor is returned, to start "
+                              "syncing from after a full load. Keep following the returned cursor while has_more is true.",
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        ],
+    )
+    def get(self, request):
+        since = request.GET.get('since')
+        if not since:
+            return Response({"changes": [], "cursor": head_cursor(request.user), "has_more": False})
+        try:
+            since = parse_cursor(since)
+            limit = min(int(request.GET.get('limit', self.default_limit)), MAX_LIMIT)
+        except ValueError:
+            return Response({"detail": "Invalid since cursor or limit."}, status=400)
+        if limit < 1:
+            return Response({"detail": "limit must be positive."}, status=400)
+
+        changes, cursor, has_more = read_changes(request.user, since, limit)
+        return Response({"changes": changes, "cursor": cursor, "has_more": has_more})
+
+
+class EventStreamView(View):
+    """
+    Server-sent events for test results, health data and medical history.
+
+    A plain async Django view rather than an APIView, since DRF views are
+    synchronous and would hold a worker thread for the whole connection.
+    """
+
+    async def get(self, request):
+        if not is_asgi(request):
+            return JsonResponse({"detail": "The event stream is only served by the ASGI application."}, status=501)
+        drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+        try:
+            user = await sync_to_async(lambda: drf_request.user)()
+        except AuthenticationFailed as exc:
+            return JsonResponse({"detail": str(exc.detail)}, status=401)
+        if getattr(user, 'role', None) is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+        models = [name for name in request.GET.get('model', '').split(',') if name]
+        unknown = set(models) - EVENT_MODELS.keys()
+        if unknown:
+            return JsonResponse({"detail": f"Unknown model: {', '.join(sorted(unknown))}."}, status=400)
+        try:
+            students = {int(pk) for pk in request.GET['student'].split(',')} if request.GET.get('student') else None
+        except ValueError:
+            return JsonResponse({"detail": "student must be comma separated ids."}, status=400)
+
+        # Kept so the stream can notice the token expiring or being revoked.
+        token = None
+        if isinstance(drf_request.successful_authenticator, SignedTokenAuthentication):
+            token = get_authorization_header(request).split()[1].decode()
+        viewer = Viewer(user, models=set(models) or None, students=students, token=token)
+        response = StreamingHttpResponse(event_stream(viewer), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Keep reverse proxies from buffering the stream.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class AllergyCohortView(APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Allergy cohort",
+        operation_description="Students allergic to any of ?allergy= (ids) or to any allergy of ?type=, "
+                              "optionally limited to ?class_group=. Each parameter takes a comma separated list.",
+        manual_parameters=[
+            openapi.Parameter('allergy', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('type', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('class_group', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+        ],
+    )
+    def get(self, request):
+        def id_list(param):
+            value = request.GET.get(param)
+            return None if not value else [int(pk) for pk in value.split(',')]
+
+        try:
+            allergies = id_list('allergy') or []
+            classes = id_list('class_group')
+        except ValueError:
+            return Response({"detail": "allergy and class_group must be comma separated ids."}, status=400)
+        types = [t for t in request.GET.get('type', '').split(',') if t]
+        unknown = set(types) - {value for value, _ in ALLERGY_TYPE_CHOICES}
+        if unknown:
+            return Response({"detail": f"Unknown allergy type: {', '.join(sorted(unknown))}."}, status=400)
+        if not allergies and not types:
+            return Response({"detail": "Pass at least one allergy or type."}, status=400)
+
+        ids, source = find_cohort(request.user, allergies, types, classes)
+        students = Student.objects.filter(pk__in=ids).order_by('id').values('id', 'name', 'class_group')
+        return Response({"count": len(ids), "source": source, "students": list(students)})
+
+
+class AllergyListCreateView(CachedListMixin, PaginatedListMixin, APIView):
+    permission_classes = [AllowAny]
+    cached_models = (Allergy,)
+    # The same list for everyone, so one cached copy per role is enough.
+    per_user_roles = ()
 
     def get(self, request):
         allergies = Allergy.objects.all()
-        serializer = AllergySerializer(allergies, many=True)
-        return Response(serializer.data)
+        return self.cached_response(request, lambda: self.paginated_response(request, allergies, AllergySerializer))
 
     @swagger_auto_schema(request_body=AllergySerializer, responses={201: AllergySerializer})
     def post(self, request):
@@ -370,8 +661,7 @@ class AllergyDetailView(APIView):
         allergy = self.get_object(pk)
         if not allergy:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = AllergySerializer(allergy)
-        return Response(serializer.data)
+        return conditional_detail_response(request, allergy.updated_at, lambda: Response(AllergySerializer(allergy).data))
 
     def put(self, request, pk):
         allergy = self.get_object(pk)
@@ -390,7 +680,7 @@ class AllergyDetailView(APIView):
         allergy.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-class HealthDataListCreateView(APIView):
+class HealthDataListCreateView(PaginatedListMixin, AsyncAPIView):
     permission_classes = [AllowAny]
 
     @swagger_auto_schema(
@@ -398,14 +688,14 @@ class HealthDataListCreateView(APIView):
         operation_description="Retrieve all health data or filter by student ID.",
         responses={200: HealthDataSerializer(many=True)}
     )
-    def get(self, request):
+    async def get(self, request):
         student_id = request.GET.get('student')
         if student_id:
-            healthdata = HealthData.objects.filter(student=student_id)
+            healthdata = HealthData.objects.visible_to(request.user).filter(student=student_id)
         else:
-            healthdata = HealthData.objects.all()
-        serializer = HealthDataSerializer(healthdata, many=True)
-        return Response(serializer.data)
+            healthdata = HealthData.objects.visible_to(request.user)
+        healthdata = HealthDataSerializer.setup_eager_loading(healthdata)
+        return await self.apaginated_response(request, healthdata, HealthDataSerializer, related=(Allergy,))
 
     @swagger_auto_schema(
         operation_summary="Create health data",
@@ -413,18 +703,27 @@ class HealthDataListCreateView(APIView):
         responses={201: HealthDataSerializer}
     )
     def post(self, request):
-        serializer = HealthDataSerializer(data=request.data)
+        serializer = HealthDataSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            # The student's latest_health snapshot is refreshed by a signal
+            # inside the same transaction.
+            with transaction.atomic():
+                serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class HealthDataDetailView(APIView):
+class HealthDataDetailView(AsyncAPIView):
     permission_classes = [AllowAny]
 
-    def get_object(self, pk):
+    def get_object(self, request, pk):
+        try:
+            return HealthDataSerializer.setup_eager_loading(HealthData.objects.visible_to(request.user)).get(pk=pk)
+        except HealthData.DoesNotExist:
+            return None
+
+    async def aget_object(self, request, pk):
         try:
-            return HealthData.objects.get(pk=pk)
+            return await HealthDataSerializer.setup_eager_loading(HealthData.objects.visible_to(request.user)).aget(pk=pk)
         except HealthData.DoesNotExist:
             return None
 
@@ -432,12 +731,14 @@ class HealthDataDetailView(APIView):
         operation_summary="Retrieve health data",
         responses={200: HealthDataSerializer}
     )
-    def get(self, request, pk):
-        healthdata = self.get_object(pk)
+    async def get(self, request, pk):
+        healthdata = await self.aget_object(request, pk)
         if not healthdata:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = HealthDataSerializer(healthdata)
-        return Response(serializer.data)
+        return await aconditional_detail_response(
+            request, healthdata.updated_at, lambda: Response(HealthDataSerializer(healthdata).data),
+            related=(Allergy.objects.all(),),
+        )
 
     @swagger_auto_schema(
         operation_summary="Update health data",
@@ -445,12 +746,15 @@ class HealthDataDetailView(APIView):
         responses={200: HealthDataSerializer}
     )
     def put(self, request, pk):
-        healthdata = self.get_object(pk)
+        healthdata = self.get_object(request, pk)
         if not healthdata:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = HealthDataSerializer(healthdata, data=request.data, partial=True)
+        serializer = HealthDataSerializer(healthdata, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            # The student's latest_health snapshot is refreshed by a signal
+            # inside the same transaction.
+            with transaction.atomic():
+                serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -460,12 +764,15 @@ class HealthDataDetailView(APIView):
         responses={200: HealthDataSerializer}
     )
     def patch(self, request, pk):
-        healthdata = self.get_object(pk)
+        healthdata = self.get_object(request, pk)
         if not healthdata:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = HealthDataSerializer(healthdata, data=request.data, partial=True)
+        serializer = HealthDataSerializer(healthdata, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            # The student's latest_health snapshot is refreshed by a signal
+            # inside the same transaction.
+            with transaction.atomic():
+                serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -474,14 +781,15 @@ class HealthDataDetailView(APIView):
         responses={204: "No Content"}
     )
     def delete(self, request, pk):
-        healthdata = self.get_object(pk)
+        healthdata = self.get_object(request, pk)
         if not healthdata:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-        healthdata.delete()
+        with transaction.atomic():
+            healthdata.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 # MedicalHistory Views
-class MedicalHistoryListCreateView(APIView):
+class MedicalHistoryListCreateView(PaginatedListMixin, AsyncAPIView):
     permission_classes = [AllowAny]
 
     @swagger_auto_schema(
@@ -489,14 +797,13 @@ class MedicalHistoryListCreateView(APIView):
         operation_description="Retrieve all medical history or filter by student ID.",
         responses={200: MedicalHistorySerializer(many=True)}
     )
-    def get(self, request):
+    async def get(self, request):
         student_id = request.GET.get('student')
         if student_id:
-            histories = MedicalHistory.objects.filter(student=student_id)
+            histories = MedicalHistory.objects.visible_to(request.user).filter(student=student_id)
         else:
-            histories = MedicalHistory.objects.all()
-        serializer = MedicalHistorySerializer(histories, many=True)
-        return Response(serializer.data)
+            histories = MedicalHistory.objects.visible_to(request.user)
+        return await self.apaginated_response(request, histories, MedicalHistorySerializer)
 
     @swagger_auto_schema(
         operation_summary="Create medical history",
@@ -504,18 +811,24 @@ class MedicalHistoryListCreateView(APIView):
         responses={201: MedicalHistorySerializer}
     )
     def post(self, request):
-        serializer = MedicalHistorySerializer(data=request.data)
+        serializer = MedicalHistorySerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class MedicalHistoryDetailView(APIView):
+class MedicalHistoryDetailView(AsyncAPIView):
     permission_classes = [AllowAny]
 
-    def get_object(self, pk):
+    def get_object(self, request, pk):
         try:
-            return MedicalHistory.objects.get(pk=pk)
+            return MedicalHistory.objects.visible_to(request.user).get(pk=pk)
+        except MedicalHistory.DoesNotExist:
+            return None
+
+    async def aget_object(self, request, pk):
+        try:
+            return await MedicalHistory.objects.visible_to(request.user).aget(pk=pk)
         except MedicalHistory.DoesNotExist:
             return None
 
@@ -523,12 +836,11 @@ class MedicalHistoryDetailView(APIView):
         operation_summary="Retrieve medical history",
         responses={200: MedicalHistorySerializer}
     )
-    def get(self, request, pk):
-        obj = self.get_object(pk)
+    async def get(self, request, pk):
+        obj = await self.aget_object(request, pk)
         if not obj:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = MedicalHistorySerializer(obj)
-        return Response(serializer.data)
+        return await aconditional_detail_response(request, obj.updated_at, lambda: Response(MedicalHistorySerializer(obj).data))
 
     @swagger_auto_schema(
         operation_summary="Update medical history",
@@ -536,10 +848,10 @@ class MedicalHistoryDetailView(APIView):
         responses={200: MedicalHistorySerializer}
     )
     def put(self, request, pk):
-        obj = self.get_object(pk)
+        obj = self.get_object(request, pk)
         if not obj:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = MedicalHistorySerializer(obj, data=request.data, partial=True)
+        serializer = MedicalHistorySerializer(obj, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -551,10 +863,10 @@ class MedicalHistoryDetailView(APIView):
         responses={200: MedicalHistorySerializer}
     )
     def patch(self, request, pk):
-        obj = self.get_object(pk)
+        obj = self.get_object(request, pk)
         if not obj:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = MedicalHistorySerializer(obj, data=request.data, partial=True)
+        serializer = MedicalHistorySerializer(obj, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -565,18 +877,21 @@ class MedicalHistoryDetailView(APIView):
         responses={204: "No Content"}
     )
     def delete(self, request, pk):
-        obj = self.get_object(pk)
+        obj = self.get_object(request, pk)
         if not obj:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
         obj.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 # Tests Views
-class TestsListCreateView(APIView):
+class TestsListCreateView(CachedListMixin, PaginatedListMixin, APIView):
+    cursor_ordering = ('id',)
+    cached_models = (Tests,)
+    per_user_roles = ()
+
     def get(self, request):
         tests = Tests.objects.all()
-        serializer = TestsSerializer(tests, many=True)
-        return Response(serializer.data)
+        return self.cached_response(request, lambda: self.paginated_response(request, tests, TestsSerializer))
 
     def post(self, request):
         serializer = TestsSerializer(data=request.data)
@@ -596,8 +911,7 @@ class TestsDetailView(APIView):
         obj = self.get_object(pk)
         if not obj:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = TestsSerializer(obj)
-        return Response(serializer.data)
+        return conditional_detail_response(request, obj.updated_at, lambda: Response(TestsSerializer(obj).data))
 
     def put(self, request, pk):
         obj = self.get_object(pk)
@@ -613,11 +927,14 @@ class TestsDetailView(APIView):
         obj = self.get_object(pk)
         if not obj:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-        obj.delete()
+        try:
+            obj.delete()
+        except ProtectedError:
+            return Response({"detail": "This test still has results recorded against it."}, status=status.HTTP_409_CONFLICT)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 # TestResults Views
-class TestResultsListCreateView(APIView):
+class TestResultsListCreateView(PaginatedListMixin, AsyncAPIView):
     permission_classes = [AllowAny]
 
     @swagger_auto_schema(
@@ -625,14 +942,22 @@ class TestResultsListCreateView(APIView):
         operation_description="Retrieve all test results or filter by student ID.",
         responses={200: TestResultsSerializer(many=True)}
     )
-    def get(self, request):
+    async def get(self, request):
         student_id = request.GET.get('student')
         if student_id:
-            results = TestResults.objects.filter(student=student_id)
+            results = TestResults.objects.visible_to(request.user).filter(student=student_id)
         else:
-            results = TestResults.objects.all()
-        serializer = TestResultsSerializer(results, many=True)
-        return Response(serializer.data)
+            results = TestResults.objects.visible_to(request.user)
+        results = TestResultsSerializer.setup_eager_loading(results)
+
+        try:
+            fmt = stream_format(request)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if fmt:
+            return stream_response(results.order_by('id'), TestResultsSerializer, fmt, asynchronous=is_asgi(request))
+
+        return await self.apaginated_response(request, results, TestResultsSerializer, related=(Tests,))
 
     @swagger_auto_schema(
         operation_summary="Create test result",
@@ -640,18 +965,92 @@ class TestResultsListCreateView(APIView):
         responses={201: TestResultsSerializer}
     )
     def post(self, request):
-        serializer = TestResultsSerializer(data=request.data)
+        serializer = TestResultsSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class TestResultsDetailView(APIView):
+class TestResultsBulkCreateView(APIView):
+    parser_classes = [JSONParser, NDJSONParser]
+    max_items = 10000
+
+    @swagger_auto_schema(
+        operation_summary="Bulk create test results",
+        operation_description="Accepts a JSON array or NDJSON (application/x-ndjson) of test results. "
+                              "Either every item is created in one transaction or none are, and the "
+                              "errors for each rejected item are returned by index.",
+        request_body=TestResultsBulkItemSerializer(many=True),
+    )
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            return Response({"detail": "Expected a list of test results."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_items:
+            return Response({"detail": f"At most {self.max_items} test results per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+        item_serializer = TestResultsBulkItemSerializer()
+        errors = {}
+        valid = []
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, item_serializer.run_validation(item)))
+            except ValidationError as exc:
+                errors[index] = exc.detail
+
+        student_ids = {data['student'] for _, data in valid}
+        visible = student_scopes(Student.objects.visible_to(request.user).filter(pk__in=student_ids))
+        for index, data in valid:
+            if data['student'] not in visible:
+                errors[index] = {"student": [f'Invalid pk "{data["student"]}" - object does not exist.']}
+
+        names = {data['test'] for _, data in valid}
+        tests = dict(Tests.objects.filter(test_name__in=names).order_by('-id').values_list('test_name', 'id'))
+        if request.user.role not in TEST_CREATOR_ROLES:
+            for index, data in valid:
+                if data['test'] not in tests:
+                    errors.setdefault(index, {"test": [f'Unknown test "{data["test"]}".']})
+
+        if errors:
+            return Response(
+                {"errors": [{"index": index, "errors": errors[index]} for index in sorted(errors)]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with transaction.atomic():
+            missing = Tests.objects.bulk_create(Tests(test_name=name) for name in names - tests.keys())
+            if missing:
+                response_cache.invalidate(Tests)
+            tests.update((test.test_name, test.id) for test in missing)
+
+            rows = []
+            for _, data in valid:
+                row = TestResults(student_id=data.pop('student'), test_id=tests[data.pop('test')], **data)
+                # bulk_create skips save(), so derive the typed result columns here.
+                row.result_value, row.result_category = parse_result(row.result)
+                rows.append(row)
+            created = TestResults.objects.bulk_create(rows, batch_size=1000)
+            # bulk_create sends no post_save, so touch the students, log the
+            # rows for the change feed and publish them here.
+            Student.objects.filter(pk__in=visible).touch()
+            student_ids = {row.id: row.student_id for row in created}
+            log_bulk(TestResults, student_ids, 'created', scopes=visible)
+            publish_bulk(TestResults, student_ids, 'created', visible)
+        return Response({"created": len(created), "ids": [row.id for row in created]}, status=status.HTTP_201_CREATED)
+
+
+class TestResultsDetailView(AsyncAPIView):
     permission_classes = [AllowAny]
 
-    def get_object(self, pk):
+    def get_object(self, request, pk):
         try:
-            return TestResults.objects.get(pk=pk)
+            return TestResultsSerializer.setup_eager_loading(TestResults.objects.visible_to(request.user)).get(pk=pk)
+        except TestResults.DoesNotExist:
+            return None
+
+    async def aget_object(self, request, pk):
+        try:
+            return await TestResultsSerializer.setup_eager_loading(TestResults.objects.visible_to(request.user)).aget(pk=pk)
         except TestResults.DoesNotExist:
             return None
 
@@ -659,12 +1058,13 @@ class TestResultsDetailView(APIView):
         operation_summary="Retrieve test result",
         responses={200: TestResultsSerializer}
     )
-    def get(self, request, pk):
-        obj = self.get_object(pk)
+    async def get(self, request, pk):
+        obj = await self.aget_object(request, pk)
         if not obj:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = TestResultsSerializer(obj)
-        return Response(serializer.data)
+        return await aconditional_detail_response(
+            request, obj.updated_at, lambda: Response(TestResultsSerializer(obj).data), related=(Tests.objects.all(),)
+        )
 
     @swagger_auto_schema(
         operation_summary="Update test result",
@@ -672,10 +1072,10 @@ class TestResultsDetailView(APIView):
         responses={200: TestResultsSerializer}
     )
     def put(self, request, pk):
-        obj = self.get_object(pk)
+        obj = self.get_object(request, pk)
         if not obj:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = TestResultsSerializer(obj, data=request.data, partial=True)
+        serializer = TestResultsSerializer(obj, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -687,10 +1087,10 @@ class TestResultsDetailView(APIView):
         responses={200: TestResultsSerializer}
     )
     def patch(self, request, pk):
-        obj = self.get_object(pk)
+        obj = self.get_object(request, pk)
         if not obj:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = TestResultsSerializer(obj, data=request.data, partial=True)
+        serializer = TestResultsSerializer(obj, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -701,7 +1101,7 @@ class TestResultsDetailView(APIView):
         responses={204: "No Content"}
     )
     def delete(self, request, pk):
-        obj = self.get_object(pk)
+        obj = self.get_object(request, pk)
         if not obj:
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
         obj.delete()
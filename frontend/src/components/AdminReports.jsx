@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Card, CardContent, CardHeader, CardTitle } from './ui/card';
 import { Button } from './ui/button';
+import { fetchAllPages } from './fetchAllPages';
 import { Badge } from './ui/badge';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from './ui/select';
 import { Input } from './ui/input';
@@ -33,17 +34,13 @@ export function AdminReports() {
   useEffect(() => {
     const fetchStudents = async () => {
       try {
-        const response = await fetch("http://localhost:8000/api/students/", {
+        const data = await fetchAllPages("http://localhost:8000/api/students/", {
           method: "GET",
           headers: {
             Accept: "application/json",
           },
           credentials: "include",
         });
-        if (!response.ok) {
-          throw new Error('Failed to fetch students');
-        }
-        const data = await response.json();
         setStudents(data);
       } catch (err) {
         setError(err.message);
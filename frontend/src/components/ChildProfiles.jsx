@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from "react";
 import { Card, CardContent, CardHeader, CardTitle } from "./ui/card";
 import { Button } from "./ui/button";
+import { fetchAllPages } from "./fetchAllPages";
 import { Input } from "./ui/input";
 import { Label } from "./ui/label";
 import { Badge } from "./ui/badge";
@@ -462,13 +463,11 @@ export function ChildProfiles({
   // Fetch all students for listing
   const fetchStudents = async () => {
     try {
-      const response = await fetch("http://localhost:8000/api/students/", {
+      const data = await fetchAllPages("http://localhost:8000/api/students/", {
         method: "GET",
         headers: { Accept: "application/json" },
         credentials: "include",
       });
-      if (!response.ok) throw new Error("Failed to fetch students");
-      const data = await response.json();
       setStudents(data);
     } catch (err) {
       setStudents([]);
@@ -497,12 +496,11 @@ export function ChildProfiles({
   // Fetch test results when a child is selected
   useEffect(() => {
     if (selectedChildId) {
-      fetch(`http://localhost:8000/api/testresults/?student=${selectedChildId}`, {
+      fetchAllPages(`http://localhost:8000/api/testresults/?student=${selectedChildId}`, {
         method: "GET",
         headers: { Accept: "application/json" },
         credentials: "include",
       })
-        .then(res => res.json())
         .then(data => setTestResults(data))
         .catch(err => setTestResults([]));
     }
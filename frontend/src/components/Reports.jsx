@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Card, CardContent, CardHeader, CardTitle } from './ui/card';
 import { Button } from './ui/button';
+import { fetchAllPages } from './fetchAllPages';
 import { Badge } from './ui/badge';
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from './ui/table';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from './ui/tabs';
@@ -35,17 +36,13 @@ export function Reports() {
   useEffect(() => {
     const fetchStudents = async () => {
       try {
-        const response = await fetch("http://localhost:8000/api/students/", {
+        const data = await fetchAllPages("http://localhost:8000/api/students/", {
           method: "GET",
           headers: {
             Accept: "application/json",
           },
           credentials: "include",
         });
-        if (!response.ok) {
-          throw new Error('Failed to fetch students');
-        }
-        const data = await response.json();
         setStudents(data);
       } catch (err) {
         setError(err.message);
@@ -0,0 +1,16 @@
+// List endpoints return {next, previous, results} pages; follow `next` until
+// the whole list has been read.
+export async function fetchAllPages(url, options) {
+  const rows = [];
+  let next = url;
+  while (next) {
+    const response = await fetch(next, options);
+    if (!response.ok) {
+      throw new Error(`Request failed with status ${response.status}`);
+    }
+    const page = await response.json();
+    rows.push(...page.results);
+    next = page.next;
+  }
+  return rows;
+}